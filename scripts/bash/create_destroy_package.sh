@@ -4,6 +4,10 @@
 # Description: Creates deployment and destructive change package.xml files
 #              from a semicolon-separated list of metadata components.
 #              Used for preparing destructive deployments to Salesforce.
+#              Conversion is done by scripts/python/package_list.py (no sf plugin).
+#              The destroy pipeline passes -p to package_check.py instead, which
+#              converts and validates in one step; this script is kept for
+#              manual use.
 # Usage: Called from CI/CD pipeline with $PACKAGE environment variable
 # Environment Variables Required:
 #   - PACKAGE: Semicolon-separated list of metadata components
@@ -11,17 +15,7 @@
 #   - DESTRUCTIVE_PACKAGE: Output path for destructive package.xml
 ################################################################################
 set -e
-# Create directory if it don't exist
-mkdir -p "destructive"
 
-PACKAGE_LIST_FILE="package.txt"
-
-# Save the package list to a text file
-echo "$PACKAGE" | tr ';' '\n' > "$PACKAGE_LIST_FILE"
-
-# convert package list to XML
-sf sfpl xml -l "$PACKAGE_LIST_FILE" -x "$DEPLOY_PACKAGE" -n
-
-# need an empty package.xml for destructive deployments
-# suppress output to avoid warning
-sf sfpl xml -x "$DESTRUCTIVE_PACKAGE" > /dev/null 2>&1
+# convert package list to XML and write the empty package.xml that
+# destructive deployments need alongside it
+python3 ./scripts/python/package_list.py -l "$PACKAGE" -x "$DEPLOY_PACKAGE" -d "$DESTRUCTIVE_PACKAGE"
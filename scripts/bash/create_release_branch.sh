@@ -120,10 +120,10 @@ for branch in $STORY_BRANCHES; do
   package_files+=("-f" "$package_file")
 done
 
-# Run the sfpc combine command
+# Combine the story manifests
 if [ ${#package_files[@]} -gt 0 ]; then
-  echo "Running sfpc combine command..."
-  sf sfpc combine "${package_files[@]}" -c "manifest/package.xml"
+  echo "Combining package.xml files..."
+  python3 ./scripts/python/package_combiner.py "${package_files[@]}" -c "manifest/package.xml"
 else
   echo "No package files found to combine."
   exit 1
@@ -5,21 +5,41 @@
 #              on package type and environment. Validates for non-push pipelines,
 #              uses quick-deploy for production, and direct deployment for other
 #              environments. Handles both Apex and non-Apex packages.
+#              sfdx-project.json replacements are applied to the package's files
+#              first (source_replacements.py), so an invalid rule fails before
+#              the deploy starts. With DEPLOY_FROM_ZIP=true the package is
+#              deployed from a Metadata API zip built by deploy_zip.py (reused
+#              across retries); sf converts the source when it cannot be built.
 # Usage: Called from CI/CD pipeline during deployment stages
 # Environment Variables Required:
 #   - testclasses: Test classes to run (or "not a test" for non-Apex)
 #   - CI_PIPELINE_SOURCE: Pipeline trigger type (push, merge_request, etc.)
 #   - CI_ENVIRONMENT_NAME: Target environment (production, sandbox, etc.)
 #   - DEPLOY_PACKAGE, DEPLOY_TIMEOUT
+# Optional:
+#   - DEPLOY_FROM_ZIP: "true" to deploy from a prebuilt metadata zip
 ################################################################################
 set -e
 
+python3 ./scripts/python/source_replacements.py -x "$DEPLOY_PACKAGE"
+
+DEPLOY_SOURCE=(-x "$DEPLOY_PACKAGE")
+IGNORE_CONFLICTS=(--ignore-conflicts)
+if [ "$DEPLOY_FROM_ZIP" == "true" ]; then
+    if deploy_zip=$(python3 ./scripts/python/deploy_zip.py -x "$DEPLOY_PACKAGE"); then
+        DEPLOY_SOURCE=(--metadata-dir "$deploy_zip" --single-package)
+        IGNORE_CONFLICTS=()
+    else
+        echo "Deploy zip not built; sf will convert the source."
+    fi
+fi
+
 # Handle non-Apex packages (no tests)
 if [ "$testclasses" == "not a test" ]; then
     if [ "$CI_PIPELINE_SOURCE" != "push" ]; then
-        sf project deploy start --dry-run -x $DEPLOY_PACKAGE -w $DEPLOY_TIMEOUT --verbose --ignore-conflicts
+        sf project deploy start --dry-run "${DEPLOY_SOURCE[@]}" -w $DEPLOY_TIMEOUT --verbose "${IGNORE_CONFLICTS[@]}"
     else
-        sf project deploy start -x $DEPLOY_PACKAGE -w $DEPLOY_TIMEOUT --verbose --ignore-conflicts
+        sf project deploy start "${DEPLOY_SOURCE[@]}" -w $DEPLOY_TIMEOUT --verbose "${IGNORE_CONFLICTS[@]}"
     fi
 else
     # Apex package with tests
@@ -27,13 +47,13 @@ else
         # Always validate on non-push pipelines
         sf project deploy validate -l RunSpecifiedTests -t $testclasses \
             --coverage-formatters json --results-dir coverage \
-            -x $DEPLOY_PACKAGE -w $DEPLOY_TIMEOUT --verbose
+            "${DEPLOY_SOURCE[@]}" -w $DEPLOY_TIMEOUT --verbose
     else
         if [ "$CI_ENVIRONMENT_NAME" == "production" ]; then
             # Production: validate then quick-deploy
             sf project deploy validate -l RunSpecifiedTests -t $testclasses \
                 --coverage-formatters json --results-dir coverage \
-                -x $DEPLOY_PACKAGE -w $DEPLOY_TIMEOUT --verbose
+                "${DEPLOY_SOURCE[@]}" -w $DEPLOY_TIMEOUT --verbose
 
             echo "Running the quick-deployment..."
             sf project deploy quick --use-most-recent -w $DEPLOY_TIMEOUT
@@ -41,7 +61,7 @@ else
             # Other environments: deploy directly with tests
             sf project deploy start -l RunSpecifiedTests -t $testclasses \
                 --coverage-formatters json --results-dir coverage \
-                -x $DEPLOY_PACKAGE -w $DEPLOY_TIMEOUT --verbose --ignore-conflicts
+                "${DEPLOY_SOURCE[@]}" -w $DEPLOY_TIMEOUT --verbose "${IGNORE_CONFLICTS[@]}"
         fi
     fi
 fi
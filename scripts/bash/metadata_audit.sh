@@ -7,14 +7,18 @@
 #   uploads the generated Markdown summary to Confluence.
 #
 #   One `git log origin/main` resolves the FROM ref (last commit strictly before
-#   one week ago). The plugin is invoked once per team with --commit-message-include
-#   set to that team's Jira project key pattern.
+#   one week ago). metadata_history.py then reads the week's history once and
+#   writes a per-team change list grouped by Jira issue (<team>-changes-<date>.md,
+#   plus metadata-history-<date>.json for all teams). The plugin is invoked once
+#   per team with commits in the window, with --commit-message-include set to that
+#   team's Jira project key pattern; teams without commits are skipped. Both the AI
+#   summary and the change list are uploaded.
 #
 # Usage:
 #   Called from a scheduled CI/CD pipeline (e.g., weekly)
 #
 # Dependencies:
-#   - git
+#   - git, python3
 #   - Salesforce CLI (sf) with plugin: sf-git-ai-meta-insights
 #   - Node.js 20+ (required by the plugin)
 #   - curl
@@ -97,17 +101,51 @@ echo "  TO=${METADATA_AUDIT_TO}"
 
 timestamp=$(date +"%Y-%m-%d")
 
+# --- One pass over the window for every team -----------------------------------
+
+history_json="metadata-history-${timestamp}.json"
+team_args=()
+for team in "${!TEAM_JIRA_REGEX[@]}"; do
+  team_args+=(--team "${team}=${TEAM_JIRA_REGEX[$team]}")
+done
+if ! python3 ./scripts/python/metadata_history.py --from "$FROM" --to "$METADATA_AUDIT_TO" \
+  "${team_args[@]}" --date "$timestamp"; then
+  echo "WARNING: metadata_history.py failed; running the plugin for every team." >&2
+  history_json=""
+fi
+
+upload_attachment() {
+  curl -sS -u "$CONFLUENCE_USER:$CONFLUENCE_TOKEN" \
+    -X PUT \
+    -H "X-Atlassian-Token: nocheck" \
+    -F "file=@$1" \
+    -F 'minorEdit=true' \
+    "https://avalara.atlassian.net/wiki/rest/api/content/${CONFLUENCE_PAGE_ID}/child/attachment" \
+    >/dev/null || echo "WARNING: Failed to upload $1 for team $2"
+}
+
 # --- Per-team: plugin summarize → Confluence ----------------------------------
 
 for team in q2c leadz sfxpro storm shield avatechtdr; do
   jira_regex="${TEAM_JIRA_REGEX[$team]}"
   summary_file="${team}-summary-${timestamp}.md"
+  changes_file="${team}-changes-${timestamp}.md"
 
   echo
   echo "============================================================"
   echo "Processing team: ${team} (--commit-message-include '${jira_regex}')"
   echo "============================================================"
 
+  if [[ -n "$history_json" ]]; then
+    team_commits=$(jq -r --arg t "$team" '.teams[$t].commits // 0' "$history_json")
+    if [[ "$team_commits" == "0" ]]; then
+      echo "No commits for team '${team}' in the window; skipping."
+      continue
+    fi
+    echo "Uploading change list ${changes_file} to Confluence page ${CONFLUENCE_PAGE_ID}..."
+    upload_attachment "$changes_file" "$team"
+  fi
+
   if ! sf sgai metadata summarize \
     --from "$FROM" \
     --to "$METADATA_AUDIT_TO" \
@@ -128,13 +166,7 @@ for team in q2c leadz sfxpro storm shield avatechtdr; do
   fi
 
   echo "Uploading AI summary ${summary_file} to Confluence page ${CONFLUENCE_PAGE_ID}..."
-  curl -sS -u "$CONFLUENCE_USER:$CONFLUENCE_TOKEN" \
-    -X PUT \
-    -H "X-Atlassian-Token: nocheck" \
-    -F "file=@${summary_file}" \
-    -F 'minorEdit=true' \
-    "https://avalara.atlassian.net/wiki/rest/api/content/${CONFLUENCE_PAGE_ID}/child/attachment" \
-    >/dev/null || echo "WARNING: Failed to upload ${summary_file} for team ${team}"
+  upload_attachment "$summary_file" "$team"
 done
 
 echo
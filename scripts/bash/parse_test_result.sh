@@ -2,15 +2,19 @@
 ################################################################################
 # Script: parse_test_result.sh
 # Description: Parses Salesforce test results from JSON output and generates
-#              a formatted Slack payload with test outcome, including failures
-#              and success notifications. Prepares slackPayload.json for posting.
+#              a formatted Slack payload with test outcome, including failures,
+#              slowest tests and coverage changes (scripts/python/report_render.py).
+#              Prepares slackPayload.json for posting.
 # Usage: Called from CI/CD pipeline after test execution completes
-# Dependencies: jq
+# Dependencies: python3
 # Environment Variables Required:
 #   - TEST_RUN_ID: Salesforce test run identifier
 #   - CI_JOB_URL: Link to the CI job for downloading artifacts
+# Environment Variables Optional:
+#   - COVERAGE_BASELINE: coverage-snapshot.json of an earlier run to report
+#     per-class coverage changes against
 # Input: coverage/test-result-{TEST_RUN_ID}.json
-# Output: slackPayload.json
+# Output: slackPayload.json, coverage/coverage-snapshot.json
 ################################################################################
 
 # Check if TEST_RUN_ID environment variable is set
@@ -28,45 +32,12 @@ if [[ ! -f "$TEST_RESULT_FILE" ]]; then
     exit 1
 fi
 
-# Read the JSON file and extract the summary
-SUMMARY=$(jq '.summary' "$TEST_RESULT_FILE")
-
-# Extract hostname and clean it
-HOSTNAME=$(echo "$SUMMARY" | jq -r '.hostname')
-FIRST_PART=$(echo "$HOSTNAME" | grep -oP '(?<=//).*?(?=\.)')
-
-if [[ -n "$FIRST_PART" ]]; then
-    HOSTNAME="$FIRST_PART"
-fi
-
-# Determine the summary text
-OUTCOME=$(echo "$SUMMARY" | jq -r '.outcome')
-TESTS_RAN=$(echo "$SUMMARY" | jq -r '.testsRan')
-FAILING=$(echo "$SUMMARY" | jq -r '.failing')
-
-if [[ "$OUTCOME" == "Failed" ]]; then
-    SUMMARY_TEXT=":alert: <!channel> Automated unit testing for ${HOSTNAME} has *${OUTCOME}* with ${TESTS_RAN} test runs and ${FAILING} failure(s). Test run ID is ${TEST_RUN_ID}. Download pipeline artifacts from ${CI_JOB_URL}."
-else
-    SUMMARY_TEXT=":orange-check: <!channel> Automated unit testing for ${HOSTNAME} has *${OUTCOME}*. Test run ID is ${TEST_RUN_ID}."
+# Build the payload in one pass over the result file (summary, failures,
+# slowest tests and per-class coverage changes since the previous snapshot)
+REPORT_ARGS=(slack "$TEST_RESULT_FILE" --test-run-id "$TEST_RUN_ID" --job-url "${CI_JOB_URL:-}" -o slackPayload.json)
+REPORT_ARGS+=(--save-coverage "coverage/coverage-snapshot.json")
+if [[ -n "${COVERAGE_BASELINE:-}" ]]; then
+    REPORT_ARGS+=(--baseline "$COVERAGE_BASELINE")
 fi
 
-# Construct the Slack payload
-SLACK_PAYLOAD=$(jq -n \
-    --arg text "Test Runs Finished" \
-    --arg summaryText "$SUMMARY_TEXT" \
-    '{
-        text: $text,
-        blocks: [
-            {
-                type: "section",
-                text: {
-                    type: "mrkdwn",
-                    text: $summaryText
-                }
-            }
-        ]
-    }')
-
-# Write the JSON string to the file
-echo "$SLACK_PAYLOAD" > slackPayload.json
-echo "Slack payload written to slackPayload.json"
+python3 scripts/python/report_render.py "${REPORT_ARGS[@]}"
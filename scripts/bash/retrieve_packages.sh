@@ -9,16 +9,17 @@
 # Usage: Called from CI/CD pipeline (one job per branch for parallel runs).
 # Environment Variables Required:
 #   - ORG_BRANCH: Git branch / sf org alias
-#   - PACKAGE_NAME: XML file name from scripts/packages/ folder
+#   - PACKAGE_NAME: XML file name from scripts/packages/ folder, or "all"
 #   - PREPURGE: Set to "true" to enable pre-purge of metadata folders
 #   - DEPLOY_TIMEOUT: Wait time for retrieval operation
 #   - MAINTAINER_PAT_NAME, MAINTAINER_PAT_VALUE
 #   - CI_COMMIT_SHORT_SHA
-# Optional: GIT_REMOTE (default: origin), GIT_PUSH_MAX_ATTEMPTS (default: 5)
+# Optional: GIT_REMOTE (default: origin), GIT_PUSH_MAX_ATTEMPTS (default: 5),
+#   RETRIEVE_MAX_WORKERS (concurrent retrieves, default: 4)
 #
-# Objects.xml: Before retrieve, builds manifest/package.xml from that branch's org
-#   with only CustomObject (sf project generate manifest --metadata CustomObject) so the
-#   CLI does not scan all org metadata types (avoids RegistryError on types like OAS Yaml Schema).
+# Retrieval runs through scripts/python/package_retrieve.py: CustomObject members are
+#   listed from the org (sf org list metadata) instead of retrieved with a wildcard, so
+#   standard objects are included and the CLI does not scan all org metadata types.
 ################################################################################
 set -e
 
@@ -34,81 +35,24 @@ git fetch -q
 git config user.name "${MAINTAINER_PAT_NAME}"
 git config user.email "${MAINTAINER_PAT_USER_NAME}@noreply.${CI_SERVER_HOST}"
 
-# Function to map metadata types to force-app folder names using metadataRegistry.json
-get_folder_for_metadata_type() {
-    local metadata_type=$1
-    local registry_file="scripts/registry/metadataRegistry.json"
-
-    if [[ ! -f "$registry_file" ]]; then
-        echo ""
-        return
-    fi
-
-    if ! command -v jq &> /dev/null; then
-        echo "Warning: jq not found, cannot lookup metadata type folder. Falling back to empty string." >&2
-        echo ""
-        return
-    fi
-
-    local folder_name
-    folder_name=$(jq -r --arg type "$metadata_type" '
-        .types | to_entries[] |
-        select((.value.name | ascii_downcase) == ($type | ascii_downcase)) |
-        .value.directoryName
-    ' "$registry_file" 2>/dev/null | head -1)
-
-    if [[ -n "$folder_name" && "$folder_name" != "null" ]]; then
-        echo "$folder_name"
-    else
-        echo ""
-    fi
-}
-
 git checkout -q "$branch_name"
 git pull --ff -q
-mkdir -p manifest
-if [[ "$PACKAGE_NAME" == "Objects.xml" ]]; then
-    echo "Objects.xml: generating manifest/package.xml (CustomObject only) from '${branch_name}'..."
-    sf project generate manifest \
-        --from-org "$branch_name" \
-        --metadata CustomObject \
-        --output-dir manifest \
-        --type package
-    if [[ ! -f manifest/package.xml ]]; then
-        echo "ERROR: Expected manifest/package.xml after sf project generate manifest." >&2
-        exit 1
-    fi
-else
-    cp -f "scripts/packages/$PACKAGE_NAME" "manifest/package.xml"
-fi
 
+# package_retrieve.py plans the retrieve (CustomObject is listed from the org so
+# standard objects are included), pre-purges the types' folders when asked, and
+# runs chunked retrieves concurrently. PACKAGE_NAME=all retrieves every package.
+retrieve_args=(--target-org "$branch_name" --wait "$DEPLOY_TIMEOUT" --max-workers "${RETRIEVE_MAX_WORKERS:-4}")
 if [[ "$PREPURGE" == "true" ]]; then
-    echo "Pre-purging force-app folders for metadata types in $PACKAGE_NAME..."
-
-    metadata_types=$(grep -oP '(?<=<name>)[^<]+(?=</name>)' "scripts/packages/$PACKAGE_NAME" || true)
-
-    while IFS= read -r metadata_type; do
-        if [ -n "$metadata_type" ]; then
-            folder=$(get_folder_for_metadata_type "$metadata_type")
-            if [ -n "$folder" ]; then
-                folder_path="force-app/main/default/$folder"
-                if [ -d "$folder_path" ]; then
-                    echo "  Removing $folder_path..."
-                    rm -rf "$folder_path"
-                fi
-            fi
-        fi
-    done <<< "$metadata_types"
+    retrieve_args+=(--prepurge)
 else
     echo "Skipping pre-purge for $PACKAGE_NAME"
 fi
+if [[ "$PACKAGE_NAME" != "all" ]]; then
+    retrieve_args+=("scripts/packages/$PACKAGE_NAME")
+fi
 
 echo "Retrieving metadata defined in $PACKAGE_NAME from $branch_name..."
-if [[ "$PACKAGE_NAME" == "Objects.xml" ]]; then
-    sf project retrieve start --manifest manifest/package.xml --target-org "$branch_name" --ignore-conflicts --wait "$DEPLOY_TIMEOUT" 1>/dev/null
-else
-    sf project retrieve start --manifest manifest/package.xml --target-org "$branch_name" --ignore-conflicts --wait "$DEPLOY_TIMEOUT"
-fi
+python3 ./scripts/python/package_retrieve.py "${retrieve_args[@]}"
 git add --renormalize force-app/ 2>/dev/null || true
 if [[ -n $(git status --porcelain force-app/) ]]; then
     echo "Changes found in the force-app directory..."
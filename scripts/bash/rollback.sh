@@ -4,7 +4,12 @@
 # Description: Reverts a specific commit (regular or merge) on the current 
 #              branch by creating a new revert commit. Validates that the commit
 #              exists in the branch history and is less than 3 weeks old. 
-#              Restores the original package.xml for correct redeployment.
+#              Writes the minimal package.xml that restores the prior state
+#              (rollback_plan.py); falls back to the commit's original
+#              package.xml when no plan can be made. Components the commit
+#              added are listed for a destroy pipeline. When the commit only
+#              added components there is nothing to redeploy: package.xml is
+#              left unchanged and the revert is pushed with ci.skip.
 # Usage: Called from CI/CD pipeline with SHA environment variable
 # Environment Variables Required:
 #   - SHA: Git commit SHA to revert (must be < 3 weeks old)
@@ -56,15 +61,35 @@ else
   git revert -X ours --no-commit "$SHA" || true
 fi
 
-# Re-insert the commit's package.xml to re-deploy the correct package
-git checkout $SHA -- manifest/package.xml
+# Redeploy only what the commit changed, from the reverted source
+ROLLBACK_REDEPLOY=$(mktemp)
+ROLLBACK_DESTROY=$(mktemp)
+PUSH_OPTS=()
+if python3 ./scripts/python/rollback_plan.py "$SHA" -x manifest/package.xml --redeploy-list "$ROLLBACK_REDEPLOY" --destroy-list "$ROLLBACK_DESTROY"; then
+  if [ -s "$ROLLBACK_REDEPLOY" ]; then
+    echo "Redeploying: $(cat "$ROLLBACK_REDEPLOY")"
+  else
+    echo "$SHA only added components; nothing to redeploy."
+    git checkout HEAD -- manifest/package.xml
+    PUSH_OPTS=(-o ci.skip)
+  fi
+else
+  echo "No rollback plan for $SHA; redeploying its original package.xml."
+  git checkout $SHA -- manifest/package.xml
+fi
 git add manifest/package.xml
 
 # Commit changes
-git commit -m "Reverts changes of $SHA, Triggered by: $GITLAB_USER_NAME"
+COMMIT_ARGS=(-m "Reverts changes of $SHA, Triggered by: $GITLAB_USER_NAME")
+if [ -s "$ROLLBACK_DESTROY" ]; then
+  echo "Run a destroy pipeline with PACKAGE=$(cat "$ROLLBACK_DESTROY") to remove the components $SHA added."
+  COMMIT_ARGS+=(-m "Added by $SHA, destroy with PACKAGE=$(cat "$ROLLBACK_DESTROY")")
+fi
+rm -f "$ROLLBACK_REDEPLOY" "$ROLLBACK_DESTROY"
+git commit "${COMMIT_ARGS[@]}"
 
 # Push changes to remote
-git push "https://${MAINTAINER_PAT_NAME}:${MAINTAINER_PAT_VALUE}@${CI_SERVER_HOST}/${CI_PROJECT_PATH}.git"
+git push "https://${MAINTAINER_PAT_NAME}:${MAINTAINER_PAT_VALUE}@${CI_SERVER_HOST}/${CI_PROJECT_PATH}.git" "${PUSH_OPTS[@]}"
 
 # Cleanup
 git -c advice.detachedHead=false checkout -q $CI_COMMIT_SHORT_SHA
@@ -8,7 +8,7 @@
 #              - fullqa/develop MRs: same lineage + package + predeploy for that
 #                org only (no merge-conflict trial merge; no fullqa/develop deploy gates).
 # Usage: Sourced from GitLab CI (pre-merge-check jobs).
-# Dependencies: git, curl, jq (optional)
+# Dependencies: git, curl, jq (optional), python3 (package check, MR comment lines)
 # Environment: CI_COMMIT_SHA, CI_MERGE_REQUEST_*, CI_MERGE_REQUEST_DIFF_BASE_SHA,
 #              CI_PROJECT_ID, CI_SERVER_HOST, CI_PROJECT_PATH, MAINTAINER_PAT_VALUE,
 #              CI_DEFAULT_BRANCH
@@ -117,6 +117,18 @@ MANIFEST_DELTA_EXCESS=""
 MANIFEST_DELTA_MISSING=""
 MANIFEST_DELTA_DETAIL=""
 
+# JSON reports of package_check.py / compare_manifest_to_git_delta.py; the MR comment
+# lines for both checks are rendered from them by report_render.py
+TEST_REPORT_SCRIPT="scripts/python/report_render.py"
+# The CI job sources this script, so no EXIT trap (it would replace the job
+# shell's); the directory is inside the git-ignored .cache of the workspace and
+# is emptied at the start of every run.
+REPORT_DIR="${CI_PROJECT_DIR:-$PWD}/.cache/branch_compliance"
+rm -rf "$REPORT_DIR"
+mkdir -p "$REPORT_DIR"
+PACKAGE_CHECK_REPORT="$REPORT_DIR/package_check.json"
+MANIFEST_DELTA_REPORT="$REPORT_DIR/manifest_delta.json"
+
 # Function to check how old the source commit is relative to the default branch
 # Returns: "status|age_days|merge_base_sha" format
 # status: "recent" if <= 30 days, "old" if > 30 days, "error" if unable to determine
@@ -513,7 +525,7 @@ if [[ -n "${CI_MERGE_REQUEST_DIFF_BASE_SHA:-}" ]] && command -v sf &>/dev/null &
             MANIFEST_DELTA_DETAIL=$(echo "$sgd_out" | tail -c 800)
             print_status "$YELLOW" "⚠ sfdx-git-delta failed (non-fatal for compliance)"
         elif [[ -f "package/package.xml" ]] && [[ -f "$PACKAGE_XML_PATH" ]]; then
-            mapfile -t _mdlines < <(python3 "$COMPARE_MANIFEST_SCRIPT" "package/package.xml" "$PACKAGE_XML_PATH" 2>/dev/null || printf '%s\n' "error" "" "")
+            mapfile -t _mdlines < <(python3 "$COMPARE_MANIFEST_SCRIPT" "package/package.xml" "$PACKAGE_XML_PATH" --json "$MANIFEST_DELTA_REPORT" 2>/dev/null || printf '%s\n' "error" "" "")
             MANIFEST_DELTA_STATUS="${_mdlines[0]:-error}"
             MANIFEST_DELTA_EXCESS="${_mdlines[1]:-}"
             MANIFEST_DELTA_MISSING="${_mdlines[2]:-}"
@@ -578,30 +590,25 @@ else
             PACKAGE_CHECK_OUTPUT=$(python3 "$PACKAGE_CHECK_SCRIPT" \
                 -x "$PACKAGE_XML_PATH" \
                 -s "$PACKAGE_CHECK_STAGE" \
-                -e "$PACKAGE_CHECK_ENVIRONMENT" 2>&1)
+                -e "$PACKAGE_CHECK_ENVIRONMENT" \
+                --report-json "$PACKAGE_CHECK_REPORT" 2>&1)
             PACKAGE_CHECK_EXIT_CODE=$?
             
-            # Extract warnings from output (especially test annotation warnings)
-            PACKAGE_CHECK_WARNINGS=$(echo "$PACKAGE_CHECK_OUTPUT" | grep -i "WARNING:" || echo "")
-            
             if [[ $PACKAGE_CHECK_EXIT_CODE -eq 0 ]]; then
                 print_status "$GREEN" "✓ Package.xml compliance check passed"
                 print_status "$YELLOW" "Package check output:"
-                echo "$PACKAGE_CHECK_OUTPUT" | while IFS= read -r line; do
-                    # Highlight warnings in yellow
-                    if echo "$line" | grep -qi "WARNING:"; then
+                while IFS= read -r line; do
+                    # Highlight warnings in yellow (warnings are also in the JSON report)
+                    if [[ "${line^^}" == *"WARNING:"* ]]; then
                         print_status "$YELLOW" "  ⚠ $line"
+                        PACKAGE_CHECK_WARNINGS+="$line"$'\n'
                     else
                         print_status "$YELLOW" "  $line"
                     fi
-                done
+                done <<< "$PACKAGE_CHECK_OUTPUT"
                 
-                # Show warnings separately if present
                 if [[ -n "$PACKAGE_CHECK_WARNINGS" ]]; then
-                    print_status "$YELLOW" "⚠ Package check completed with warnings:"
-                    echo "$PACKAGE_CHECK_WARNINGS" | while IFS= read -r warning; do
-                        print_status "$YELLOW" "  $warning"
-                    done
+                    print_status "$YELLOW" "⚠ Package check completed with warnings (listed in the MR comment)"
                 fi
                 PACKAGE_CHECK_STATUS="success"
             else
@@ -1259,81 +1266,16 @@ else
     COMMENT_BODY+="- :question: **Predeploy (\`$PREDEPLOY_JOB_NAME\`)**: Status unknown ($PREDEPLOY_STATUS)"$'\n'
 fi
 
-# Package.xml compliance check
-if [[ "$PACKAGE_CHECK_STATUS" == "success" ]]; then
-    # Extract test classes from output (package_check.py prints test classes as last line via print())
-    # Get the last line and trim whitespace
-    TEST_CLASSES=$(echo "$PACKAGE_CHECK_OUTPUT" | tail -1 | sed 's/^[[:space:]]*//;s/[[:space:]]*$//' || echo "")
-    
-    # Check if there are warnings (especially test annotation warnings)
-    if [[ -n "$PACKAGE_CHECK_WARNINGS" ]]; then
-        # Count test annotation related warnings
-        TEST_ANNOTATION_WARNINGS=$(echo "$PACKAGE_CHECK_WARNINGS" | grep -i "test annotation\|test class" || echo "")
-        
-        if [[ -n "$TEST_CLASSES" && "$TEST_CLASSES" != "not a test" && "$TEST_CLASSES" != *"ERROR"* && "$TEST_CLASSES" != *"Apex Tests"* ]]; then
-            # Format test classes for display (limit length if too long)
-            if [[ ${#TEST_CLASSES} -gt 100 ]]; then
-                TEST_CLASSES_SHORT="${TEST_CLASSES:0:97}..."
-                COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed (Test classes: \`$TEST_CLASSES_SHORT\`)"$'\n'
-            else
-                COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed (Test classes: \`$TEST_CLASSES\`)"$'\n'
-            fi
-        else
-            COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed"$'\n'
-        fi
-        
-        # Add warnings section - prioritize test annotation warnings
-        if [[ -n "$TEST_ANNOTATION_WARNINGS" ]]; then
-            COMMENT_BODY+="  - :warning: **Test Annotation Warnings**: "$'\n'
-            # Build warnings list using process substitution to avoid subshell issues
-            WARNINGS_LIST=""
-            while IFS= read -r warning; do
-                # Clean up warning message for display (remove "WARNING:" prefix if present)
-                CLEAN_WARNING=$(echo "$warning" | sed 's/^[[:space:]]*WARNING:[[:space:]]*//i' | cut -c1-150)
-                if [[ -n "$CLEAN_WARNING" ]]; then
-                    if [[ -n "$WARNINGS_LIST" ]]; then
-                        WARNINGS_LIST+=$'\n'
-                    fi
-                    WARNINGS_LIST+="    - \`$CLEAN_WARNING\`"
-                fi
-            done <<< "$TEST_ANNOTATION_WARNINGS"
-            COMMENT_BODY+="$WARNINGS_LIST"$'\n'
-        fi
-        
-        # Add other warnings if any
-        OTHER_WARNINGS=$(echo "$PACKAGE_CHECK_WARNINGS" | grep -vi "test annotation\|test class" || echo "")
-        if [[ -n "$OTHER_WARNINGS" ]]; then
-            COMMENT_BODY+="  - :warning: **Other Warnings**: "$'\n'
-            WARNINGS_LIST=""
-            while IFS= read -r warning; do
-                CLEAN_WARNING=$(echo "$warning" | sed 's/^[[:space:]]*WARNING:[[:space:]]*//i' | cut -c1-150)
-                if [[ -n "$CLEAN_WARNING" ]]; then
-                    if [[ -n "$WARNINGS_LIST" ]]; then
-                        WARNINGS_LIST+=$'\n'
-                    fi
-                    WARNINGS_LIST+="    - \`$CLEAN_WARNING\`"
-                fi
-            done <<< "$OTHER_WARNINGS"
-            COMMENT_BODY+="$WARNINGS_LIST"$'\n'
-        fi
+# Package.xml compliance check (success/failed lines come from the JSON report:
+# selected test classes, annotation vs other warnings, first error)
+if [[ "$PACKAGE_CHECK_STATUS" == "success" || "$PACKAGE_CHECK_STATUS" == "failed" ]]; then
+    if [[ -s "$PACKAGE_CHECK_REPORT" ]] && PACKAGE_CHECK_LINES=$(python3 "$TEST_REPORT_SCRIPT" mr --package-check "$PACKAGE_CHECK_REPORT"); then
+        COMMENT_BODY+="$PACKAGE_CHECK_LINES"$'\n'
+    elif [[ "$PACKAGE_CHECK_STATUS" == "success" ]]; then
+        COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed"$'\n'
     else
-        # No warnings - standard success message
-        if [[ -n "$TEST_CLASSES" && "$TEST_CLASSES" != "not a test" && "$TEST_CLASSES" != *"ERROR"* && "$TEST_CLASSES" != *"Apex Tests"* ]]; then
-            # Format test classes for display (limit length if too long)
-            if [[ ${#TEST_CLASSES} -gt 100 ]]; then
-                TEST_CLASSES_SHORT="${TEST_CLASSES:0:97}..."
-                COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed (Test classes: \`$TEST_CLASSES_SHORT\`)"$'\n'
-            else
-                COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed (Test classes: \`$TEST_CLASSES\`)"$'\n'
-            fi
-        else
-            COMMENT_BODY+="- :white_check_mark: **Package.xml Compliance**: Check passed"$'\n'
-        fi
+        COMMENT_BODY+="- :x: **Package.xml Compliance**: Check failed - Package.xml compliance check failed"$'\n'
     fi
-elif [[ "$PACKAGE_CHECK_STATUS" == "failed" ]]; then
-    # Extract error message (first error line, limit length)
-    ERROR_MSG=$(echo "$PACKAGE_CHECK_OUTPUT" | grep -i "ERROR" | head -1 | cut -c1-200 || echo "Package.xml compliance check failed")
-    COMMENT_BODY+="- :x: **Package.xml Compliance**: Check failed - $ERROR_MSG"$'\n'
 elif [[ "$PACKAGE_CHECK_STATUS" == "error" ]]; then
     # Limit error message length for display
     ERROR_DISPLAY=$(echo "$PACKAGE_CHECK_OUTPUT" | cut -c1-200 || echo "$PACKAGE_CHECK_OUTPUT")
@@ -1343,17 +1285,17 @@ else
 fi
 
 # sfdx-git-delta vs manifest (recommendation only; does not fail the job)
-if [[ "$MANIFEST_DELTA_STATUS" == "aligned" ]]; then
+if [[ -s "$MANIFEST_DELTA_REPORT" ]] && MANIFEST_DELTA_LINES=$(python3 "$TEST_REPORT_SCRIPT" mr --manifest-delta "$MANIFEST_DELTA_REPORT"); then
+    COMMENT_BODY+="$MANIFEST_DELTA_LINES"$'\n'
+elif [[ "$MANIFEST_DELTA_STATUS" == "aligned" ]]; then
     COMMENT_BODY+="- :white_check_mark: **Manifest vs git delta** (\`sfdx-git-delta\`, constructive only): \`manifest/package.xml\` aligns with additive changes (\`CI_MERGE_REQUEST_DIFF_BASE_SHA\` → HEAD)"$'\n'
 elif [[ "$MANIFEST_DELTA_STATUS" == "warning" ]]; then
     COMMENT_BODY+="- :bulb: **Manifest vs git delta** (recommendation): Declare in \`manifest/package.xml\` only metadata you actually changed (Add/Modify) so deploys stay minimal. Details below."$'\n'
     if [[ -n "$MANIFEST_DELTA_EXCESS" ]]; then
-        EXCESS_SNIP=$(echo "$MANIFEST_DELTA_EXCESS" | cut -c1-500)
-        COMMENT_BODY+="  - **Listed in manifest but not in additive diff:** \`$EXCESS_SNIP\`"$'\n'
+        COMMENT_BODY+="  - **Listed in manifest but not in additive diff:** \`${MANIFEST_DELTA_EXCESS:0:500}\`"$'\n'
     fi
     if [[ -n "$MANIFEST_DELTA_MISSING" ]]; then
-        MISSING_SNIP=$(echo "$MANIFEST_DELTA_MISSING" | cut -c1-500)
-        COMMENT_BODY+="  - **In additive diff but not listed in manifest:** \`$MISSING_SNIP\`"$'\n'
+        COMMENT_BODY+="  - **In additive diff but not listed in manifest:** \`${MANIFEST_DELTA_MISSING:0:500}\`"$'\n'
     fi
 elif [[ "$MANIFEST_DELTA_STATUS" == "error" ]]; then
     ERR_SNIP=$(echo "$MANIFEST_DELTA_DETAIL" | tr '\n' ' ' | cut -c1-400)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Reuse ``@tests:`` scan results from an earlier ``package_check.py`` run.
+
+The prior result is a small JSON file written at the end of a run:
+
+    {"commit": "<HEAD sha>", "tests": {"force-app/.../Foo.cls": "FooTest", ...},
+     "switches": {"force-app/.../Foo.cls": ["Foo_V2"], ...}}
+
+``switches`` holds the ``Utility.switchRunAutomation`` arguments of every Apex file
+(see cmt_rule_check.py) and is reused the same way.
+
+On the next run, one ``git diff --name-only <commit> -- classes triggers`` lists the
+Apex files that differ between that commit and the working tree. Every other file
+listed in the prior result keeps its recorded tests, so only changed members are
+read again and the work is proportional to the diff, not to the manifest.
+
+The diff base is the prior result's own commit (the tests were computed there);
+``base_ref`` (``CI_MERGE_REQUEST_DIFF_BASE_SHA`` in MR pipelines) is used when the
+file has no commit. If git cannot diff against the base (e.g. a shallow clone
+without it), nothing is reused.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import subprocess
+from typing import Dict, List, Optional, Set
+
+BASE_REF_ENV = "CI_MERGE_REQUEST_DIFF_BASE_SHA"
+PRIOR_RESULT_ENV = "PACKAGE_CHECK_PRIOR_RESULT"
+APEX_DIRS = ("force-app/main/default/classes", "force-app/main/default/triggers")
+
+
+def _git(args: List[str]) -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git"] + args, capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def changed_files(base: str, dirs=APEX_DIRS) -> Optional[Set[str]]:
+    """Paths under ``dirs`` that differ between ``base`` and the working tree."""
+    out = _git(["diff", "--name-only", "--no-renames", base, "--"] + list(dirs))
+    if out is None:
+        return None
+    return {line.strip() for line in out.splitlines() if line.strip()}
+
+
+class AnnotationDelta:
+    """
+    Annotation results to reuse in this run, and the ones to save for the next.
+
+    Args:
+        path: Prior result JSON (read if present, rewritten by ``save``).
+        base_ref: Diff base when the prior result does not record its commit.
+    """
+
+    def __init__(self, path: Optional[str], base_ref: Optional[str] = None) -> None:
+        self.path = path
+        self.reusable: Dict[str, str] = {}
+        self.results: Dict[str, str] = {}
+        self.reusable_switches: Dict[str, List[str]] = {}
+        self.switch_results: Dict[str, List[str]] = {}
+        prior = self._read()
+        base = prior.get("commit") or base_ref
+        tests = prior.get("tests") or {}
+        switches = prior.get("switches") or {}
+        if not base or not (tests or switches):
+            return
+        changed = changed_files(base)
+        if changed is None:
+            logging.info("Cannot diff against %s; scanning every Apex member.", base)
+            return
+        self.reusable = {p: t for p, t in tests.items() if p not in changed}
+        self.reusable_switches = {p: s for p, s in switches.items() if p not in changed}
+        logging.info(
+            "Reusing @tests: results for %d Apex file(s) unchanged since %s",
+            len(self.reusable),
+            base[:12],
+        )
+
+    def _read(self) -> dict:
+        if not self.path or not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning("WARNING: Ignoring prior result %s: %s", self.path, e)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def lookup(self, file_path: str) -> Optional[str]:
+        """Recorded tests for an unchanged file, or None when it must be scanned."""
+        return self.reusable.get(file_path)
+
+    def record(self, file_path: str, tests: str) -> None:
+        self.results[file_path] = tests
+
+    def lookup_switches(self, file_path: str) -> Optional[List[str]]:
+        """Recorded switch arguments for an unchanged file, or None to scan it."""
+        return self.reusable_switches.get(file_path)
+
+    def record_switches(self, file_path: str, switches: List[str]) -> None:
+        self.switch_results[file_path] = switches
+
+    def save(self) -> None:
+        """Write this run's results (merged over still-valid prior ones) with HEAD."""
+        if not self.path:
+            return
+        head = (_git(["rev-parse", "HEAD"]) or "").strip()
+        if not head:
+            return
+        # Files changed in the working tree are only valid for that tree.
+        dirty = changed_files("HEAD")
+        if dirty is None:
+            return
+        tests = dict(self.reusable)
+        tests.update(self.results)
+        tests = {p: t for p, t in tests.items() if p not in dirty}
+        switches = dict(self.reusable_switches)
+        switches.update(self.switch_results)
+        switches = {p: s for p, s in switches.items() if p not in dirty}
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(
+                {"commit": head, "tests": tests, "switches": switches},
+                fh,
+                sort_keys=True,
+            )
+        os.replace(tmp, self.path)
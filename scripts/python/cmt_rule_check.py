@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Cross-check ``package_check_cmt_tests.json`` against the Apex source.
+
+The PMD ruleset ``scripts/pmd/encouraged/require_cmt_switch.xml`` asks automation
+to guard itself with ``Utility.switchRunAutomation(...)``, and the CMT rules tell
+package_check which tests to run for a switch. Nothing kept the two in step. This
+script scans every class and trigger once, in a thread pool, for the arguments of
+``Utility.switchRunAutomation`` calls (comments ignored, test classes skipped) and
+reports:
+
+* rules whose Apex member, CMT record file or test classes do not exist;
+* rules whose switch no Apex reads (the member makes no switch call and no file
+  names the rule's CMT record);
+* Apex files that call the switch but are covered by no rule.
+
+A file is covered by a rule when it is the rule's Apex member or when one of its
+string arguments is the rule's CMT DeveloperName (or ``Type.DeveloperName``).
+
+Scan results are kept per file in the ``--prior-result`` annotation cache (see
+apex_delta.py), so package_check only reads the Apex files changed since the
+cached commit.
+
+Usage:
+  python cmt_rule_check.py [-c package_check_cmt_tests.json] [--prior-result P]
+
+Exits 1 when anything is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import apex_delta
+from where_used import SOURCE_ROOT
+
+DEFAULT_CONFIG = "package_check_cmt_tests.json"
+APEX_SOURCES = (("classes", ".cls"), ("triggers", ".trigger"))
+_COMMENT_OR_STRING = re.compile(r"'(?:\\.|[^'\\\n])*'|//[^\n]*|/\*.*?\*/", re.DOTALL)
+_SWITCH_CALL = re.compile(r"\bUtility\s*\.\s*switchRunAutomation\s*\(", re.IGNORECASE)
+_STRING = re.compile(r"'((?:\\.|[^'\\\n])*)'")
+_IS_TEST = re.compile(r"@istest\b", re.IGNORECASE)
+
+
+class RuleReport(NamedTuple):
+    """Broken rules and the switch calls no rule covers (file → arguments)."""
+
+    problems: List[str]
+    unruled: Dict[str, List[str]]
+
+
+def _blank(text: str) -> str:
+    return re.sub(r"[^\n]", " ", text)
+
+
+def _views(source: str) -> Tuple[str, str]:
+    """
+    ``source`` with comments blanked, and again with string contents blanked too.
+
+    Both keep every offset, so a call found in the second is read from the first.
+    """
+    code = []
+    masked = []
+    last = 0
+    for m in _COMMENT_OR_STRING.finditer(source):
+        token = m.group(0)
+        code.append(source[last : m.start()])
+        masked.append(source[last : m.start()])
+        if token.startswith("'"):
+            code.append(token)
+            masked.append("'" + _blank(token[1:-1]) + "'")
+        else:
+            code.append(_blank(token))
+            masked.append(_blank(token))
+        last = m.end()
+    code.append(source[last:])
+    masked.append(source[last:])
+    return "".join(code), "".join(masked)
+
+
+def _closing_paren(masked: str, start: int) -> int:
+    """Offset of the parenthesis closing the one opened just before ``start``."""
+    depth = 1
+    for i in range(start, len(masked)):
+        depth += masked[i] == "("
+        depth -= masked[i] == ")"
+        if not depth:
+            return i
+    return len(masked)
+
+
+def switch_arguments(source: str) -> List[str]:
+    """
+    Switch names passed to ``Utility.switchRunAutomation`` in Apex ``source``.
+
+    Each call contributes its string literals, or its argument expression when it
+    has none (e.g. a constant). Test classes yield nothing.
+    """
+    code, masked = _views(source)
+    if _IS_TEST.search(masked):
+        return []
+    names = []
+    for call in _SWITCH_CALL.finditer(masked):
+        args = code[call.end() : _closing_paren(masked, call.end())]
+        literals = _STRING.findall(args)
+        for name in literals or [" ".join(args.split())]:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def apex_files(root: str = SOURCE_ROOT) -> List[str]:
+    """Every class and trigger under ``root``, as repository-relative paths."""
+    files = []
+    for folder, extension in APEX_SOURCES:
+        directory = f"{root}/{folder}"
+        if not os.path.isdir(directory):
+            continue
+        files.extend(
+            f"{directory}/{name}"
+            for name in sorted(os.listdir(directory))
+            if name.endswith(extension)
+        )
+    return files
+
+
+def _scan_file(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as fh:
+        return switch_arguments(fh.read())
+
+
+def scan_switches(
+    paths: List[str],
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, List[str]]:
+    """
+    Switch arguments of each file in ``paths`` (files without calls included).
+
+    Files ``delta`` knows to be unchanged are not read; the others are read in a
+    thread pool and recorded in ``delta`` for the next run.
+    """
+    found: Dict[str, List[str]] = {}
+    pending = []
+    for path in paths:
+        cached = delta.lookup_switches(path) if delta is not None else None
+        if cached is None:
+            pending.append(path)
+        else:
+            found[path] = cached
+    if pending:
+        workers = max_workers or (os.cpu_count() or 4) * 2
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, names in zip(pending, executor.map(_scan_file, pending)):
+                found[path] = names
+                if delta is not None:
+                    delta.record_switches(path, names)
+    return found
+
+
+def _tests(value: Any) -> List[str]:
+    text = " ".join(value) if isinstance(value, list) else str(value or "")
+    return [
+        t[:-4] if t.lower().endswith(".cls") else t
+        for t in re.split(r"[\s,]+", text)
+        if t
+    ]
+
+
+def _member_path(rule: Dict[str, Any], root: str) -> Optional[str]:
+    apex_type = str(rule.get("apex_type") or "").strip().lower()
+    for (folder, extension), kind in zip(APEX_SOURCES, ("apexclass", "apextrigger")):
+        if apex_type == kind:
+            return f"{root}/{folder}/{rule['apex_name']}{extension}"
+    return None
+
+
+def check_rules(
+    rules: List[Dict[str, Any]],
+    switches: Dict[str, List[str]],
+    root: str = SOURCE_ROOT,
+) -> RuleReport:
+    """
+    Compare ``rules`` with the scanned ``switches`` (see module docstring).
+
+    Args:
+        rules: Entries of package_check_cmt_tests.json.
+        switches: ``scan_switches`` result for every Apex file under ``root``.
+        root: Source directory holding classes, triggers and customMetadata.
+    """
+    problems = []
+    covered = set()
+    by_name: Dict[str, List[str]] = {}
+    for path, names in switches.items():
+        for name in names:
+            by_name.setdefault(name.lower(), []).append(path)
+    classes = {os.path.basename(p)[:-4] for p in switches if p.endswith(".cls")}
+    for i, rule in enumerate(rules):
+        label = f"CMT rule #{i} ({rule.get('apex_type')} {rule.get('apex_name')})"
+        qname = str(rule.get("cmt_record_qualified_name") or "")
+        member = _member_path(rule, root) if rule.get("apex_name") else None
+        if member is None:
+            problems.append(
+                f"{label}: needs apex_type ApexClass/ApexTrigger and apex_name"
+            )
+        elif member not in switches and not os.path.isfile(member):
+            problems.append(f"{label}: Apex source {member} does not exist")
+        if "." not in qname:
+            problems.append(f"{label}: cmt_record_qualified_name must be Type.Name")
+            continue
+        record = f"{root}/customMetadata/{qname}.md-meta.xml"
+        if not os.path.isfile(record):
+            problems.append(f"{label}: CMT record {record} does not exist")
+        for key in ("tests_when_enabled", "tests_when_disabled"):
+            missing = [t for t in _tests(rule.get(key)) if t not in classes]
+            if missing:
+                problems.append(
+                    f"{label}: {key} names missing test classes: {', '.join(missing)}"
+                )
+        developer_name = rule.get("cmt_developer_name") or qname.split(".", 1)[1]
+        readers = by_name.get(developer_name.lower(), []) + by_name.get(
+            qname.lower(), []
+        )
+        if member in switches:
+            covered.add(member)
+        covered.update(readers)
+        if not readers and not switches.get(member):
+            problems.append(
+                f"{label}: no Apex calls Utility.switchRunAutomation for {qname}"
+            )
+    unruled = {
+        path: names
+        for path, names in sorted(switches.items())
+        if names and path not in covered
+    }
+    return RuleReport(problems, unruled)
+
+
+def report_messages(report: RuleReport) -> List[str]:
+    """One log line per problem and per uncovered switch call."""
+    messages = list(report.problems)
+    messages.extend(
+        f"{path} calls Utility.switchRunAutomation({', '.join(names)}) "
+        "but no CMT rule covers it"
+        for path, names in report.unruled.items()
+    )
+    return messages
+
+
+def check(
+    rules: List[Dict[str, Any]],
+    root: str = SOURCE_ROOT,
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+) -> RuleReport:
+    """Scan the Apex under ``root`` (reusing ``delta``) and check ``rules``."""
+    return check_rules(rules, scan_switches(apex_files(root), delta), root)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check CMT test rules against Utility.switchRunAutomation calls."
+    )
+    parser.add_argument("-c", "--cmt-tests-config", default=DEFAULT_CONFIG)
+    parser.add_argument(
+        "--prior-result", default=os.environ.get(apex_delta.PRIOR_RESULT_ENV)
+    )
+    parser.add_argument("--base-ref", default=os.environ.get(apex_delta.BASE_REF_ENV))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        with open(args.cmt_tests_config, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error("ERROR: Cannot read %s: %s", args.cmt_tests_config, e)
+        sys.exit(1)
+    rules = data.get("rules") or data.get("cmt_switch_rules") or []
+    delta = None
+    if args.prior_result:
+        delta = apex_delta.AnnotationDelta(args.prior_result, args.base_ref)
+    messages = report_messages(check(rules, delta=delta))
+    if delta:
+        delta.save()
+    for message in messages:
+        logging.error("ERROR: %s", message)
+    logging.info(
+        "CMT rules checked: %d rule(s), %d finding(s)", len(rules), len(messages)
+    )
+    if messages:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
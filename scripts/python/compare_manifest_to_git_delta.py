@@ -8,10 +8,29 @@ Exits 0 always; prints lines to stdout for bash:
   MISSING_LINE  # semicolon-separated TYPE:Member or empty
 
 STATUS is one of: aligned, warning, error
+
+With ``--json <report.json>`` the same result is also written as JSON (status, the
+first excess/missing pairs and their totals, or the parse error as detail) for
+report_render.py.
+
+Members of managed packages (namespaces in sfdx-project.json, see
+managed_namespaces.py) are ignored on both sides: they are never in the git delta.
+
+Types are interned to integer ids and each type's members kept as one sorted list,
+so the comparison is a merge per type and "Type:Member" strings are only built for
+the pairs that are printed.
+
+Set SCRIPTS_PROFILE / SCRIPTS_METRICS_FILE to record timings (see profiling.py).
 """
+import heapq
+import itertools
+import json
 import sys
 import xml.etree.ElementTree as ET
-from typing import Dict, Iterable, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from managed_namespaces import NamespaceIndex, load_index
+from profiling import run_from_env, span
 
 NS = "http://soap.sforce.com/2006/04/metadata"
 
@@ -52,81 +71,226 @@ def parse_package(path: str) -> Tuple[Dict[str, List[str]], Set[str]]:
     return out, star_types
 
 
-def pairs_from_pkg(
-    pkg: Dict[str, List[str]], star: Set[str]
-) -> Dict[Tuple[str, str], str]:
-    """Return {(type_lower, member) -> "OriginalType:Member"} for case-insensitive
-    set ops on the key while preserving the package's original casing for display."""
-    star_norm = {_norm_type(s) for s in star}
-    out: Dict[Tuple[str, str], str] = {}
-    for tname, members in pkg.items():
-        if _norm_type(tname) in star_norm:
+class TypeTable:
+    """Interned metadata types: one integer id per case-insensitive type name."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+
+    def id_of(self, tname: str) -> int:
+        key = _norm_type(tname)
+        tid = self._ids.get(key)
+        if tid is None:
+            tid = self._ids[key] = len(self._ids)
+        return tid
+
+
+class CompactPackage(NamedTuple):
+    """A package keyed by interned type id.
+
+    ``members`` holds each type's members sorted and de-duplicated, ``names`` the
+    package's own casing of each type (for display) and ``star`` the wildcard types.
+    ``casings`` is only filled when one type appears under several casings: it maps
+    ``(type id, member)`` to the casing of the block the member was first listed in,
+    when that is not ``names[type id]``.
+    """
+
+    members: Dict[int, List[str]]
+    names: Dict[int, str]
+    star: Set[int]
+    casings: Dict[Tuple[int, str], str]
+
+
+def compact_package(
+    pkg: Dict[str, List[str]],
+    star: Set[str],
+    table: TypeTable,
+    managed: Optional[NamespaceIndex] = None,
+) -> CompactPackage:
+    """Intern the types of ``pkg`` in ``table`` and sort each type's members.
+    Wildcarded types and members owned by a namespace in ``managed`` are left out."""
+    star_ids = {table.id_of(s) for s in star}
+    names: Dict[int, str] = {}
+    members: Dict[int, List[str]] = {}
+    casings: Dict[Tuple[int, str], str] = {}
+    for tname, found in pkg.items():
+        tid = table.id_of(tname)
+        # First casing names the type; a member keeps the casing it was first
+        # listed under, as a package should already be consistent with itself.
+        first = names.setdefault(tid, tname)
+        if tid in star_ids:
+            continue
+        if managed is not None:
+            found = [m for m in found if not managed.is_managed(m)]
+        if not found:
+            continue
+        listed = members.setdefault(tid, [])
+        if tname != first:
+            seen = set(listed)
+            for m in found:
+                if m not in seen:
+                    seen.add(m)
+                    casings[(tid, m)] = tname
+        listed.extend(found)
+    for tid, found in members.items():
+        members[tid] = sorted(set(found))
+    return CompactPackage(members, names, star_ids, casings)
+
+
+def sorted_difference(left: List[str], right: List[str]) -> List[str]:
+    """Items of sorted ``left`` that are not in sorted ``right`` (one merge pass)."""
+    if not right:
+        return left
+    out: List[str] = []
+    j, n = 0, len(right)
+    for item in left:
+        while j < n and right[j] < item:
+            j += 1
+        if j == n or right[j] != item:
+            out.append(item)
+    return out
+
+
+def package_difference(
+    left: CompactPackage, right: CompactPackage, skip: Iterable[int] = ()
+) -> Dict[int, List[str]]:
+    """Return type id -> members in ``left`` but not ``right``, except ``skip`` types."""
+    skip = set(skip)
+    out: Dict[int, List[str]] = {}
+    for tid, members in left.members.items():
+        if tid in skip:
             continue
-        for m in members:
-            key = (_norm_type(tname), m)
-            # First write wins; both packages within themselves should already be
-            # internally consistent on casing, so this is fine.
-            out.setdefault(key, f"{tname}:{m}")
+        other = right.members.get(tid)
+        if other == members:
+            continue
+        extra = members if other is None else sorted_difference(members, other)
+        if extra:
+            out[tid] = extra
     return out
 
 
-def fmt_pairs(displays: Iterable[str], limit: int = 40) -> str:
-    items = sorted(displays)
-    if not items:
-        return ""
-    if len(items) > limit:
-        return "; ".join(items[:limit]) + f"; … (+{len(items) - limit} more)"
-    return "; ".join(items)
+def _labels(casing: str, members: List[str]) -> Iterator[str]:
+    for m in members:
+        yield f"{casing}:{m}"
+
+
+def _merged_pairs(diff: Dict[int, List[str]], package: CompactPackage) -> Iterator[str]:
+    """All pairs of ``diff`` in sorted order, for a package with mixed type casings.
+    Each casing's members stay sorted, so the labels are merged lazily."""
+    mixed = {tid for tid, _ in package.casings}
+    streams = []
+    for tid, members in diff.items():
+        groups = {package.names[tid]: members}
+        if tid in mixed:
+            groups = {}
+            for m in members:
+                casing = package.casings.get((tid, m), package.names[tid])
+                groups.setdefault(casing, []).append(m)
+        streams.extend(_labels(casing, found) for casing, found in groups.items())
+    return heapq.merge(*streams)
+
+
+def head_pairs(
+    diff: Dict[int, List[str]], package: CompactPackage, limit: int = 40
+) -> Tuple[List[str], int]:
+    """Return the first ``limit`` ``Type:Member`` pairs of ``diff`` in sorted order
+    and the total number of pairs. Only the returned pairs are built as strings."""
+    total = sum(len(members) for members in diff.values())
+    shown: List[str] = []
+    if package.casings:
+        shown.extend(itertools.islice(_merged_pairs(diff, package), limit))
+        return shown, total
+    names = package.names
+    # ':' never occurs in a type name, so this orders like the joined strings.
+    for tid in sorted(diff, key=lambda t: names[t] + ":"):
+        if len(shown) >= limit:
+            break
+        for m in diff[tid][: limit - len(shown)]:
+            shown.append(f"{names[tid]}:{m}")
+    return shown, total
+
+
+def fmt_diff(
+    diff: Dict[int, List[str]], package: CompactPackage, limit: int = 40
+) -> str:
+    shown, total = head_pairs(diff, package, limit)
+    if total > limit:
+        return "; ".join(shown) + f"; … (+{total - limit} more)"
+    return "; ".join(shown)
+
+
+def write_report(path: Optional[str], status: str, **fields) -> None:
+    """Write the ``--json`` report (for report_render.py) when a path was given."""
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(dict(status=status, **fields), fh)
 
 
 def main() -> None:
-    if len(sys.argv) != 3:
+    args = sys.argv[1:]
+    report_path = None
+    if len(args) == 4 and args[2] == "--json":
+        report_path = args.pop()
+        args.pop()
+    if len(args) != 2:
         print("error", file=sys.stdout)
         print("", file=sys.stdout)
         print("", file=sys.stdout)
         print(
-            "usage: compare_manifest_to_git_delta.py <delta_package.xml> <manifest_package.xml>",
+            "usage: compare_manifest_to_git_delta.py <delta_package.xml> <manifest_package.xml> [--json <report.json>]",
             file=sys.stderr,
         )
         sys.exit(2)
 
-    delta_path, manifest_path = sys.argv[1], sys.argv[2]
+    delta_path, manifest_path = args
     try:
-        delta_pkg, delta_star = parse_package(delta_path)
-        man_pkg, man_star = parse_package(manifest_path)
+        with span("parse"):
+            delta_pkg, delta_star = parse_package(delta_path)
+            man_pkg, man_star = parse_package(manifest_path)
     except (ET.ParseError, OSError) as e:
         print("error", file=sys.stdout)
         print("", file=sys.stdout)
         print("", file=sys.stdout)
         print(str(e), file=sys.stderr)
+        write_report(report_path, "error", detail=str(e))
         return
 
-    delta_map = pairs_from_pkg(delta_pkg, delta_star)
-    man_map = pairs_from_pkg(man_pkg, man_star)
+    with span("intern"):
+        managed = load_index()
+        table = TypeTable()
+        delta = compact_package(delta_pkg, delta_star, table, managed)
+        manifest = compact_package(man_pkg, man_star, table, managed)
 
-    delta_keys = set(delta_map.keys())
-    man_keys = set(man_map.keys())
-    man_star_norm = {_norm_type(s) for s in man_star}
+    with span("diff"):
+        # Excess: declared in manifest but not in additive git delta.
+        # Use the manifest's display casing so the MR comment matches what the dev wrote.
+        excess = package_difference(manifest, delta)
 
-    # Excess: declared in manifest but not in additive git delta.
-    # Use the manifest's display casing so the MR comment matches what the dev wrote.
-    excess_displays = {man_map[k] for k in (man_keys - delta_keys)}
+        # Missing: in delta but not covered by manifest. Skip types fully wildcarded
+        # in the manifest. Use the delta's display casing (it's what sgd would suggest).
+        missing = package_difference(delta, manifest, skip=manifest.star)
 
-    # Missing: in delta but not covered by manifest. Skip types fully wildcarded
-    # in the manifest. Use the delta's display casing (it's what sgd would suggest).
-    missing_displays = {
-        delta_map[k] for k in (delta_keys - man_keys) if k[0] not in man_star_norm
-    }
-
-    if excess_displays or missing_displays:
+    if excess or missing:
         print("warning", file=sys.stdout)
-        print(fmt_pairs(excess_displays), file=sys.stdout)
-        print(fmt_pairs(missing_displays), file=sys.stdout)
+        print(fmt_diff(excess, manifest), file=sys.stdout)
+        print(fmt_diff(missing, delta), file=sys.stdout)
     else:
         print("aligned", file=sys.stdout)
         print("", file=sys.stdout)
         print("", file=sys.stdout)
+    if report_path:
+        excess_pairs, excess_total = head_pairs(excess, manifest)
+        missing_pairs, missing_total = head_pairs(missing, delta)
+        write_report(
+            report_path,
+            "warning" if excess or missing else "aligned",
+            excess=excess_pairs,
+            excess_total=excess_total,
+            missing=missing_pairs,
+            missing_total=missing_total,
+        )
 
 
 if __name__ == "__main__":
-    main()
+    run_from_env("compare_manifest_to_git_delta", main)
@@ -11,18 +11,46 @@ Definitions (mirroring ``find_apex_tests`` / ``validate_tests``):
        ``@tests\\s*:\\s*([^\\r\\n]+)``, case-insensitive), AND
     2. After cleaning, at least one referenced name resolves to an existing
        ``.cls`` file in ``force-app/main/default/classes/``.
+
+``--lint`` reports every unresolved name (and every file without ``@tests:``)
+with its position and the closest existing test class (``name_index.NgramIndex``
+over the ``@isTest`` classes), reading files concurrently. ``--fix`` rewrites a
+misspelled name in place only when a single test class is closest; ties are
+reported for a developer to pick;
+``--format json`` writes a GitLab Code Quality report and ``--format sarif`` a
+SARIF 2.1.0 log for MR annotations.
+
+Usage:
+  python count_test_annotations.py
+  python count_test_annotations.py --lint [--fix] [--format text|json|sarif] \\
+      [--output FILE] [files ...]
 """
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import json
 import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple, Optional
+
+from name_index import NgramIndex
 
 CLASSES_DIR = Path("force-app/main/default/classes")
 TRIGGERS_DIR = Path("force-app/main/default/triggers")
 
 TESTS_RE = re.compile(r"@tests\s*:\s*([^\r\n]+)", re.IGNORECASE)
+TOKEN_RE = re.compile(r"[^\s,]+")
+IDENTIFIER_RE = re.compile(r"^[A-Za-z]\w*$")
+DEFAULT_MAX_DISTANCE = 3
+RULES = {
+    "unresolved-test-class": "@tests: names a class that does not exist",
+    "missing-tests-annotation": "Apex file has no @tests: annotation",
+}
 
 
 def clean_names(test_line: str) -> list[str]:
@@ -45,6 +73,14 @@ def is_test_class(src: str) -> bool:
     return "@istest" in src.lower()
 
 
+def test_class_names(workers: Optional[int] = None) -> set[str]:
+    """Classes whose source is a test class (``is_test_class``), read concurrently."""
+    paths = sorted(CLASSES_DIR.glob("*.cls"))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        flags = list(executor.map(lambda p: is_test_class(read_source(p)), paths))
+    return {p.stem for p, flag in zip(paths, flags) if flag}
+
+
 def annotation_status(src: str, valid_classes: set[str]) -> tuple[bool, bool]:
     """Return (has_annotation, has_valid_annotation)."""
     matches = TESTS_RE.findall(src)
@@ -57,6 +93,13 @@ def annotation_status(src: str, valid_classes: set[str]) -> tuple[bool, bool]:
     return True, False
 
 
+def read_source(p: Path) -> str:
+    try:
+        return p.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        return p.read_text(encoding="utf-8", errors="replace")
+
+
 def scan(paths: list[Path], valid_classes: set[str]) -> dict:
     total = 0
     excluded_test = 0
@@ -68,10 +111,7 @@ def scan(paths: list[Path], valid_classes: set[str]) -> dict:
     missing_examples: list[str] = []
 
     for p in paths:
-        try:
-            src = p.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            src = p.read_text(encoding="utf-8", errors="replace")
+        src = read_source(p)
 
         if p.suffix == ".cls" and is_test_class(src):
             excluded_test += 1
@@ -104,6 +144,277 @@ def scan(paths: list[Path], valid_classes: set[str]) -> dict:
     }
 
 
+class Finding(NamedTuple):
+    """One lint result; ``line``/``column`` are 1-based, ``end_column`` exclusive."""
+
+    path: str
+    line: int
+    column: int
+    end_column: int
+    rule: str
+    name: str
+    suggestion: Optional[str]
+    message: str
+
+
+def conventional_tests(stem: str, index: NgramIndex) -> list[str]:
+    """Existing test classes named after ``stem`` (FooTest, Foo_Test, TestFoo, ...)."""
+    out = []
+    for candidate in (
+        f"{stem}Test",
+        f"{stem}_Test",
+        f"{stem}Tests",
+        f"Test{stem}",
+        f"{stem}HandlerTest",
+    ):
+        out.extend(n for _, n in index.search(candidate, 0) if n not in out)
+    return out
+
+
+def best_matches(index: NgramIndex, name: str, max_distance: int) -> list[str]:
+    """Every indexed name at the lowest distance from ``name`` within the bound."""
+    matches = index.search(name, max_distance)
+    return [n for d, n in matches if d == matches[0][0]]
+
+
+def lint_source(
+    path: str, src: str, valid_classes: set[str], index: NgramIndex, max_distance: int
+) -> list[Finding]:
+    """Report unresolved ``@tests:`` names in one file, or a missing annotation."""
+    findings: list[Finding] = []
+    found_annotation = False
+    for lineno, line in enumerate(src.splitlines(), 1):
+        match = TESTS_RE.search(line)
+        if not match:
+            continue
+        found_annotation = True
+        for token in TOKEN_RE.finditer(match.group(1)):
+            name = token.group()
+            if name.lower().endswith(".cls"):
+                name = name[:-4]
+            # Comment terminators and punctuation after the names are not classes.
+            if not IDENTIFIER_RE.match(name) or name in valid_classes:
+                continue
+            best = best_matches(index, name, max_distance)
+            # Only an unambiguous match is offered as a fix.
+            suggestion = best[0] if len(best) == 1 else None
+            if suggestion:
+                hint = f"; did you mean {suggestion}?"
+            elif best:
+                hint = f"; closest test classes tie: {', '.join(best)}"
+            else:
+                hint = ""
+            start = match.start(1) + token.start()
+            findings.append(
+                Finding(
+                    path,
+                    lineno,
+                    start + 1,
+                    start + len(token.group()) + 1,
+                    "unresolved-test-class",
+                    name,
+                    suggestion,
+                    f"Test class {name} does not exist{hint}",
+                )
+            )
+    if not found_annotation:
+        stem = Path(path).stem
+        candidates = conventional_tests(stem, index)
+        hint = f"; candidates: {', '.join(candidates)}" if candidates else ""
+        findings.append(
+            Finding(
+                path,
+                1,
+                1,
+                1,
+                "missing-tests-annotation",
+                stem,
+                candidates[0] if candidates else None,
+                f"{Path(path).name} has no @tests: annotation{hint}",
+            )
+        )
+    return findings
+
+
+def lint(
+    paths: list[Path],
+    valid_classes: set[str],
+    test_classes: set[str],
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    workers: Optional[int] = None,
+) -> list[Finding]:
+    """
+    Lint non-test Apex files concurrently; findings sorted by path and line.
+
+    Names resolve against ``valid_classes`` (as in package_check); suggestions
+    only come from ``test_classes``, so a fix never names a production class.
+    """
+    index = NgramIndex(test_classes)
+
+    def lint_path(p: Path) -> list[Finding]:
+        src = read_source(p)
+        if p.suffix == ".cls" and is_test_class(src):
+            return []
+        return lint_source(p.as_posix(), src, valid_classes, index, max_distance)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lint_path, paths)
+        findings = [f for batch in results for f in batch]
+    return sorted(findings, key=lambda f: (f.path, f.line, f.column))
+
+
+def apply_fixes(findings: list[Finding]) -> int:
+    """
+    Replace misspelled ``@tests:`` names with their suggestion, in place.
+
+    Only unresolved names with a suggestion are rewritten; missing annotations
+    are left for a developer. Returns the number of files changed.
+    """
+    by_path: dict[str, list[Finding]] = {}
+    for f in findings:
+        if f.rule == "unresolved-test-class" and f.suggestion:
+            by_path.setdefault(f.path, []).append(f)
+    for path, fixes in by_path.items():
+        with open(path, "r", encoding="utf-8", newline="") as fh:
+            lines = fh.read().splitlines(keepends=True)
+        for f in sorted(fixes, key=lambda x: (x.line, x.column), reverse=True):
+            line = lines[f.line - 1]
+            lines[f.line - 1] = (
+                line[: f.column - 1] + f.suggestion + line[f.end_column - 1 :]
+            )
+        with open(path, "w", encoding="utf-8", newline="") as fh:
+            fh.write("".join(lines))
+    return len(by_path)
+
+
+def to_code_quality(findings: list[Finding]) -> list[dict]:
+    """GitLab Code Quality report entries (shown as MR diff annotations)."""
+    out = []
+    for f in findings:
+        fingerprint = hashlib.sha1(
+            f"{f.rule}:{f.path}:{f.name}".encode("utf-8")
+        ).hexdigest()
+        out.append(
+            {
+                "description": f.message,
+                "check_name": f.rule,
+                "fingerprint": fingerprint,
+                "severity": "major" if f.rule == "unresolved-test-class" else "minor",
+                "location": {"path": f.path, "lines": {"begin": f.line}},
+            }
+        )
+    return out
+
+
+def to_sarif(findings: list[Finding]) -> dict:
+    """SARIF 2.1.0 log with one result per finding (fixes for suggestions)."""
+    results = []
+    for f in findings:
+        region = {"startLine": f.line, "startColumn": f.column}
+        result = {
+            "ruleId": f.rule,
+            "level": "error" if f.rule == "unresolved-test-class" else "warning",
+            "message": {"text": f.message},
+            "locations": [
+                {
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": f.path},
+                        "region": region,
+                    }
+                }
+            ],
+        }
+        if f.rule == "unresolved-test-class" and f.suggestion:
+            result["fixes"] = [
+                {
+                    "description": {"text": f"Replace with {f.suggestion}"},
+                    "artifactChanges": [
+                        {
+                            "artifactLocation": {"uri": f.path},
+                            "replacements": [
+                                {
+                                    "deletedRegion": dict(
+                                        region, endColumn=f.end_column
+                                    ),
+                                    "insertedContent": {"text": f.suggestion},
+                                }
+                            ],
+                        }
+                    ],
+                }
+            ]
+        results.append(result)
+    rules = [
+        {"id": rule, "shortDescription": {"text": text}}
+        for rule, text in RULES.items()
+    ]
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [
+            {
+                "tool": {
+                    "driver": {"name": "count_test_annotations", "rules": rules}
+                },
+                "results": results,
+            }
+        ],
+    }
+
+
+def run_lint(args: argparse.Namespace) -> int:
+    valid_classes = existing_class_names()
+    test_classes = test_class_names(args.workers)
+    if args.files:
+        paths = [Path(f) for f in args.files if f.endswith((".cls", ".trigger"))]
+    else:
+        paths = sorted(CLASSES_DIR.glob("*.cls")) + sorted(
+            TRIGGERS_DIR.glob("*.trigger")
+        )
+    findings = lint(paths, valid_classes, test_classes, args.max_distance, args.workers)
+    if args.fix:
+        changed = apply_fixes(findings)
+        print(f"Rewrote @tests: annotations in {changed} file(s)", file=sys.stderr)
+        findings = lint(
+            paths, valid_classes, test_classes, args.max_distance, args.workers
+        )
+
+    if args.format == "json":
+        text = json.dumps(to_code_quality(findings), indent=2)
+    elif args.format == "sarif":
+        text = json.dumps(to_sarif(findings), indent=2)
+    else:
+        text = "\n".join(
+            f"{f.path}:{f.line}:{f.column}: {f.rule}: {f.message}" for f in findings
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    elif text:
+        print(text)
+    unresolved = sum(f.rule == "unresolved-test-class" for f in findings)
+    print(
+        f"{unresolved} unresolved @tests: name(s), "
+        f"{len(findings) - unresolved} file(s) without @tests:",
+        file=sys.stderr,
+    )
+    return 1 if unresolved else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Count or lint @tests: annotations in Apex classes and triggers."
+    )
+    parser.add_argument("files", nargs="*", help="Apex files to lint (default: all)")
+    parser.add_argument("--lint", action="store_true")
+    parser.add_argument("--fix", action="store_true", help="With --lint, fix typos")
+    parser.add_argument("--format", choices=("text", "json", "sarif"), default="text")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE)
+    parser.add_argument("--workers", type=int, default=None)
+    return parser.parse_args()
+
+
 def main() -> None:
     valid_classes = existing_class_names()
 
@@ -140,4 +451,7 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    cli_args = parse_args()
+    if cli_args.lint or cli_args.fix:
+        sys.exit(run_lint(cli_args))
     main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Per-class Apex coverage index built from the JSON files the pipeline already writes.
+
+Supported inputs (format is detected from the document shape):
+
+* ``coverage/test-result-codecoverage.json`` – array of ``{"name", "lines": {"n": hits}}``
+  aggregated per class (``sf apex get test --code-coverage -d coverage``);
+* ``coverage/test-result-<id>.json`` or ``sf ... --json`` output – ``tests[]`` with
+  ``perClassCoverage[].coverage.coveredLines/uncoveredLines`` (detailed coverage),
+  which is what allows estimating coverage for a *subset* of tests;
+* ``coverage/coverage/coverage.json`` – Istanbul-style per-file statement maps
+  written by ``sf project deploy --coverage-formatters json``.
+
+Files are read with ``json_stream.JsonStream`` one record at a time. Line numbers
+are stored as sorted ``array('I')`` per class (and per test/class pair), which is
+far smaller than lists of Python ints and fast to merge.
+"""
+from __future__ import annotations
+
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Set
+
+from json_stream import JsonStream
+
+DEFAULT_THRESHOLD = 75.0
+
+
+def _to_array(lines: Iterable[int]) -> array:
+    return array("I", sorted(set(lines)))
+
+
+def _class_name(path_or_name: str) -> str:
+    base = os.path.basename(path_or_name)
+    for ext in (".cls", ".trigger"):
+        if base.endswith(ext):
+            return base[: -len(ext)]
+    return base
+
+
+class CoverageIndex:
+    """
+    Covered/uncovered line index per Apex class or trigger.
+
+    Attributes:
+        lines: class → every coverable line seen for it.
+        covered: class → lines covered by the run as a whole.
+        by_test: test class → {class → lines that test covered}.
+    """
+
+    def __init__(self) -> None:
+        self.lines: Dict[str, array] = {}
+        self.covered: Dict[str, array] = {}
+        self.by_test: Dict[str, Dict[str, array]] = {}
+        self.detailed: Set[str] = set()
+        self._pending_lines: Dict[str, Set[int]] = {}
+        self._pending_covered: Dict[str, Set[int]] = {}
+        self._pending_tests: Dict[str, Dict[str, Set[int]]] = {}
+
+    # -- loading -----------------------------------------------------------
+    def _add(
+        self, name: str, covered: Iterable[int], uncovered: Iterable[int]
+    ) -> None:
+        cov = set(covered)
+        self._pending_covered.setdefault(name, set()).update(cov)
+        all_lines = self._pending_lines.setdefault(name, set())
+        all_lines.update(cov)
+        all_lines.update(uncovered)
+
+    def _add_test(self, test: str, name: str, covered: Iterable[int]) -> None:
+        self.detailed.add(name)
+        per_class = self._pending_tests.setdefault(test, {})
+        per_class.setdefault(name, set()).update(covered)
+
+    def _load_class_record(self, rec: dict) -> None:
+        name = rec.get("name") or rec.get("apexClassOrTriggerName")
+        lines = rec.get("lines")
+        if not name or not isinstance(lines, dict):
+            return
+        covered = [int(n) for n, hits in lines.items() if hits]
+        uncovered = [int(n) for n, hits in lines.items() if not hits]
+        self._add(_class_name(name), covered, uncovered)
+
+    def _load_test_record(self, rec: dict) -> None:
+        test = (rec.get("ApexClass") or {}).get("Name")
+        for pcc in rec.get("perClassCoverage") or []:
+            name = pcc.get("apexClassOrTriggerName")
+            cov = pcc.get("coverage") or {}
+            if not name:
+                continue
+            covered = cov.get("coveredLines") or []
+            self._add(name, covered, cov.get("uncoveredLines") or [])
+            if test:
+                self._add_test(test, name, covered)
+
+    def _load_istanbul(self, path: str, rec: dict) -> None:
+        stmap = rec.get("statementMap") or {}
+        hits = rec.get("s") or {}
+        covered, uncovered = [], []
+        for sid, loc in stmap.items():
+            line = ((loc or {}).get("start") or {}).get("line")
+            if line is None:
+                continue
+            (covered if hits.get(sid) else uncovered).append(int(line))
+        self._add(_class_name(rec.get("path") or path), covered, uncovered)
+
+    def _load_result_object(self, stream: JsonStream) -> None:
+        for key in stream.iter_object():
+            if key == "result" and stream.peek() == "{":
+                self._load_result_object(stream)
+            elif key == "tests" and stream.peek() == "[":
+                for test in stream.iter_array():
+                    if isinstance(test, dict):
+                        self._load_test_record(test)
+            elif key == "coverage" and stream.peek() == "{":
+                for sub in stream.iter_object():
+                    if sub == "coverage" and stream.peek() == "[":
+                        for rec in stream.iter_array():
+                            if isinstance(rec, dict):
+                                self._load_class_record(rec)
+                    else:
+                        stream.skip_value()
+            elif isinstance(key, str) and stream.peek() == "{":
+                rec = stream.value()
+                if isinstance(rec, dict) and "statementMap" in rec:
+                    self._load_istanbul(key, rec)
+            else:
+                stream.skip_value()
+
+    def load(self, path: str) -> None:
+        """Stream one coverage/test-result JSON file into the index."""
+        with open(path, "r", encoding="utf-8") as fh:
+            stream = JsonStream(fh)
+            first = stream.peek()
+            if first == "[":
+                for rec in stream.iter_array():
+                    if isinstance(rec, dict):
+                        self._load_class_record(rec)
+            elif first == "{":
+                self._load_result_object(stream)
+        self._freeze()
+
+    def _freeze(self) -> None:
+        for name, pending in self._pending_lines.items():
+            if name in self.lines:
+                pending.update(self.lines[name])
+            self.lines[name] = _to_array(pending)
+        for name, pending in self._pending_covered.items():
+            if name in self.covered:
+                pending.update(self.covered[name])
+            self.covered[name] = _to_array(pending)
+        for test, classes in self._pending_tests.items():
+            target = self.by_test.setdefault(test, {})
+            for name, pending in classes.items():
+                if name in target:
+                    pending.update(target[name])
+                target[name] = _to_array(pending)
+        self._pending_lines = {}
+        self._pending_covered = {}
+        self._pending_tests = {}
+
+    # -- queries -----------------------------------------------------------
+    def estimate(self, name: str, tests: Iterable[str]) -> Optional[float]:
+        """
+        Percent of ``name``'s lines covered by ``tests`` alone.
+
+        Returns:
+            Percentage, or None when no per-test detail exists for the class.
+        """
+        total = self.lines.get(name)
+        if not total or name not in self.detailed:
+            return None
+        hit: Set[int] = set()
+        for test in tests:
+            lines = self.by_test.get(test, {}).get(name)
+            if lines:
+                hit.update(lines)
+        return 100.0 * len(hit) / len(total)
+
+    def overall(self, name: str) -> Optional[float]:
+        """Percent covered by the whole run, or None if the class is unknown."""
+        total = self.lines.get(name)
+        if not total:
+            return None
+        return 100.0 * len(self.covered.get(name, ())) / len(total)
+
+
+def load_index(paths: Iterable[str]) -> CoverageIndex:
+    """Build a CoverageIndex from every existing file in ``paths``."""
+    index = CoverageIndex()
+    for path in paths:
+        if path and os.path.isfile(path):
+            index.load(path)
+    return index
+
+
+def coverage_shortfalls(
+    index: CoverageIndex,
+    members: Iterable[str],
+    tests: Iterable[str],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[tuple]:
+    """
+    List Apex members whose estimated coverage from ``tests`` is below ``threshold``.
+
+    Uses per-test detail when loaded for a member, otherwise the run's overall
+    coverage (an upper bound for any subset of tests). Members missing from the
+    index are skipped.
+
+    Returns:
+        ``(member, percent)`` pairs sorted by member name.
+    """
+    selected = list(tests)
+    out = []
+    for member in sorted(set(members)):
+        pct = index.estimate(member, selected)
+        if pct is None:
+            pct = index.overall(member)
+        if pct is not None and pct < threshold:
+            out.append((member, round(pct, 2)))
+    return out
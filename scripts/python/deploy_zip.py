@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Build a Metadata API deploy zip straight from a manifest and the source tree.
+
+``sf project deploy start -x`` converts the whole project from source format on
+every run. This script resolves only the manifest's components through
+``metadataRegistry.json`` and writes them into a zip with ``zipfile``:
+
+* default types: ``flows/Foo.flow-meta.xml`` → ``flows/Foo.flow``; in-folder
+  members (``Folder/Report``) and folders (``reports/Folder-meta.xml``) included;
+* ``matchingContentFile`` (Apex, pages, email templates): the content file and
+  its ``-meta.xml``;
+* ``bundle`` (LWC, Aura): the whole bundle folder;
+* ``decomposed`` (CustomObject, Bot, ...): the parent XML recomposed with the
+  listed children (``<fields>``, ``<botVersions>``, ...), or all of them when
+  the parent itself is listed;
+* children of other types (CustomLabel, WorkflowRule): the parent's file.
+
+Other adapters (static resources, documents, experience bundles) raise
+``UnsupportedComponent``; the deploy script then lets sf convert the source.
+
+Files are read in a thread pool and streamed into the archive in sorted order with
+fixed timestamps, so the same inputs give the same bytes. The zip is named after a
+SHA-256 of the manifest and every source file's git blob id and kept in
+``--cache-dir``; a retry or later job with the same inputs reuses it.
+
+Usage:
+  python deploy_zip.py -x manifest/package.xml [--cache-dir DIR] [-w N]
+
+Prints the zip path. Exits 1 when the zip cannot be built.
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from where_used import SOURCE_ROOT, manifest_members, source_blobs
+
+DEFAULT_CACHE_DIR = ".cache/package_check/deploy"
+KEEP_ZIPS = 5
+META = "-meta.xml"
+_ZIP_TIME = (1980, 1, 1, 0, 0, 0)
+_ROOT_ELEMENT = re.compile(r"<([A-Za-z_][\w.-]*)\b[^>]*?(/?)>")
+_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>\s*")
+
+
+class UnsupportedComponent(ValueError):
+    """A manifest member this builder cannot resolve; sf must convert it."""
+
+
+def _xml_parts(text: str) -> Tuple[str, str, str]:
+    """Split an XML document into (root start tag, inner body, root name)."""
+    text = _DECLARATION.sub("", text)
+    match = _ROOT_ELEMENT.search(text)
+    if not match:
+        raise ValueError("no root element")
+    name = match.group(1)
+    if match.group(2):
+        return match.group(0)[:-2].rstrip() + ">", "", name
+    end = text.rfind(f"</{name}>")
+    if end < match.end():
+        raise ValueError(f"unterminated <{name}>")
+    return match.group(0), text[match.end() : end], name
+
+
+class ComposedFile:
+    """A decomposed parent plus the child files to fold into it."""
+
+    def __init__(self, parent: Optional[str], root_name: str) -> None:
+        self.parent = parent
+        self.root_name = root_name
+        self.children: List[Tuple[str, str]] = []
+
+    def sources(self) -> List[str]:
+        out = [self.parent] if self.parent else []
+        return out + [path for _, path in self.children]
+
+    def render(self, contents: Dict[str, bytes]) -> bytes:
+        if self.parent:
+            start, body, _ = _xml_parts(contents[self.parent].decode("utf-8"))
+        else:
+            start = (
+                f'<{self.root_name} xmlns="http://soap.sforce.com/2006/04/metadata">'
+            )
+            body = "\n"
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n', start, body.rstrip()]
+        for element, path in sorted(self.children):
+            _, child, _ = _xml_parts(contents[path].decode("utf-8"))
+            parts.append(f"\n    <{element}>{child}</{element}>")
+        parts.append(f"\n</{self.root_name}>\n")
+        return "".join(parts).encode("utf-8")
+
+
+class DeployPlan:
+    """
+    Zip entries for a manifest: archive name → source file or ``ComposedFile``.
+
+    Args:
+        registry: Type registry.
+        root: Source root (``force-app/main/default``).
+    """
+
+    def __init__(self, registry: MetadataRegistry, root: str = SOURCE_ROOT) -> None:
+        self.registry = registry
+        self.root = root
+        self.files: Dict[str, str] = {}
+        self.composed: Dict[str, ComposedFile] = {}
+
+    def _dir(self, type_id: str) -> Tuple[str, dict]:
+        entry = self.registry.types[type_id]
+        directory = entry.get("directoryName")
+        if not directory:
+            raise UnsupportedComponent(f"{entry['name']} has no source directory")
+        return directory, entry
+
+    def _require(self, path: str, what: str) -> str:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"{what}: {path} not found")
+        return path
+
+    def _names(self, directory: str, suffix: str) -> List[str]:
+        """Member names for ``*``: every ``<name>.<suffix>-meta.xml`` in a folder."""
+        folder = os.path.join(self.root, directory)
+        if not os.path.isdir(folder):
+            return []
+        tail = f".{suffix}{META}"
+        return sorted(n[: -len(tail)] for n in os.listdir(folder) if n.endswith(tail))
+
+    def add(self, type_name: str, member: str) -> None:
+        """Resolve one manifest member into zip entries."""
+        type_id = self.registry.type_id(type_name)
+        if not type_id:
+            raise UnsupportedComponent(f"unknown type {type_name}")
+        parent_id = self.registry.parent_id(type_name)
+        if parent_id:
+            self._add_child(type_id, parent_id, member)
+            return
+        directory, entry = self._dir(type_id)
+        adapter = (entry.get("strategies") or {}).get("adapter")
+        suffix = entry.get("suffix")
+        if adapter == "bundle":
+            members = (
+                sorted(os.listdir(os.path.join(self.root, directory)))
+                if member == "*"
+                else [member]
+            )
+            for name in members:
+                self._add_bundle(directory, name)
+        elif adapter == "decomposed":
+            for name in self._members(directory, suffix, member, folders=True):
+                self._add_decomposed(type_id, name, None)
+        elif adapter in (None, "default", "matchingContentFile") and suffix:
+            if entry.get("folderContentType"):
+                for name in self._members(directory, suffix, member):
+                    source = os.path.join(
+                        self.root, directory, f"{name}.{suffix}{META}"
+                    )
+                    self.files[f"{directory}/{name}{META}"] = self._require(
+                        source, f"{type_name}:{name}"
+                    )
+                return
+            for name in self._members(directory, suffix, member):
+                self._add_file(directory, suffix, name, adapter, f"{type_name}:{name}")
+        else:
+            raise UnsupportedComponent(f"{type_name} ({adapter} adapter)")
+
+    def _members(
+        self, directory: str, suffix: str, member: str, folders: bool = False
+    ) -> List[str]:
+        if member != "*":
+            return [member]
+        if folders:
+            base = os.path.join(self.root, directory)
+            return sorted(os.listdir(base)) if os.path.isdir(base) else []
+        return self._names(directory, suffix)
+
+    def _add_file(
+        self, directory: str, suffix: str, name: str, adapter: Optional[str], what: str
+    ) -> None:
+        base = os.path.join(self.root, directory, f"{name}.{suffix}")
+        meta = self._require(base + META, what)
+        if adapter == "matchingContentFile":
+            self.files[f"{directory}/{name}.{suffix}"] = self._require(base, what)
+            self.files[f"{directory}/{name}.{suffix}{META}"] = meta
+        else:
+            self.files[f"{directory}/{name}.{suffix}"] = meta
+
+    def _add_bundle(self, directory: str, name: str) -> None:
+        folder = os.path.join(self.root, directory, name)
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"{directory}/{name}: bundle folder not found")
+        for dirpath, _, filenames in os.walk(folder):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                self.files[rel] = path
+
+    def _composed(self, parent_id: str, parent: str) -> ComposedFile:
+        directory, entry = self._dir(parent_id)
+        suffix = entry["suffix"]
+        arcname = f"{directory}/{parent}.{suffix}"
+        composed = self.composed.get(arcname)
+        if composed is None:
+            source = os.path.join(
+                self.root, directory, parent, f"{parent}.{suffix}{META}"
+            )
+            composed = ComposedFile(
+                source if os.path.isfile(source) else None, entry["name"]
+            )
+            self.composed[arcname] = composed
+        return composed
+
+    def _child_files(self, parent_id: str, parent: str) -> Dict[str, Tuple[str, str]]:
+        """``child type id`` + name → (xml element, path) for a decomposed parent."""
+        directory, entry = self._dir(parent_id)
+        children = (entry.get("children") or {}).get("types") or {}
+        by_suffix = {
+            c["suffix"]: (cid, c.get("xmlElementName") or c["directoryName"])
+            for cid, c in children.items()
+            if c.get("suffix")
+        }
+        found = {}
+        folder = os.path.join(self.root, directory, parent)
+        for dirpath, _, filenames in os.walk(folder):
+            for filename in sorted(filenames):
+                if not filename.endswith(META):
+                    continue
+                stem, _, suffix = filename[: -len(META)].rpartition(".")
+                if suffix in by_suffix:
+                    cid, element = by_suffix[suffix]
+                    found[f"{cid}:{stem}"] = (element, os.path.join(dirpath, filename))
+        return found
+
+    def _add_decomposed(
+        self, parent_id: str, parent: str, child: Optional[Tuple[str, str]]
+    ) -> None:
+        composed = self._composed(parent_id, parent)
+        found = self._child_files(parent_id, parent)
+        if child is None:
+            if composed.parent is None:
+                raise FileNotFoundError(f"{parent}: parent source file not found")
+            wanted = sorted(found)
+        else:
+            key = f"{child[0]}:{child[1]}"
+            if child[1] == "*":
+                wanted = sorted(k for k in found if k.startswith(f"{child[0]}:"))
+            elif key not in found:
+                raise FileNotFoundError(f"{parent}.{child[1]}: child source not found")
+            else:
+                wanted = [key]
+        known = set(composed.children)
+        for key in wanted:
+            if found[key] not in known:
+                composed.children.append(found[key])
+
+    def _add_child(self, type_id: str, parent_id: str, member: str) -> None:
+        _, parent_entry = self._dir(parent_id)
+        strategies = parent_entry.get("strategies") or {}
+        if strategies.get("adapter") == "decomposed":
+            parent, _, name = member.rpartition(".")
+            if not parent:
+                raise UnsupportedComponent(f"{member}: no parent in member name")
+            self._add_decomposed(parent_id, parent, (type_id, name))
+            return
+        child = self.registry.types[type_id]
+        if child.get("ignoreParentName"):
+            # e.g. CustomLabel: every label lives in the one CustomLabels file.
+            self.add(parent_entry["name"], "*")
+            return
+        parent = member.split(".", 1)[0]
+        self.add(parent_entry["name"], parent if member != "*" else "*")
+
+    def sources(self) -> Set[str]:
+        out = set(self.files.values())
+        for composed in self.composed.values():
+            out.update(composed.sources())
+        return out
+
+
+def plan_for_manifest(
+    manifest: str, registry: MetadataRegistry, root: str = SOURCE_ROOT
+) -> DeployPlan:
+    plan = DeployPlan(registry, root)
+    for type_name, member in manifest_members(manifest, wildcards=True):
+        plan.add(type_name, member)
+    return plan
+
+
+def content_key(manifest: str, plan: DeployPlan) -> str:
+    """SHA-256 over the manifest bytes and each source's path and git blob id."""
+    blobs = source_blobs(plan.root)
+    digest = hashlib.sha256()
+    with open(manifest, "rb") as fh:
+        digest.update(fh.read())
+    for path in sorted(plan.sources()):
+        norm = os.path.normpath(path).replace(os.sep, "/")
+        blob = blobs.get(norm)
+        if blob is None:
+            with open(path, "rb") as fh:
+                blob = hashlib.sha1(fh.read()).hexdigest()
+        digest.update(f"\0{norm}\0{blob}".encode("utf-8"))
+    for arcname in sorted(plan.composed):
+        digest.update(f"\0composed\0{arcname}".encode("utf-8"))
+    for arcname in sorted(plan.files):
+        digest.update(f"\0file\0{arcname}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read(path: str) -> Tuple[str, bytes]:
+    with open(path, "rb") as fh:
+        return path, fh.read()
+
+
+def write_zip(
+    manifest: str, plan: DeployPlan, output: str, max_workers: int = 8
+) -> None:
+    """Stream the plan's entries (and ``package.xml``) into ``output`` atomically."""
+    contents: Dict[str, bytes] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for path, data in pool.map(_read, sorted(plan.sources())):
+            contents[path] = data
+    entries: List[Tuple[str, Optional[str]]] = [(a, p) for a, p in plan.files.items()]
+    entries += [(a, None) for a in plan.composed]
+    tmp = output + ".tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+
+        def put(arcname: str, data: bytes) -> None:
+            info = zipfile.ZipInfo(arcname, _ZIP_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, data)
+
+        with open(manifest, "rb") as fh:
+            put("package.xml", fh.read())
+        for arcname, path in sorted(entries):
+            if path is not None:
+                put(arcname, contents.pop(path))
+            else:
+                put(arcname, plan.composed[arcname].render(contents))
+    os.replace(tmp, output)
+
+
+def prune(cache_dir: str, keep: int = KEEP_ZIPS) -> None:
+    zips = [
+        os.path.join(cache_dir, n)
+        for n in os.listdir(cache_dir)
+        if fnmatch.fnmatch(n, "deploy-*.zip")
+    ]
+    zips.sort(key=os.path.getmtime, reverse=True)
+    for path in zips[keep:]:
+        os.remove(path)
+
+
+def build_deploy_zip(
+    manifest: str,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    registry: Optional[MetadataRegistry] = None,
+    max_workers: int = 8,
+) -> str:
+    """
+    Return the deploy zip for ``manifest``, building it unless already cached.
+
+    Raises:
+        UnsupportedComponent: A member needs sf's own source conversion.
+        FileNotFoundError: A member's source file is missing.
+        ValueError: A decomposed source file is not well-formed.
+    """
+    plan = plan_for_manifest(manifest, registry or MetadataRegistry.load())
+    os.makedirs(cache_dir, exist_ok=True)
+    output = os.path.join(cache_dir, f"deploy-{content_key(manifest, plan)[:32]}.zip")
+    if os.path.isfile(output):
+        logging.info("Reusing %s", output)
+        os.utime(output)
+    else:
+        write_zip(manifest, plan, output, max_workers)
+        logging.info(
+            "Built %s: %d file(s), %d recomposed",
+            output,
+            len(plan.files),
+            len(plan.composed),
+        )
+    prune(cache_dir)
+    return output
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build a Metadata API deploy zip from a manifest."
+    )
+    parser.add_argument("-x", "--manifest", required=True)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    parser.add_argument("-w", "--max-workers", type=int, default=8)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    try:
+        path = build_deploy_zip(
+            args.manifest,
+            args.cache_dir,
+            MetadataRegistry.load(args.registry),
+            args.max_workers,
+        )
+    except (UnsupportedComponent, OSError, ValueError) as e:
+        logging.error("ERROR: Cannot build deploy zip: %s", e)
+        sys.exit(1)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Scheduled GitLab clean-up: stale pipelines and stale branches.
+
+Replaces the serial ``curl | jq`` and per-branch ``git log`` loops of
+``delete_stale_pipelines.sh`` and ``delete_stale_branches.sh``:
+
+* ``pipelines``: lists pipelines last updated before the cutoff (default 1 month)
+  over keep-alive connections (``org_query.ConnectionPool``). Page 1 tells the
+  page count (``X-Total-Pages``) and the remaining pages are fetched concurrently;
+  without that header (GitLab omits it past 10,000 rows) pages are fetched in
+  windows of ``--workers`` until one comes back short. All ids are collected
+  before the first delete, so deletions never shift the pages being read. Deletes
+  run ``--workers`` at a time.
+* ``branches``: one ``git for-each-ref`` gives every remote branch with its tip
+  date and one ``git branch -r --merged`` the merged set. Branches merged into
+  main older than 1 month, and any branch older than 3 months, are deleted with
+  ``git push --delete`` in batches of ``--batch-size`` refs.
+
+Every API call honours the rate-limit headers: a 429 waits ``Retry-After`` (or
+until ``RateLimit-Reset``) and is retried, and when ``RateLimit-Remaining`` drops
+below the number of workers, requests wait for the reset.
+
+Usage:
+  python gitlab_housekeeping.py pipelines [--months 1] [--workers 8] [--dry-run]
+  python gitlab_housekeeping.py branches [--merged-months 1] [--stale-months 3]
+
+Environment:
+  CI_API_V4_URL (or CI_SERVER_HOST), CI_PROJECT_ID, OWNER_PAT_VALUE (pipelines);
+  CI_SERVER_HOST, CI_PROJECT_PATH, MAINTAINER_PAT_NAME, MAINTAINER_PAT_VALUE
+  (branches).
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from org_query import ConnectionPool
+
+PER_PAGE = 100
+WORKERS = 8
+BRANCH_BATCH = 50
+MAX_RETRIES = 5
+PROTECTED = ("main", "HEAD")
+
+
+class GitLabError(RuntimeError):
+    """A GitLab API call that failed after retries."""
+
+
+def months_ago(
+    months: int, now: Optional[datetime.datetime] = None
+) -> datetime.datetime:
+    """``now`` minus whole calendar months (day clamped to the month's length)."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    month = now.month - 1 - months
+    year = now.year + month // 12
+    month = month % 12 + 1
+    for day in range(now.day, 27, -1):
+        try:
+            return now.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+    return now.replace(year=year, month=month, day=min(now.day, 28))
+
+
+class GitLabClient:
+    """
+    Minimal GitLab REST client shared by worker threads.
+
+    Args:
+        api_url: ``https://host/api/v4`` (``http://`` for a local stand-in).
+        token: Token sent as ``PRIVATE-TOKEN``.
+        workers: Concurrent requests the caller will make (also the pool size).
+    """
+
+    def __init__(self, api_url: str, token: str, workers: int = WORKERS) -> None:
+        self._prefix = urllib.parse.urlsplit(api_url).path.rstrip("/")
+        self._pool = ConnectionPool(api_url, workers)
+        self._token = token
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def _throttle(self) -> None:
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _note_limits(self, status: int, headers: Dict[str, str]) -> Optional[float]:
+        """Record rate-limit state; return the wait before retrying a 429."""
+        now = time.time()
+        reset = headers.get("ratelimit-reset")
+        remaining = headers.get("ratelimit-remaining")
+        resume = 0.0
+        if status == 429:
+            retry_after = headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                resume = now + int(retry_after)
+            elif reset and reset.isdigit():
+                resume = float(reset)
+            else:
+                resume = now + 1
+        elif remaining and remaining.isdigit() and int(remaining) < self._workers:
+            if reset and reset.isdigit():
+                resume = float(reset)
+        if resume > now:
+            with self._lock:
+                self._resume_at = max(self._resume_at, resume)
+        return max(0.0, resume - now) if status == 429 else None
+
+    def call(
+        self, method: str, path: str, params: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """
+        Send one request, waiting out rate limits.
+
+        Returns:
+            (status, headers, decoded JSON body or None).
+
+        Raises:
+            GitLabError: On a 5xx, 429 or connection error that persists after
+                ``MAX_RETRIES``, or a response body that is not JSON.
+        """
+        url = self._prefix + path
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        headers = {"PRIVATE-TOKEN": self._token, "Accept": "application/json"}
+        for attempt in range(1, MAX_RETRIES + 1):
+            self._throttle()
+            try:
+                status, response_headers, data = self._pool.exchange(
+                    method, url, None, headers
+                )
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == MAX_RETRIES:
+                    raise GitLabError(f"{method} {path}: {e}") from e
+                time.sleep(attempt)
+                continue
+            wait = self._note_limits(status, response_headers)
+            if status == 429 or status >= 500:
+                if attempt == MAX_RETRIES:
+                    raise GitLabError(f"{method} {path}: HTTP {status}")
+                time.sleep(wait if wait is not None else attempt)
+                continue
+            try:
+                body = json.loads(data) if data.strip() else None
+            except ValueError as e:
+                raise GitLabError(
+                    f"{method} {path}: HTTP {status} with a non-JSON body"
+                ) from e
+            return status, response_headers, body
+        raise AssertionError("unreachable")
+
+    def _page(self, path: str, params: Dict[str, Any], page: int):
+        status, headers, body = self.call(
+            "GET", path, dict(params, page=page, per_page=PER_PAGE)
+        )
+        if status != 200:
+            raise GitLabError(f"GET {path} page {page}: HTTP {status}")
+        return headers, body or []
+
+    def paginate(self, path: str, params: Dict[str, Any]) -> Iterator[Any]:
+        """Yield every item of a paginated list, prefetching pages concurrently."""
+        headers, first = self._page(path, params, 1)
+        yield from first
+        total = headers.get("x-total-pages", "")
+
+        def fetch(page: int) -> List[Any]:
+            return self._page(path, params, page)[1]
+
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            if total.isdigit():
+                for items in pool.map(fetch, range(2, int(total) + 1)):
+                    yield from items
+                return
+            page = 2
+            short = len(first) < PER_PAGE
+            while not short:
+                for items in pool.map(fetch, range(page, page + self._workers)):
+                    yield from items
+                    short = short or len(items) < PER_PAGE
+                page += self._workers
+
+    def delete_all(self, paths: List[str]) -> Tuple[int, List[str]]:
+        """
+        DELETE every path, ``workers`` at a time.
+
+        Returns:
+            (deleted count, failures as ``path: reason``). 404s count as deleted.
+        """
+        failures: List[str] = []
+
+        def delete(path: str) -> bool:
+            try:
+                status, _, _ = self.call("DELETE", path)
+            except GitLabError as e:
+                failures.append(str(e))
+                return False
+            if status in (202, 204, 404):
+                return True
+            failures.append(f"{path}: HTTP {status}")
+            return False
+
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            deleted = sum(pool.map(delete, paths))
+        return deleted, failures
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+def stale_pipeline_ids(
+    client: GitLabClient, project_id: str, updated_before: datetime.datetime
+) -> List[int]:
+    """Ids of pipelines last updated before ``updated_before``."""
+    stamp = updated_before.strftime("%Y-%m-%dT00:00:00Z")
+    path = f"/projects/{urllib.parse.quote(str(project_id), safe='')}/pipelines"
+    return [p["id"] for p in client.paginate(path, {"updated_before": stamp})]
+
+
+def delete_stale_pipelines(
+    client: GitLabClient, project_id: str, months: int = 1, dry_run: bool = False
+) -> int:
+    """
+    Delete pipelines older than ``months``; returns the number of failures.
+    """
+    ids = stale_pipeline_ids(client, project_id, months_ago(months))
+    logging.info("Found %d pipeline(s) updated over %d month(s) ago", len(ids), months)
+    if dry_run or not ids:
+        return 0
+    project = urllib.parse.quote(str(project_id), safe="")
+    deleted, failures = client.delete_all(
+        [f"/projects/{project}/pipelines/{pid}" for pid in ids]
+    )
+    for failure in failures:
+        logging.warning("WARNING: %s", failure)
+    logging.info("Deleted %d pipeline(s)", deleted)
+    return len(failures)
+
+
+def _git(*args: str) -> str:
+    return subprocess.run(
+        ["git", *args], capture_output=True, text=True, check=True
+    ).stdout
+
+
+def remote_branch_dates(remote: str = "origin") -> Dict[str, int]:
+    """Branch name → tip committer date (unix seconds), from one for-each-ref."""
+    out = _git(
+        "for-each-ref",
+        "--format=%(refname:short)%00%(committerdate:unix)",
+        f"refs/remotes/{remote}",
+    )
+    dates = {}
+    for line in out.splitlines():
+        ref, _, stamp = line.partition("\0")
+        name = ref[len(remote) + 1 :] if ref.startswith(remote + "/") else ref
+        if stamp.isdigit() and name and name != remote:
+            dates[name] = int(stamp)
+    return dates
+
+
+def merged_branches(target: str = "origin/main", remote: str = "origin") -> set:
+    """Remote branches whose tips are reachable from ``target``."""
+    out = _git("branch", "-r", "--merged", target, "--format=%(refname:short)")
+    prefix = remote + "/"
+    return {line[len(prefix) :] for line in out.splitlines() if line.startswith(prefix)}
+
+
+def stale_branches(
+    dates: Dict[str, int],
+    merged: set,
+    merged_before: datetime.datetime,
+    stale_before: datetime.datetime,
+) -> List[str]:
+    """Merged branches past ``merged_before`` plus any branch past ``stale_before``."""
+    out = []
+    for name, stamp in sorted(dates.items()):
+        if name in PROTECTED:
+            continue
+        if stamp < stale_before.timestamp() or (
+            name in merged and stamp < merged_before.timestamp()
+        ):
+            out.append(name)
+    return out
+
+
+def push_results(porcelain: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Parse ``git push --porcelain`` output.
+
+    Returns:
+        Branch name -> (flag, summary) for every ref line, e.g. ``("-",
+        "[deleted]")`` or ``("!", "[remote rejected] (hook declined)")``.
+    """
+    out = {}
+    for line in porcelain.splitlines():
+        parts = line.split("\t")
+        if len(parts) < 3 or len(parts[0]) != 1:
+            continue
+        ref = parts[1].rsplit(":", 1)[-1]
+        if ref.startswith("refs/heads/"):
+            ref = ref[len("refs/heads/") :]
+        out[ref] = (parts[0], parts[2])
+    return out
+
+
+def delete_branches(
+    remote_url: str, branches: List[str], batch_size: int = BRANCH_BATCH
+) -> int:
+    """
+    ``git push --delete`` in batches; returns the number of branches not deleted.
+
+    Each ref's status is read from ``--porcelain`` output, so one rejected branch
+    does not mark the rest of its batch as failed. A push that fails before any
+    ref is sent (no status lines) fails its whole batch.
+    """
+    failed = 0
+    for i in range(0, len(branches), batch_size):
+        batch = branches[i : i + batch_size]
+        proc = subprocess.run(
+            ["git", "push", "--porcelain", remote_url, "--delete", *batch],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        results = push_results(proc.stdout)
+        if proc.returncode != 0 and not results:
+            failed += len(batch)
+            logging.warning(
+                "WARNING: Could not delete %s: %s",
+                ", ".join(batch),
+                proc.stderr.strip(),
+            )
+            continue
+        deleted = [b for b in batch if results.get(b, ("!",))[0] in "-="]
+        if deleted:
+            logging.info("Deleted %d branch(es): %s", len(deleted), ", ".join(deleted))
+        for branch in batch:
+            flag, summary = results.get(branch, ("!", "no status from git push"))
+            if flag not in "-=":
+                failed += 1
+                logging.warning("WARNING: Could not delete %s: %s", branch, summary)
+    return failed
+
+
+def api_url_from_env() -> str:
+    url = os.environ.get("CI_API_V4_URL")
+    if url:
+        return url
+    return f"https://{os.environ['CI_SERVER_HOST']}/api/v4"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete stale pipelines or branches.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pipelines = sub.add_parser("pipelines")
+    pipelines.add_argument("--months", type=int, default=1)
+    pipelines.add_argument("--workers", type=int, default=WORKERS)
+    pipelines.add_argument("--dry-run", action="store_true")
+    branches = sub.add_parser("branches")
+    branches.add_argument("--merged-months", type=int, default=1)
+    branches.add_argument("--stale-months", type=int, default=3)
+    branches.add_argument("--target", default="origin/main")
+    branches.add_argument("--batch-size", type=int, default=BRANCH_BATCH)
+    branches.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "pipelines":
+        client = GitLabClient(
+            api_url_from_env(), os.environ["OWNER_PAT_VALUE"], args.workers
+        )
+        try:
+            failures = delete_stale_pipelines(
+                client, os.environ["CI_PROJECT_ID"], args.months, args.dry_run
+            )
+        except GitLabError as e:
+            logging.error("ERROR: %s", e)
+            sys.exit(1)
+        finally:
+            client.close()
+        sys.exit(1 if failures else 0)
+
+    _git("fetch", "--prune", "-q")
+    candidates = stale_branches(
+        remote_branch_dates(),
+        merged_branches(args.target),
+        months_ago(args.merged_months),
+        months_ago(args.stale_months),
+    )
+    logging.info("Found %d stale branch(es)", len(candidates))
+    if args.dry_run or not candidates:
+        for name in candidates:
+            logging.info("  %s", name)
+        return
+    remote_url = "https://{}:{}@{}/{}.git".format(
+        os.environ["MAINTAINER_PAT_NAME"],
+        os.environ["MAINTAINER_PAT_VALUE"],
+        os.environ["CI_SERVER_HOST"],
+        os.environ["CI_PROJECT_PATH"],
+    )
+    if delete_branches(remote_url, candidates, args.batch_size):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
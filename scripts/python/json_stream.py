@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON reading for large Salesforce result files.
+
+The standard library only decodes whole documents. ``JsonStream`` walks the
+outer containers of a document by hand and decodes each inner value on its own
+with ``json.JSONDecoder.raw_decode``, so a multi-hundred-megabyte test result or
+coverage file is processed one test/class record at a time; memory is bounded by
+the largest single record plus the read buffer.
+
+Example:
+    with open(path, "r", encoding="utf-8") as fh:
+        stream = JsonStream(fh)
+        for key in stream.iter_object():
+            if key == "tests":
+                for test in stream.iter_array():
+                    ...
+            else:
+                stream.skip_value()
+"""
+from __future__ import annotations
+
+import json
+from typing import IO, Any, Iterator
+
+CHUNK_SIZE = 256 * 1024
+_WS = " \t\r\n"
+_NUMBER_CHARS = frozenset("-+0123456789.eE")
+
+
+class JsonStream:
+    """
+    Pull-style reader over a JSON text file handle.
+
+    ``iter_object`` yields keys; after each key the caller must consume the value
+    with ``value``, ``skip_value``, ``iter_array`` or ``iter_object`` before asking
+    for the next key.
+    """
+
+    def __init__(self, handle: IO[str], chunk_size: int = CHUNK_SIZE) -> None:
+        self._fh = handle
+        self._chunk = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._fh.read(self._chunk)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + data
+        self._pos = 0
+        return True
+
+    def _skip_ws(self) -> None:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WS:
+                self._pos += 1
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ("" at EOF)."""
+        self._skip_ws()
+        return self._buf[self._pos] if self._pos < len(self._buf) else ""
+
+    def _expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r}, got {found!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode and return the next complete JSON value."""
+        self._skip_ws()
+        while self._buf[self._pos : self._pos + 1] in _NUMBER_CHARS:
+            # A number cut at the buffer edge still decodes; read until it ends.
+            end = self._pos
+            while end < len(self._buf) and self._buf[end] in _NUMBER_CHARS:
+                end += 1
+            if end < len(self._buf) or not self._fill():
+                break
+        while True:
+            try:
+                val, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return val
+
+    def skip_value(self) -> None:
+        """Consume the next value, streaming through containers instead of decoding them."""
+        char = self.peek()
+        if char == "[":
+            for _ in self.iter_array_lazy():
+                self.skip_value()
+        elif char == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        else:
+            self.value()
+
+    def iter_array(self) -> Iterator[Any]:
+        """
+        Iterate over the elements of the array at the current position.
+
+        Each element is decoded fully; use ``iter_array_lazy`` to descend further.
+        """
+        for _ in self.iter_array_lazy():
+            yield self.value()
+
+    def iter_array_lazy(self) -> Iterator[None]:
+        """
+        Step through an array, yielding once per element without consuming it.
+
+        The caller consumes each element (``value``, ``iter_object``, ...).
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in array, got {char!r}")
+
+    def iter_object(self) -> Iterator[str]:
+        """Step through an object, yielding each key; the caller consumes each value."""
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(":")
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' in object, got {char!r}")
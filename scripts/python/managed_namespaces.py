@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Classify manifest members as local or managed-package using sfdx-project.json.
+
+``plugins.dependencies[].namespace`` in ``sfdx-project.json`` lists the managed
+packages installed in our orgs (SBQQ, blng, pse, ...). Their components can sit in
+a manifest (fields on managed objects, managed layouts, ...) but have no source
+under force-app, so file lookups and git-delta comparisons must skip them.
+
+The namespaces are held in a lowercase ``frozenset``; classifying a member is one
+string split and one set lookup, with no filesystem access. The member's own name
+decides: its last ``.`` segment (and, for layouts, the part after ``-``) is managed
+when it starts with ``<namespace>__``. ``SBQQ__Quote__c.MyField__c`` is therefore a
+local field on a managed object, while ``Account.SBQQ__Field__c`` is managed.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+DEFAULT_PROJECT = "sfdx-project.json"
+
+
+def load_namespaces(project_path: str = DEFAULT_PROJECT) -> FrozenSet[str]:
+    """
+    Return the lowercase managed namespaces declared in ``project_path``.
+
+    Missing or unreadable files yield an empty set (every member is local).
+    """
+    if not project_path or not os.path.isfile(project_path):
+        return frozenset()
+    try:
+        with open(project_path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning("WARNING: Unable to read %s: %s", project_path, e)
+        return frozenset()
+    deps = (data.get("plugins") or {}).get("dependencies") or []
+    return frozenset(
+        d["namespace"].strip().lower()
+        for d in deps
+        if isinstance(d, dict) and (d.get("namespace") or "").strip()
+    )
+
+
+class NamespaceIndex:
+    """
+    Local/managed classifier over a fixed set of namespaces.
+
+    Args:
+        namespaces: Managed namespace prefixes (any casing).
+    """
+
+    def __init__(self, namespaces: Iterable[str]) -> None:
+        self.namespaces: FrozenSet[str] = frozenset(n.lower() for n in namespaces)
+
+    def namespace_of(self, member: str) -> Optional[str]:
+        """Managed namespace owning ``member`` (lowercase), or None when local."""
+        if not self.namespaces or "__" not in member:
+            return None
+        name = member.rsplit(".", 1)[-1]
+        if "-" in name:
+            name = name.split("-", 1)[1]
+        prefix, sep, _ = name.partition("__")
+        if sep and prefix.lower() in self.namespaces:
+            return prefix.lower()
+        return None
+
+    def is_managed(self, member: str) -> bool:
+        return self.namespace_of(member) is not None
+
+    def partition(self, members: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Split ``members`` into (local, managed), keeping their order."""
+        local: List[str] = []
+        managed: List[str] = []
+        for member in members:
+            (managed if self.is_managed(member) else local).append(member)
+        return local, managed
+
+
+@lru_cache(maxsize=None)
+def load_index(project_path: str = DEFAULT_PROJECT) -> NamespaceIndex:
+    """Cached NamespaceIndex for ``project_path`` (read once per process)."""
+    return NamespaceIndex(load_namespaces(project_path))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare package_check memory and time with and without ``--stream``.
+
+Generates full-org style manifests (every member in a few large ``<types>``
+blocks, no Apex) of increasing size and validates each one with
+``package_check.scan_package`` in a fresh interpreter, once parsing the whole
+tree and once streaming it (see manifest_stream.py). Logging is enabled at INFO
+and written to ``os.devnull`` so the cost of formatting the contents listing is
+included.
+
+Prints a Markdown table of wall time and peak RSS per size and mode; the
+streaming column should stay flat while the tree column grows with the manifest.
+
+Usage:
+  python manifest_benchmark.py [--sizes 10000,100000,500000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from xml_writer import write_package_xml
+
+TYPES = ("CustomField", "Layout", "ListView", "RecordType", "WebLink")
+
+
+def write_manifest(path: str, members: int) -> None:
+    """Write a valid manifest with ``members`` members spread over ``TYPES``."""
+    per_type = max(1, members // len(TYPES))
+    with open(path, "w", encoding="utf-8") as fh:
+        write_package_xml(
+            fh,
+            (
+                (name, (f"Object{i // 500}__c.Member{i}__c" for i in range(per_type)))
+                for name in TYPES
+            ),
+            "60.0",
+        )
+
+
+def measure(path: str, stream: bool) -> Dict[str, float]:
+    """Run one validation in a child interpreter; return its time and peak RSS."""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", path]
+        + (["--stream"] if stream else []),
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(path),
+        env={**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))},
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _child(path: str, stream: bool) -> None:
+    import package_check
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(message)s", stream=open(os.devnull, "w")
+    )
+    start = time.perf_counter()
+    package_check.scan_package(path, "deploy", "sandbox", "", stream=stream)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": round(elapsed, 3), "peak_mib": round(peak, 1)}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--stream", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child, args.stream)
+        return
+    sizes: List[int] = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(
+        "| members | file MiB | tree s | tree peak MiB | stream s | stream peak MiB |"
+    )
+    print(
+        "|--------:|---------:|-------:|--------------:|---------:|----------------:|"
+    )
+    with tempfile.TemporaryDirectory(prefix="manifest_benchmark_") as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"package-{size}.xml")
+            write_manifest(path, size)
+            tree = measure(path, False)
+            streamed = measure(path, True)
+            print(
+                f"| {size} | {os.path.getsize(path) / 1048576:.1f} "
+                f"| {tree['seconds']} | {tree['peak_mib']} "
+                f"| {streamed['seconds']} | {streamed['peak_mib']} |"
+            )
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
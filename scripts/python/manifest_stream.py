@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Read a package.xml one ``<types>`` block at a time, in bounded memory.
+
+``ET.parse`` keeps every element of a manifest alive. That is fine for a feature
+branch package, but generated full-org manifests (``sf project generate manifest
+--from-org``) reach hundreds of thousands of members. ``iter_package`` walks the
+file with ``iterparse`` and detaches each element from its parent as soon as it
+ends, so at most one ``<members>`` element exists at a time.
+
+The ``<name>`` of a block usually comes after its members, so members are written
+to a ``SpooledTemporaryFile`` as they stream by: small blocks stay in memory,
+blocks over ``SPOOL_BYTES`` move to disk. The caller reads them back only for the
+types it needs (Apex, ConnectedApp, ...); the others are only counted.
+
+``summary_root`` builds a small ``<Package>`` holding only the members a caller
+keeps, for code written against a parsed tree.
+"""
+from __future__ import annotations
+
+import json
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from xml_writer import METADATA_NS
+
+SPOOL_BYTES = 1 << 20
+PREVIEW = 5
+_BATCH = 1024
+_NONE = "\x00"
+_ENCODED = "\x01"
+
+
+def _local(tag: str, cache: Dict[str, str]) -> str:
+    local = cache.get(tag)
+    if local is None:
+        local = cache[tag] = tag.rsplit("}", 1)[-1]
+    return local
+
+
+def _encode(member: Optional[str]) -> str:
+    if member is None:
+        return _NONE + "\n"
+    if "\n" in member or "\r" in member or member[:1] in (_NONE, _ENCODED):
+        return _ENCODED + json.dumps(member) + "\n"
+    return member + "\n"
+
+
+def _decode(line: str) -> Optional[str]:
+    line = line[:-1]
+    if line == _NONE:
+        return None
+    if line[:1] == _ENCODED:
+        return json.loads(line[1:])
+    return line
+
+
+class TypeBlock:
+    """
+    One ``<types>`` block: its ``<name>`` texts, member count and spooled members.
+
+    Members are kept as in the file (``None`` for an empty ``<members/>``).
+    """
+
+    def __init__(self) -> None:
+        self.names: List[Optional[str]] = []
+        self.count = 0
+        self.wildcard = False
+        self.preview: List[Optional[str]] = []
+        self._pending: List[str] = []
+        self._spool = tempfile.SpooledTemporaryFile(
+            max_size=SPOOL_BYTES, mode="w+", encoding="utf-8", newline=""
+        )
+
+    def add(self, member: Optional[str]) -> None:
+        self.count += 1
+        if member == "*":
+            self.wildcard = True
+        if len(self.preview) < PREVIEW:
+            self.preview.append(member)
+        self._pending.append(_encode(member))
+        if len(self._pending) >= _BATCH:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._spool.write("".join(self._pending))
+        self._pending.clear()
+
+    def members(self) -> Iterator[Optional[str]]:
+        """Stream the members back in file order."""
+        self._flush()
+        self._spool.seek(0)
+        for line in self._spool:
+            yield _decode(line)
+
+    def describe(self) -> str:
+        """``N member(s): a, b, ...`` with at most ``PREVIEW`` names."""
+        shown = ", ".join(map(str, self.preview))
+        more = ", ..." if self.count > len(self.preview) else ""
+        return f"{self.count} member(s): {shown}{more}"
+
+    def close(self) -> None:
+        self._spool.close()
+
+
+def iter_package(path: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the structure of a manifest.
+
+    Yields, in document order:
+
+    * ``("root", tag)`` once, for the root element (``{namespace}Package``);
+    * ``("child", local name)`` for every direct child of the root, when it starts;
+    * ``("types", TypeBlock)`` when a ``<types>`` block ends (closed afterwards);
+    * ``("version", text)`` when a ``<version>`` ends.
+
+    Raises:
+        ET.ParseError: On malformed XML (possibly after some blocks were yielded).
+    """
+    events = ET.iterparse(path, events=("start", "end"))
+    stack: List[ET.Element] = []
+    block: Optional[TypeBlock] = None
+    tags: Dict[str, str] = {}
+    for event, elem in events:
+        if event == "start":
+            stack.append(elem)
+            if len(stack) == 1:
+                yield "root", elem.tag
+            elif len(stack) == 2:
+                local = _local(elem.tag, tags)
+                yield "child", local
+                if local == "types":
+                    block = TypeBlock()
+            continue
+        stack.pop()
+        depth = len(stack)
+        if depth == 2 and block is not None:
+            local = _local(elem.tag, tags)
+            if local == "members":
+                block.add(elem.text)
+            elif local == "name":
+                block.names.append(elem.text)
+        elif depth == 1:
+            local = _local(elem.tag, tags)
+            if local == "types" and block is not None:
+                try:
+                    yield "types", block
+                finally:
+                    block.close()
+                    block = None
+            elif local == "version":
+                yield "version", elem.text
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def add_members(root: ET.Element, type_name: str, members: Iterable[str]) -> None:
+    """Append a ``<types>`` block to ``root`` (members first, as in package.xml)."""
+    types = ET.SubElement(root, f"{{{METADATA_NS}}}types")
+    for member in members:
+        ET.SubElement(types, f"{{{METADATA_NS}}}members").text = member
+    ET.SubElement(types, f"{{{METADATA_NS}}}name").text = type_name
+
+
+def summary_root(path: str, keep: Callable[[str, str], bool]) -> ET.Element:
+    """
+    A ``<Package>`` with the members of ``path`` for which ``keep(type, member)``.
+
+    Blocks without exactly one ``<name>`` are skipped, like
+    ``package_check.get_metadata_members_by_type`` does.
+
+    Raises:
+        ET.ParseError: On malformed XML.
+    """
+    root = ET.Element(f"{{{METADATA_NS}}}Package")
+    for kind, value in iter_package(path):
+        if kind != "types" or len(value.names) != 1 or not value.names[0]:
+            continue
+        type_name = value.names[0]
+        kept = [m for m in value.members() if m and keep(type_name, m)]
+        if kept:
+            add_members(root, type_name, kept)
+    return root
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+One pass over a git history window, grouped by team and Jira issue.
+
+``metadata_audit.sh`` summarizes a week of ``origin/main`` for several teams. This
+script streams ``git log -z --name-status <from>..<to> -- force-app/main/default``
+once, maps every changed path to its metadata component through
+``metadataRegistry.json`` (``MetadataRegistry.component_for_path``) and files each
+commit under every team whose pattern matches its message, like the plugin's
+``--commit-message-include``. Within a team, commits are grouped by the Jira keys
+in the message that match the team pattern.
+
+Outputs, in ``--output-dir``:
+
+* ``metadata-history-<date>.json``: ``{"from", "to", "teams": {team: summary}}``;
+* ``<team>-changes-<date>.md`` for each team with commits, ready to attach.
+
+A team summary is::
+
+    {"commits": 3, "authors": ["..."],
+     "components": {"ApexClass": {"Foo": "AM"}},
+     "issues": {"Q2C-12": {"commits": [{"sha", "author", "date", "subject"}],
+                           "components": {"ApexClass": {"Foo": "M"}}}}}
+
+where ``AM`` lists the git statuses (Added, Modified, Deleted) seen in the window.
+
+Usage:
+  python metadata_history.py --from <sha> --to origin/main \\
+      --team q2c=q2c --team leadz=leadz [--output-dir .] [--date YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from where_used import SOURCE_ROOT
+
+NO_ISSUE = "(no issue key)"
+_JIRA_KEY = re.compile(r"\b([A-Za-z][A-Za-z0-9]+-\d+)\b")
+_RECORD = "\x1e"
+_FIELD = "\x1f"
+
+
+class Commit(NamedTuple):
+    sha: str
+    author: str
+    date: str
+    message: str
+    changes: List[Tuple[str, str]]
+
+
+def parse_record(record: str) -> Optional[Commit]:
+    """Parse one ``git log -z --name-status`` record (after the record separator)."""
+    header, _, body = record.partition("\0")
+    fields = header.split(_FIELD, 3)
+    if len(fields) < 4:
+        return None
+    sha, author, date, message = fields
+    tokens = body.lstrip("\n").split("\0")
+    changes = []
+    i = 0
+    while i < len(tokens):
+        status = tokens[i]
+        if not status:
+            i += 1
+            continue
+        if status[0] in "RC" and i + 2 < len(tokens):
+            # Renames and copies: the old path is gone, the new one changed.
+            if status[0] == "R":
+                changes.append(("D", tokens[i + 1]))
+            changes.append(("A", tokens[i + 2]))
+            i += 3
+        elif i + 1 < len(tokens):
+            changes.append((status[0], tokens[i + 1]))
+            i += 2
+        else:
+            break
+    return Commit(sha, author, date, message.strip(), changes)
+
+
+def iter_commits(
+    start: str, end: str, paths: Tuple[str, ...] = (SOURCE_ROOT,)
+) -> Iterator[Commit]:
+    """
+    Stream commits in ``start..end`` that touch ``paths``.
+
+    Raises:
+        RuntimeError: When git fails (unknown ref, not a repository).
+    """
+    proc = subprocess.Popen(
+        [
+            "git",
+            "log",
+            "-z",
+            "--name-status",
+            f"--format={_RECORD}%H{_FIELD}%an{_FIELD}%aI{_FIELD}%B",
+            f"{start}..{end}",
+            "--",
+            *paths,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    pending = ""
+    for chunk in iter(lambda: proc.stdout.read(64 * 1024), ""):
+        pending += chunk
+        *complete, pending = pending.split(_RECORD)
+        for record in complete:
+            commit = parse_record(record) if record else None
+            if commit:
+                yield commit
+    if pending:
+        commit = parse_record(pending)
+        if commit:
+            yield commit
+    err = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(err.strip() or f"git log exited {proc.returncode}")
+
+
+def _add(components: Dict[str, Dict[str, str]], kind: str, member: str, status: str):
+    seen = components.setdefault(kind, {}).get(member, "")
+    if status not in seen:
+        components[kind][member] = "".join(sorted(seen + status))
+
+
+def summarize(
+    commits: Iterator[Commit],
+    teams: Dict[str, str],
+    registry: MetadataRegistry,
+    root: str = SOURCE_ROOT,
+) -> Dict[str, dict]:
+    """Fold the commit stream into one summary per team (see module docstring)."""
+    patterns = {team: re.compile(regex, re.IGNORECASE) for team, regex in teams.items()}
+    out: Dict[str, dict] = {
+        team: {"commits": 0, "authors": [], "components": {}, "issues": {}}
+        for team in teams
+    }
+    prefix = root.rstrip("/") + "/"
+    for commit in commits:
+        matched = [t for t, p in patterns.items() if p.search(commit.message)]
+        if not matched:
+            continue
+        components = []
+        for status, path in commit.changes:
+            if not path.startswith(prefix):
+                continue
+            component = registry.component_for_path(path[len(prefix) :])
+            if component:
+                components.append((component, status))
+        keys = sorted({k.upper() for k in _JIRA_KEY.findall(commit.message)})
+        entry = {
+            "sha": commit.sha,
+            "author": commit.author,
+            "date": commit.date,
+            "subject": commit.message.splitlines()[0] if commit.message else "",
+        }
+        for team in matched:
+            summary = out[team]
+            summary["commits"] += 1
+            if commit.author not in summary["authors"]:
+                summary["authors"].append(commit.author)
+            issues = [k for k in keys if patterns[team].search(k)] or [NO_ISSUE]
+            for key in issues:
+                issue = summary["issues"].setdefault(
+                    key, {"commits": [], "components": {}}
+                )
+                issue["commits"].append(entry)
+                for (kind, member), status in components:
+                    _add(issue["components"], kind, member, status)
+            for (kind, member), status in components:
+                _add(summary["components"], kind, member, status)
+    for summary in out.values():
+        summary["authors"].sort()
+    return out
+
+
+def _component_lines(components: Dict[str, Dict[str, str]]) -> List[str]:
+    return [
+        f"- `{kind}: {member}` ({status})"
+        for kind in sorted(components, key=str.lower)
+        for member, status in sorted(components[kind].items())
+    ]
+
+
+def render_markdown(team: str, summary: dict, start: str, end: str) -> str:
+    """Markdown change list for one team (Confluence attachment / LLM input)."""
+    count = sum(len(m) for m in summary["components"].values())
+    lines = [
+        f"# {team} metadata changes",
+        "",
+        f"Window: `{start[:12]}..{end}`. {summary['commits']} commit(s), "
+        f"{count} component(s), {len(summary['issues'])} issue(s).",
+        "",
+        f"Authors: {', '.join(summary['authors']) or 'none'}",
+    ]
+    for key in sorted(summary["issues"], key=lambda k: (k == NO_ISSUE, k)):
+        issue = summary["issues"][key]
+        lines += ["", f"## {key}", ""]
+        lines += [
+            f"- {c['sha'][:10]} {c['subject']} ({c['author']}, {c['date'][:10]})"
+            for c in issue["commits"]
+        ]
+        if issue["components"]:
+            lines += ["", "Components:", ""] + _component_lines(issue["components"])
+    return "\n".join(lines) + "\n"
+
+
+def write_outputs(
+    summaries: Dict[str, dict], start: str, end: str, output_dir: str, date: str
+) -> str:
+    """Write the JSON summary and per-team Markdown; return the JSON path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"metadata-history-{date}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"from": start, "to": end, "teams": summaries}, fh, indent=2)
+    for team, summary in summaries.items():
+        if summary["commits"]:
+            md = os.path.join(output_dir, f"{team}-changes-{date}.md")
+            with open(md, "w", encoding="utf-8") as fh:
+                fh.write(render_markdown(team, summary, start, end))
+    return path
+
+
+def _team_arg(value: str) -> Tuple[str, str]:
+    team, sep, regex = value.partition("=")
+    if not sep or not team:
+        raise argparse.ArgumentTypeError("expected TEAM=REGEX")
+    return team, regex or team
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Summarize a git history window per team and Jira issue."
+    )
+    parser.add_argument("--from", dest="start", required=True)
+    parser.add_argument("--to", dest="end", default="origin/main")
+    parser.add_argument("--team", type=_team_arg, action="append", required=True)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--date", default=datetime.date.today().isoformat())
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        summaries = summarize(
+            iter_commits(args.start, args.end),
+            dict(args.team),
+            MetadataRegistry.load(args.registry),
+        )
+    except RuntimeError as e:
+        logging.error("ERROR: git log failed: %s", e)
+        sys.exit(1)
+    path = write_outputs(summaries, args.start, args.end, args.output_dir, args.date)
+    for team, summary in summaries.items():
+        logging.info("%s: %d commit(s)", team, summary["commits"])
+    logging.info("Wrote %s", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Lookups over ``scripts/registry/metadataRegistry.json`` shared by the Python scripts.
+
+The registry is the Salesforce source-deploy-retrieve type registry: top-level
+``types`` keyed by lowercase id (with nested ``children.types``), ``childTypes``
+(child id → parent id), ``suffixes`` (file suffix → type id) and
+``strictDirectoryNames`` (directory → type id). ``MetadataRegistry`` loads it once
+and answers name, parent, directory and suffix questions case-insensitively.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_REGISTRY = os.path.normpath(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "registry",
+        "metadataRegistry.json",
+    )
+)
+
+
+class MetadataRegistry:
+    """
+    Case-insensitive view of metadataRegistry.json.
+
+    Args:
+        data: Parsed registry JSON.
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.types: Dict[str, Dict[str, Any]] = {}
+        self.parents: Dict[str, str] = dict(data.get("childTypes") or {})
+        self.suffixes: Dict[str, str] = dict(data.get("suffixes") or {})
+        self.strict_directories: Dict[str, str] = dict(
+            data.get("strictDirectoryNames") or {}
+        )
+        for type_id, entry in (data.get("types") or {}).items():
+            self.types[type_id] = entry
+            children = (entry.get("children") or {}).get("types") or {}
+            for child_id, child in children.items():
+                self.types.setdefault(child_id, child)
+                self.parents.setdefault(child_id, type_id)
+        self.top_level = frozenset((data.get("types") or {}).keys())
+        self._by_name = {e["name"].lower(): tid for tid, e in self.types.items()}
+        self._by_directory: Dict[str, str] = {}
+        self._child_suffixes: Dict[Tuple[str, str], str] = {}
+        for type_id in sorted(self.top_level):
+            entry = self.types[type_id]
+            directory = entry.get("directoryName")
+            if not directory:
+                continue
+            self._by_directory.setdefault(directory, type_id)
+            children = (entry.get("children") or {}).get("types") or {}
+            for child_id, child in children.items():
+                if child.get("suffix"):
+                    key = (directory, child["suffix"])
+                    self._child_suffixes.setdefault(key, child_id)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_REGISTRY) -> "MetadataRegistry":
+        """Load the registry file; an empty registry when ``path`` is missing."""
+        if not path or not os.path.isfile(path):
+            return cls({})
+        with open(path, "r", encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def type_id(self, name: str) -> Optional[str]:
+        """Registry id for a type name in any casing (None if unknown)."""
+        key = (name or "").lower()
+        if key in self.types:
+            return key
+        return self._by_name.get(key)
+
+    def entry(self, name: str) -> Optional[Dict[str, Any]]:
+        tid = self.type_id(name)
+        return self.types.get(tid) if tid else None
+
+    def canonical_name(self, name: str) -> Optional[str]:
+        """Registry casing of a type name, e.g. ``apexclass`` → ``ApexClass``."""
+        entry = self.entry(name)
+        return entry["name"] if entry else None
+
+    def parent_id(self, name: str) -> Optional[str]:
+        """Parent type id for child types (CustomField → customobject), else None."""
+        tid = self.type_id(name)
+        return self.parents.get(tid) if tid else None
+
+    def directory_name(self, name: str) -> Optional[str]:
+        """Source folder under force-app/main/default (children: the parent's folder)."""
+        tid = self.type_id(name)
+        if not tid:
+            return None
+        parent = self.parents.get(tid)
+        if parent and parent in self.types:
+            return self.types[parent].get("directoryName")
+        return self.types[tid].get("directoryName")
+
+    def suffix(self, name: str) -> Optional[str]:
+        entry = self.entry(name)
+        return entry.get("suffix") if entry else None
+
+    def type_for_suffix(self, suffix: str) -> Optional[str]:
+        """Type id for a file suffix such as ``cls`` or ``field``."""
+        return self.suffixes.get(suffix)
+
+    def component_for_path(self, path: str) -> Optional[Tuple[str, str]]:
+        """
+        (type name, member) for a path relative to force-app/main/default.
+
+        ``classes/Foo.cls`` → ``(ApexClass, Foo)``,
+        ``objects/Account/fields/Foo__c.field-meta.xml`` → ``(CustomField,
+        Account.Foo__c)``, ``lwc/cmp/cmp.js`` → ``(LightningComponentBundle, cmp)``,
+        ``reports/Sales/R1.report-meta.xml`` → ``(Report, Sales/R1)``. None when
+        the folder belongs to no known type.
+        """
+        parts = path.split("/")
+        if len(parts) < 2:
+            return None
+        folder, filename = parts[0], parts[-1]
+        if filename.endswith("-meta.xml"):
+            filename = filename[: -len("-meta.xml")]
+        stem, dot, suffix = filename.rpartition(".")
+        if not dot:
+            stem, suffix = filename, ""
+        if len(parts) > 2:
+            child_id = self._child_suffixes.get((folder, suffix))
+            if child_id:
+                return self.types[child_id]["name"], f"{parts[1]}.{stem}"
+        type_id = self.suffixes.get(suffix)
+        if not type_id or self.types.get(type_id, {}).get("directoryName") != folder:
+            type_id = self.strict_directories.get(folder) or self._by_directory.get(
+                folder
+            )
+        if not type_id:
+            return None
+        entry = self.types[type_id]
+        if len(parts) > 2:
+            if entry.get("inFolder"):
+                return entry["name"], "/".join(parts[1:-1] + [stem])
+            return entry["name"], parts[1]
+        return entry["name"], stem
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Closest-name lookup over a large set of identifiers (Apex class names).
+
+``NgramIndex`` keeps an inverted index from padded character trigrams to names.
+Each edit removes at most three distinct trigrams, so two strings within edit
+distance ``k`` share at least ``len(set(grams)) - 3 * k`` of them (q-gram lemma).
+A query counts shared trigrams through the posting lists, keeps the candidates
+that clear that bound and a length filter, and only then runs a bounded
+Levenshtein on the survivors. Building the index for tens of thousands of names
+takes well under a second and queries touch a small fraction of them. Matching
+ignores case; results keep the original casing.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_Q = 3
+_PAD = "\x00" * (_Q - 1)
+
+
+def levenshtein(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    Edit distance between ``a`` and ``b``.
+
+    With ``limit``, returns ``limit + 1`` as soon as the distance must exceed it.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (ca != cb),
+                )
+            )
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _grams(key: str) -> List[str]:
+    padded = _PAD + key + _PAD
+    return [padded[i : i + _Q] for i in range(len(padded) - _Q + 1)]
+
+
+class NgramIndex:
+    """
+    Trigram index over names for "did you mean" suggestions.
+
+    Args:
+        names: Names to index (case variants of one name are kept together).
+    """
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._keys: List[str] = []
+        self._originals: List[List[str]] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._ids
+
+    def add(self, name: str) -> None:
+        key = name.lower()
+        idx = self._ids.get(key)
+        if idx is not None:
+            if name not in self._originals[idx]:
+                self._originals[idx].append(name)
+            return
+        idx = len(self._keys)
+        self._ids[key] = idx
+        self._keys.append(key)
+        self._originals.append([name])
+        for gram in set(_grams(key)):
+            self._postings.setdefault(gram, []).append(idx)
+
+    def search(self, name: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Return ``(distance, name)`` for every indexed name within the bound."""
+        key = name.lower()
+        grams = set(_grams(key))
+        # Postings hold distinct grams, so the bound must count them the same way.
+        needed = len(grams) - _Q * max_distance
+        counts: Dict[int, int] = {}
+        for gram in grams:
+            for idx in self._postings.get(gram, ()):
+                counts[idx] = counts.get(idx, 0) + 1
+        if needed <= 0:
+            # Very short queries share too few grams to filter on; scan by length.
+            candidates = range(len(self._keys))
+        else:
+            candidates = (i for i, c in counts.items() if c >= needed)
+        out: List[Tuple[int, str]] = []
+        for idx in candidates:
+            other = self._keys[idx]
+            if abs(len(other) - len(key)) > max_distance:
+                continue
+            dist = levenshtein(key, other, max_distance)
+            if dist <= max_distance:
+                out.extend((dist, original) for original in self._originals[idx])
+        out.sort()
+        return out
+
+    def closest(self, name: str, max_distance: int) -> Optional[str]:
+        """Best match within ``max_distance`` (ties broken alphabetically), or None."""
+        matches = self.search(name, max_distance)
+        return matches[0][1] if matches else None
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+SOQL against an org through the REST API, with ``sf data query`` as the fallback.
+
+Every ``sf`` call pays for a Node.js start before any network time. The REST
+client below reads the org's access token and instance URL once per org (from
+``SF_ACCESS_TOKEN`` / ``SF_INSTANCE_URL``, or one ``sf org display --json``), then
+sends queries over keep-alive ``http.client`` connections from a small pool.
+``query_many`` packs up to 25 queries into one ``composite/batch`` request.
+
+Backends (``--query-backend`` in package_check.py, or ``PACKAGE_CHECK_QUERY_BACKEND``):
+
+* ``sf``   – always shell out to ``sf data query`` (previous behaviour);
+* ``rest`` – REST only; missing credentials are an error;
+* ``auto`` – REST when credentials can be resolved, else ``sf``; a REST failure
+  falls back to ``sf`` for the rest of the run.
+
+``SF_INSTANCE_URL`` may be a plain ``http://`` URL, so a local stand-in server can
+replace the org when trying changes.
+"""
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+BACKEND_ENV = "PACKAGE_CHECK_QUERY_BACKEND"
+ACCESS_TOKEN_ENV = "SF_ACCESS_TOKEN"
+INSTANCE_URL_ENV = "SF_INSTANCE_URL"
+API_VERSION_ENV = "SF_API_VERSION"
+BACKENDS = ("auto", "rest", "sf")
+DEFAULT_API_VERSION = "62.0"
+# Salesforce accepts at most 25 subrequests per composite/batch call.
+BATCH_LIMIT = 25
+POOL_SIZE = 4
+TIMEOUT = 120
+
+_backend = os.environ.get(BACKEND_ENV) or "auto"
+# Org alias -> [lock, client]; the lock serialises creating that org's client.
+_clients: Dict[Optional[str], List[Any]] = {}
+_clients_lock = threading.Lock()
+
+
+class QueryError(RuntimeError):
+    """A query could not be run or the org rejected it."""
+
+
+class SfNotFoundError(QueryError):
+    """The Salesforce CLI is not on PATH."""
+
+
+class OrgCredentials(NamedTuple):
+    instance_url: str
+    access_token: str
+    api_version: str
+
+
+def set_backend(name: str) -> None:
+    """Select ``auto``, ``rest`` or ``sf`` for clients created after this call."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown query backend {name!r}")
+    _backend = name
+    with _clients_lock:
+        _clients.clear()
+
+
+def resolve_sf_executable() -> Optional[str]:
+    """
+    Locate the Salesforce CLI executable on PATH.
+
+    Tries ``sf``, then ``sf.cmd``, then ``sf.exe`` so Windows shells resolve the shim correctly.
+
+    Returns:
+        Absolute path to the executable, or None if not found.
+    """
+    for name in ("sf", "sf.cmd", "sf.exe"):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def credentials_from_env() -> Optional[OrgCredentials]:
+    """Credentials from ``SF_ACCESS_TOKEN`` / ``SF_INSTANCE_URL`` (default org only)."""
+    token = os.environ.get(ACCESS_TOKEN_ENV)
+    url = os.environ.get(INSTANCE_URL_ENV)
+    if not token or not url:
+        return None
+    version = os.environ.get(API_VERSION_ENV) or DEFAULT_API_VERSION
+    return OrgCredentials(url.rstrip("/"), token, version)
+
+
+def credentials_from_sf(sf_exe: str, target_org: Optional[str]) -> OrgCredentials:
+    """
+    Read the access token and instance URL with one ``sf org display --json``.
+
+    Raises:
+        QueryError: When the CLI fails or the org has no access token.
+    """
+    cmd = [sf_exe, "org", "display", "--json"]
+    if target_org:
+        cmd += ["--target-org", target_org]
+    try:
+        proc = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=TIMEOUT, check=False
+        )
+        data = json.loads(proc.stdout or "{}")
+    except (OSError, subprocess.TimeoutExpired, json.JSONDecodeError) as e:
+        raise QueryError(f"sf org display failed: {e}") from e
+    result = data.get("result") or {}
+    if proc.returncode != 0 or not result.get("accessToken"):
+        message = data.get("message") or proc.stderr or "no access token"
+        raise QueryError(f"sf org display failed: {message[:800]}")
+    version = (
+        os.environ.get(API_VERSION_ENV)
+        or result.get("apiVersion")
+        or DEFAULT_API_VERSION
+    )
+    return OrgCredentials(
+        result["instanceUrl"].rstrip("/"), result["accessToken"], version
+    )
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections to one host, shared by threads.
+
+    Args:
+        base_url: ``https://host[:port]`` (``http://`` for local stand-ins).
+        size: Connections kept open between requests.
+    """
+
+    def __init__(self, base_url: str, size: int = POOL_SIZE) -> None:
+        parts = urllib.parse.urlsplit(base_url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname or ""
+        self._port = parts.port
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(
+            maxsize=max(1, size)
+        )
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=TIMEOUT)
+
+    def request(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple[int, bytes]:
+        """Send one request; a stale keep-alive connection is replaced once."""
+        status, _, data = self.exchange(method, path, body, headers)
+        return status, data
+
+    def exchange(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Like ``request``, also returning the response headers (lowercase names)."""
+        for attempt in (1, 2):
+            try:
+                if attempt > 1:
+                    raise queue.Empty
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if reused and attempt == 1:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return (
+                response.status,
+                {k.lower(): v for k, v in response.getheaders()},
+                data,
+            )
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RestQueryClient:
+    """
+    SOQL over the REST API for one org.
+
+    Args:
+        credentials: Instance URL, access token and API version.
+        pool_size: Keep-alive connections to the instance.
+    """
+
+    def __init__(self, credentials: OrgCredentials, pool_size: int = POOL_SIZE):
+        self.credentials = credentials
+        self._pool = ConnectionPool(credentials.instance_url, pool_size)
+        self._prefix = f"/services/data/v{credentials.api_version}"
+
+    def _call(self, method: str, path: str, payload: Any = None) -> Any:
+        headers = {
+            "Authorization": f"Bearer {self.credentials.access_token}",
+            "Accept": "application/json",
+        }
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            status, data = self._pool.request(method, path, body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            raise QueryError(
+                f"REST request to {self.credentials.instance_url} failed: {e}"
+            ) from e
+        try:
+            decoded = json.loads(data or b"null")
+        except json.JSONDecodeError as e:
+            raise QueryError(f"Invalid JSON from REST API (HTTP {status})") from e
+        if status >= 400:
+            raise QueryError(f"REST API returned HTTP {status}: {_error_text(decoded)}")
+        return decoded
+
+    def _follow(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        records = list(result.get("records") or [])
+        while not result.get("done", True) and result.get("nextRecordsUrl"):
+            result = self._call("GET", result["nextRecordsUrl"])
+            records.extend(result.get("records") or [])
+        return records
+
+    def query(self, soql: str) -> List[Dict[str, Any]]:
+        """Return every record of ``soql`` (following ``nextRecordsUrl``)."""
+        path = f"{self._prefix}/query?q={urllib.parse.quote(soql)}"
+        return self._follow(self._call("GET", path))
+
+    def query_many(self, soqls: List[str]) -> List[List[Dict[str, Any]]]:
+        """Run ``soqls`` as composite/batch requests of up to 25 queries each."""
+        out: List[List[Dict[str, Any]]] = []
+        version = f"v{self.credentials.api_version}"
+        for start in range(0, len(soqls), BATCH_LIMIT):
+            chunk = soqls[start : start + BATCH_LIMIT]
+            payload = {
+                "batchRequests": [
+                    {
+                        "method": "GET",
+                        "url": f"{version}/query?q={urllib.parse.quote(q)}",
+                    }
+                    for q in chunk
+                ]
+            }
+            data = self._call("POST", f"{self._prefix}/composite/batch", payload)
+            results = data.get("results") or []
+            if len(results) != len(chunk):
+                raise QueryError("composite/batch returned an unexpected result count")
+            for soql, item in zip(chunk, results):
+                if item.get("statusCode", 500) >= 400:
+                    raise QueryError(
+                        f"Query failed ({soql}): {_error_text(item.get('result'))}"
+                    )
+                out.append(self._follow(item.get("result") or {}))
+        return out
+
+
+class SfCliQueryClient:
+    """
+    SOQL through ``sf data query --json`` (one CLI process per query).
+
+    Args:
+        target_org: Org alias; None uses the CLI default org.
+        max_workers: Concurrent CLI processes in ``query_many``.
+    """
+
+    def __init__(self, target_org: Optional[str], max_workers: int = POOL_SIZE):
+        self.target_org = target_org
+        self.max_workers = max_workers
+
+    def query(self, soql: str) -> List[Dict[str, Any]]:
+        sf_exe = resolve_sf_executable()
+        if not sf_exe:
+            raise SfNotFoundError("Salesforce CLI (sf) not found on PATH.")
+        # SOQL must be passed with -q / --query (positional SOQL is rejected by current sf CLI).
+        cmd = [sf_exe, "data", "query", "-q", soql, "--json"]
+        if self.target_org:
+            cmd += ["--target-org", self.target_org]
+        try:
+            proc = subprocess.run(
+                cmd, capture_output=True, text=True, timeout=TIMEOUT, check=False
+            )
+        except FileNotFoundError as e:
+            raise SfNotFoundError("Salesforce CLI (sf) not found.") from e
+        except subprocess.TimeoutExpired as e:
+            raise QueryError(f"sf data query timed out: {soql}") from e
+        try:
+            data = json.loads(proc.stdout or "{}")
+        except json.JSONDecodeError as e:
+            raise QueryError(
+                f"Invalid JSON from sf data query: {(proc.stdout or '')[:500]}"
+            ) from e
+        if proc.returncode != 0 or data.get("status") != 0:
+            err = data.get("message") or proc.stderr or proc.stdout or "unknown error"
+            raise QueryError(f"sf data query failed: {err[:800]}")
+        return (data.get("result") or {}).get("records") or []
+
+    def query_many(self, soqls: List[str]) -> List[List[Dict[str, Any]]]:
+        if len(soqls) <= 1:
+            return [self.query(q) for q in soqls]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(soqls))) as ex:
+            return list(ex.map(self.query, soqls))
+
+
+class FallbackQueryClient:
+    """REST client that switches to ``sf`` for good after its first failure."""
+
+    def __init__(self, rest: RestQueryClient, target_org: Optional[str]) -> None:
+        self._rest: Optional[RestQueryClient] = rest
+        self._sf = SfCliQueryClient(target_org)
+        self._org = target_org or "default org"
+
+    def _run(self, method: str, arg):
+        rest = self._rest
+        if rest is not None:
+            try:
+                return getattr(rest, method)(arg)
+            except QueryError as e:
+                logging.warning(
+                    "WARNING: REST query to %s failed (%s); using sf CLI.", self._org, e
+                )
+                self._rest = None
+        return getattr(self._sf, method)(arg)
+
+    def query(self, soql: str) -> List[Dict[str, Any]]:
+        return self._run("query", soql)
+
+    def query_many(self, soqls: List[str]) -> List[List[Dict[str, Any]]]:
+        return self._run("query_many", soqls)
+
+
+def _error_text(decoded: Any) -> str:
+    if isinstance(decoded, list) and decoded and isinstance(decoded[0], dict):
+        decoded = decoded[0]
+    if isinstance(decoded, dict):
+        return str(decoded.get("message") or decoded.get("errorCode") or decoded)[:800]
+    return str(decoded)[:800]
+
+
+def _create_client(target_org: Optional[str]):
+    if _backend == "sf":
+        return SfCliQueryClient(target_org)
+    credentials = None if target_org else credentials_from_env()
+    if credentials is None:
+        sf_exe = resolve_sf_executable()
+        try:
+            if not sf_exe:
+                raise SfNotFoundError("Salesforce CLI (sf) not found on PATH.")
+            credentials = credentials_from_sf(sf_exe, target_org)
+        except QueryError as e:
+            if _backend == "rest":
+                raise
+            logging.info("REST credentials unavailable (%s); using sf CLI.", e)
+            return SfCliQueryClient(target_org)
+    logging.info(
+        "Querying %s over REST (%s)",
+        target_org or "default org",
+        credentials.instance_url,
+    )
+    client = RestQueryClient(credentials)
+    return client if _backend == "rest" else FallbackQueryClient(client, target_org)
+
+
+def client_for(target_org: Optional[str] = None):
+    """
+    Shared query client for ``target_org`` (None: the default org).
+
+    Credentials are resolved once per org and process; concurrent callers for the
+    same org wait for the first one instead of each starting ``sf org display``.
+
+    Raises:
+        QueryError: With the ``rest`` backend, when no credentials are available.
+    """
+    with _clients_lock:
+        entry = _clients.get(target_org)
+        if entry is None:
+            entry = _clients[target_org] = [threading.Lock(), None]
+    with entry[0]:
+        if entry[1] is None:
+            entry[1] = _create_client(target_org)
+        return entry[1]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Overlap and gap report for the ``scripts/packages/*.xml`` catalog.
+
+Every package file is parsed once into a shared index of type → the files (and
+members) that claim it. From that index the script reports:
+
+* duplicates – a type listed in more than one package file;
+* conflicts – a child type (CustomField, WorkflowRule, ...) in one file while its
+  parent type is listed in another, which makes both packages retrieve it;
+* unknown types – names that are not in ``metadataRegistry.json``;
+* unclaimed types – top-level registry types no package claims
+  (only with ``--show-unclaimed``; the registry lists several hundred types).
+
+Duplicates, conflicts and unknown types fail the run, so it can be used from the
+pre-commit hook (lint-staged passes the staged package files as arguments; the
+whole catalog is still indexed, and only findings touching those files fail).
+
+Usage:
+  python package_catalog.py [--json] [--show-unclaimed] [files ...]
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+
+ns = {"sforce": "http://soap.sforce.com/2006/04/metadata"}
+DEFAULT_CATALOG = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "packages")
+)
+_DECLARATION_RE = re.compile(r"<\?xml[^>]*\?>")
+
+# type name → {package file → members}
+CatalogIndex = Dict[str, Dict[str, List[str]]]
+
+
+def _parse_package_file(path: str) -> ET.Element:
+    # Objects.xml carries comments ahead of its XML declaration, which strict
+    # parsers reject; drop the declaration instead (retrieves tolerate both).
+    with open(path, "r", encoding="utf-8") as fh:
+        text = _DECLARATION_RE.sub("", fh.read(), count=1)
+    return ET.fromstring(text)
+
+
+def index_catalog(paths: List[str]) -> CatalogIndex:
+    """
+    Parse each package file once and index its types.
+
+    Raises:
+        ET.ParseError: When a package file is not well-formed XML.
+    """
+    index: CatalogIndex = {}
+    for path in paths:
+        root = _parse_package_file(path)
+        for metadata_type in root.findall("sforce:types", ns):
+            name = (metadata_type.findtext("sforce:name", "", ns) or "").strip()
+            if not name:
+                continue
+            members = [
+                (m.text or "").strip()
+                for m in metadata_type.findall("sforce:members", ns)
+            ]
+            index.setdefault(name, {}).setdefault(path, []).extend(members)
+    return index
+
+
+def analyze_catalog(
+    index: CatalogIndex, registry: MetadataRegistry
+) -> Dict[str, object]:
+    """
+    Compute duplicates, parent/child conflicts, unknown and unclaimed types.
+
+    Returns:
+        Dict with ``duplicates`` (type → files), ``conflicts`` (list of
+        {child, child_files, parent, parent_files}), ``unknown`` (type → files)
+        and ``unclaimed`` (sorted registry type names).
+    """
+    duplicates = {
+        name: sorted(files) for name, files in index.items() if len(files) > 1
+    }
+    unknown = {
+        name: sorted(files)
+        for name, files in index.items()
+        if registry.types and registry.type_id(name) is None
+    }
+    by_id: Dict[str, str] = {}
+    for name in index:
+        tid = registry.type_id(name)
+        if tid:
+            by_id[tid] = name
+
+    conflicts = []
+    for tid, name in sorted(by_id.items()):
+        parent = registry.parents.get(tid)
+        parent_name = by_id.get(parent) if parent else None
+        if not parent_name:
+            continue
+        child_files = set(index[name])
+        parent_files = set(index[parent_name])
+        if child_files - parent_files:
+            conflicts.append(
+                {
+                    "child": name,
+                    "child_files": sorted(child_files),
+                    "parent": parent_name,
+                    "parent_files": sorted(parent_files),
+                }
+            )
+
+    unclaimed = sorted(
+        registry.types[tid]["name"] for tid in registry.top_level if tid not in by_id
+    )
+    return {
+        "duplicates": duplicates,
+        "conflicts": conflicts,
+        "unknown": unknown,
+        "unclaimed": unclaimed,
+    }
+
+
+def _touches(files: List[str], only: Optional[set]) -> bool:
+    return only is None or bool(only.intersection(files))
+
+
+def filter_findings(findings: Dict[str, object], only: Optional[set]) -> None:
+    """Drop duplicates/conflicts/unknown types that involve none of ``only``."""
+    if only is None:
+        return
+    findings["duplicates"] = {
+        k: v for k, v in findings["duplicates"].items() if _touches(v, only)
+    }
+    findings["unknown"] = {
+        k: v for k, v in findings["unknown"].items() if _touches(v, only)
+    }
+    findings["conflicts"] = [
+        c
+        for c in findings["conflicts"]
+        if _touches(c["child_files"] + c["parent_files"], only)
+    ]
+
+
+def print_report(findings: Dict[str, object], show_unclaimed: bool) -> None:
+    """Log findings in a human-readable form."""
+    for name, files in sorted(findings["duplicates"].items()):
+        logging.error(
+            "ERROR: %s is listed in more than one package: %s", name, ", ".join(files)
+        )
+    for conflict in findings["conflicts"]:
+        logging.error(
+            "ERROR: %s in %s is also retrieved through %s in %s",
+            conflict["child"],
+            ", ".join(conflict["child_files"]),
+            conflict["parent"],
+            ", ".join(conflict["parent_files"]),
+        )
+    for name, files in sorted(findings["unknown"].items()):
+        logging.error(
+            "ERROR: %s is not in the metadata registry (%s)", name, ", ".join(files)
+        )
+    if show_unclaimed:
+        for name in findings["unclaimed"]:
+            logging.info("Not in any package: %s", name)
+
+
+def main(
+    files: List[str],
+    catalog_dir: str = DEFAULT_CATALOG,
+    registry_path: str = DEFAULT_REGISTRY,
+    as_json: bool = False,
+    show_unclaimed: bool = False,
+) -> int:
+    """
+    Index the catalog, report findings and return the exit code.
+
+    Args:
+        files: Package files to restrict findings to (empty = whole catalog).
+        catalog_dir: Directory holding the package files.
+        registry_path: metadataRegistry.json path.
+        as_json: Print findings as JSON instead of log lines.
+        show_unclaimed: Also list registry types no package claims.
+
+    Returns:
+        1 when duplicates, conflicts or unknown types were found, else 0.
+    """
+    selected = [os.path.relpath(f) for f in files]
+    paths = [os.path.relpath(p) for p in glob.glob(os.path.join(catalog_dir, "*.xml"))]
+    paths = sorted(set(paths).union(selected))
+    try:
+        index = index_catalog(paths)
+    except ET.ParseError as e:
+        logging.error("ERROR: Invalid package XML: %s", e)
+        return 1
+    findings = analyze_catalog(index, MetadataRegistry.load(registry_path))
+    filter_findings(findings, set(selected) if selected else None)
+
+    if as_json:
+        if not show_unclaimed:
+            findings.pop("unclaimed")
+        print(json.dumps(findings, indent=2))
+    else:
+        print_report(findings, show_unclaimed)
+    failed = findings["duplicates"] or findings["conflicts"] or findings["unknown"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report overlapping and missing types across scripts/packages."
+    )
+    parser.add_argument(
+        "files", nargs="*", help="Only report findings for these files"
+    )
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG)
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    parser.add_argument("--json", action="store_true", dest="as_json")
+    parser.add_argument("--show-unclaimed", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(
+        main(args.files, args.catalog, args.registry, args.as_json, args.show_unclaimed)
+    )
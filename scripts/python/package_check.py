@@ -21,22 +21,86 @@
 #   -s, --stage: Pipeline stage (deploy/destroy)
 #   -e, --environment: Target environment (production/sandbox)
 #   -c, --cmt-tests-config: JSON rules file (default: alongside this script)
-# Dependencies: Python 3.x, xml.etree.ElementTree
+#   -p, --package-list: sf-package-list text ("Type: A, B;Type2: C"); written to
+#       --manifest (see package_list.py) before validation
+#   --empty-package: Also write an empty manifest here (destructive deploys)
+#   -o, --target-orgs: Comma-separated org aliases; resolves CMT switches in all
+#       orgs concurrently and prints per-org test sets and differences as JSON
+#   --profile: Output prefix for cProfile stats (.prof) and a Chrome trace
+#       (.trace.json, also opens in speedscope)
+#   --metrics-file: JSON Lines file to append per-phase timing summaries to
+#   --shards: Split the selected tests into N balanced shards (one line or JSON
+#       entry per shard) for parallel RunSpecifiedTests validations
+#   --test-runtimes: Historical runtimes JSON used to balance shards
+#   --shard-format: lines (default) or json
+#   --coverage: Coverage/test-result JSON (repeatable); warns when Apex members in
+#       the package fall below --coverage-threshold (default 75) with only the
+#       selected tests (see coverage_index.py)
+#   Members of managed packages (namespaces from sfdx-project.json, see
+#       managed_namespaces.py) are listed but never looked up under force-app
+#   --cache-dir: Reuse the printed result of an identical earlier run (default:
+#       $PACKAGE_CHECK_CACHE_DIR; disabled when unset); --cache-size caps entries
+#   --prior-result: JSON of @tests: results from an earlier run (default:
+#       $PACKAGE_CHECK_PRIOR_RESULT); only Apex files changed since its commit
+#       (or --base-ref, default $CI_MERGE_REQUEST_DIFF_BASE_SHA) are rescanned and
+#       the file is rewritten for the next run (see apex_delta.py)
+#   --report-json: Also write {status, tests, warnings, errors} as JSON for the
+#       MR comment (see report_render.py); such runs bypass --cache-dir
+#   --where-used: off (default: $PACKAGE_CHECK_WHERE_USED or off), warn or error;
+#       on destroy, reports force-app files that still reference the destroyed
+#       members (index cached in --where-used-index, see where_used.py)
+#   --cmt-rule-check: off (default: $PACKAGE_CHECK_CMT_RULES or off), warn or
+#       error; checks the CMT rules against Utility.switchRunAutomation calls in
+#       all Apex, reusing --prior-result (see cmt_rule_check.py)
+#   --stream: auto (default: $PACKAGE_CHECK_STREAM or auto), on or off; on reads
+#       the manifest block by block with bounded memory and logs a member count
+#       and preview per type instead of every member (see manifest_stream.py);
+#       auto streams manifests over 4 MiB
+#   --query-backend: auto (default: REST with keep-alive connections, falling back
+#       to sf), rest or sf, for CMT switch queries (default:
+#       $PACKAGE_CHECK_QUERY_BACKEND; see org_query.py)
+#   --watch: Keep running and re-select tests as manifest/Apex/CMT files change
+#       (see package_watch.py); --watch-interval sets the poll period in seconds
+# Dependencies: Python 3.x, xml.etree.ElementTree, xml_writer.py (same directory)
 # Output: Space-separated list of test classes or "not a test"
+#         (JSON object per org when --target-orgs is used)
 ################################################################################
 import argparse
+import contextlib
+import io
 import json
 import logging
 import os
 import re
-import shutil
-import subprocess
 import sys
 import xml.etree.ElementTree as ET
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
+from xml.parsers.expat import ExpatError
+
+import apex_delta
+import cmt_rule_check
+import coverage_index
+import managed_namespaces
+import manifest_stream
+import org_query
+import package_list
+import profiling
+import result_cache
+import shard_tests
+import where_used
+from profiling import span
+from xml_writer import remove_elements
 
 APEX_TYPES = ["apexclass", "apextrigger"]
+# Source read by a run; their git trees are part of the result cache key.
+CACHED_SOURCE_DIRS = (
+    "force-app/main/default/classes",
+    "force-app/main/default/triggers",
+    "force-app/main/default/customMetadata",
+)
+# Manifests larger than this are streamed with --stream auto.
+STREAM_THRESHOLD_BYTES = 4 * 1024 * 1024
 PARENT_WORKFLOW = "workflow"
 CHILDREN_WORKFLOW = [
     "WorkflowAlert",
@@ -49,7 +113,6 @@ CHILDREN_WORKFLOW = [
     "WorkflowFlowAction",
 ]
 
-logging.basicConfig(level=logging.DEBUG, format="%(message)s")
 ns = {"sforce": "http://soap.sforce.com/2006/04/metadata"}
 ET.register_namespace("", "http://soap.sforce.com/2006/04/metadata")
 
@@ -59,7 +122,13 @@ def parse_args():
     Build the argument parser and return parsed CLI values.
 
     Returns:
-        Namespace with ``manifest``, ``stage``, ``environment``, ``cmt_tests_config``.
+        Namespace with ``manifest``, ``stage``, ``environment``, ``cmt_tests_config``,
+        ``package_list``, ``empty_package``, ``target_orgs``, ``max_workers``, ``profile``, ``metrics_file``, ``log_level``,
+        ``shards``, ``test_runtimes``, ``shard_format``, ``coverage``,
+        ``coverage_threshold``, ``cache_dir``, ``cache_size``, ``prior_result``,
+        ``base_ref``, ``report_json``, ``where_used``, ``where_used_index``,
+        ``cmt_rule_check``, ``stream``,
+        ``query_backend``, ``watch``, ``watch_interval``.
     """
     parser = argparse.ArgumentParser(
         description="A script to determine required Apex tests."
@@ -73,6 +142,120 @@ def parse_args():
         default="package_check_cmt_tests.json",
         help="JSON file listing Apex members, CMT records, and tests when switch on/off",
     )
+    parser.add_argument(
+        "-p",
+        "--package-list",
+        default=None,
+        help="Package list to convert into --manifest before validating",
+    )
+    parser.add_argument(
+        "--empty-package",
+        default=None,
+        help="With --package-list, also write an empty package.xml to this path",
+    )
+    parser.add_argument(
+        "-o",
+        "--target-orgs",
+        default=None,
+        help="Comma-separated org aliases to resolve CMT switches against concurrently",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=8,
+        help="Maximum concurrent org queries when --target-orgs is used",
+    )
+    parser.add_argument(
+        "--profile",
+        default=os.environ.get(profiling.PROFILE_ENV),
+        help="Write cProfile stats and a Chrome trace to <PROFILE>.prof/.trace.json",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=os.environ.get(profiling.METRICS_ENV),
+        help="Append per-phase timing summaries (JSON Lines) to this file",
+    )
+    parser.add_argument("--log-level", default="DEBUG")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the selected test classes into this many balanced shards",
+    )
+    parser.add_argument(
+        "--test-runtimes",
+        default=None,
+        help="JSON of historical test runtimes (class->seconds or sf test result)",
+    )
+    parser.add_argument("--shard-format", choices=("lines", "json"), default="lines")
+    parser.add_argument(
+        "--coverage",
+        action="append",
+        default=[],
+        help="Coverage or test-result JSON to estimate coverage from (repeatable)",
+    )
+    parser.add_argument(
+        "--coverage-threshold",
+        type=float,
+        default=coverage_index.DEFAULT_THRESHOLD,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get(result_cache.CACHE_ENV),
+        help="Cache results keyed by manifest, options, CMT config and source trees",
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=result_cache.DEFAULT_MAX_ENTRIES
+    )
+    parser.add_argument(
+        "--prior-result",
+        default=os.environ.get(apex_delta.PRIOR_RESULT_ENV),
+        help="@tests: results of an earlier run; unchanged Apex files are not rescanned",
+    )
+    parser.add_argument(
+        "--base-ref",
+        default=os.environ.get(apex_delta.BASE_REF_ENV),
+        help="Diff base for --prior-result when it does not record its commit",
+    )
+    parser.add_argument(
+        "--report-json",
+        default=None,
+        help="Write status, tests, warnings and errors of this run as JSON",
+    )
+    parser.add_argument(
+        "--where-used",
+        choices=("off", "warn", "error"),
+        default=os.environ.get("PACKAGE_CHECK_WHERE_USED") or "off",
+        help="On destroy, warn or fail when force-app still references a member",
+    )
+    parser.add_argument(
+        "--where-used-index",
+        default=os.environ.get(where_used.INDEX_ENV) or where_used.DEFAULT_INDEX,
+    )
+    parser.add_argument(
+        "--cmt-rule-check",
+        choices=("off", "warn", "error"),
+        default=os.environ.get("PACKAGE_CHECK_CMT_RULES") or "off",
+        help="Check CMT rules against Utility.switchRunAutomation calls in Apex",
+    )
+    parser.add_argument(
+        "--stream",
+        choices=("auto", "on", "off"),
+        default=os.environ.get("PACKAGE_CHECK_STREAM") or "auto",
+        help="Validate the manifest block by block in bounded memory",
+    )
+    parser.add_argument(
+        "--query-backend",
+        choices=org_query.BACKENDS,
+        default=os.environ.get(org_query.BACKEND_ENV) or "auto",
+        help="Query CMT switches over REST, with sf, or REST falling back to sf",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Re-select tests whenever the manifest, Apex or CMT files change",
+    )
+    parser.add_argument("--watch-interval", type=float, default=1.0)
     args = parser.parse_args()
     return args
 
@@ -221,15 +404,32 @@ def validate_memberdata(metadata_name: str, metadata_member_list: list) -> None:
     Exits:
         If the list is empty or contains ``*``.
     """
+    validate_member_summary(
+        metadata_name, len(metadata_member_list), "*" in metadata_member_list
+    )
+
+
+def validate_member_summary(metadata_name: str, count: int, wildcard: bool) -> None:
+    """
+    Apply the ``validate_memberdata`` checks to a block known only by its counts.
+
+    Args:
+        metadata_name: Type name (for error messages).
+        count: Number of ``<members>`` in the block.
+        wildcard: Whether one of them is ``*``.
 
-    if len(metadata_member_list) == 0:
+    Exits:
+        If the block has no members or a wildcard.
+    """
+
+    if count == 0:
         logging.info(
             "ERROR: Members list is missing for %s,"
             " Please double check package details..!!!",
             metadata_name,
         )
         sys.exit(1)
-    if "*" in metadata_member_list:
+    if wildcard:
         logging.info(
             "ERROR: Wildcards are not allowed in the package.xml.\n"
             "You should declare specific metadata to deploy.\n"
@@ -382,86 +582,74 @@ def soql_string_literal(value: str) -> str:
     return value.replace("'", "''")
 
 
-def resolve_sf_executable() -> Optional[str]:
+def cmt_switch_query(rule: Dict[str, Any]) -> Tuple[str, str, str]:
     """
-    Locate the Salesforce CLI executable on PATH.
+    Return the (object API name, DeveloperName, field) holding a rule's switch.
 
-    Tries ``sf``, then ``sf.cmd``, then ``sf.exe`` so Windows shells resolve the shim correctly.
-
-    Returns:
-        Absolute path to the executable, or None if not found.
+    Optional rule keys ``cmt_object_api_name`` and ``cmt_developer_name`` override
+    the names derived from ``cmt_record_qualified_name``; ``switch_field`` defaults
+    to Turn_on__c.
     """
-    for name in ("sf", "sf.cmd", "sf.exe"):
-        path = shutil.which(name)
-        if path:
-            return path
-    return None
+    object_api, developer_name, _ = cmt_qualified_name_to_paths(
+        rule["cmt_record_qualified_name"]
+    )
+    return (
+        rule.get("cmt_object_api_name") or object_api,
+        rule.get("cmt_developer_name") or developer_name,
+        rule.get("switch_field") or "Turn_on__c",
+    )
 
 
-def query_org_cmt_switch_field(
-    object_api: str,
-    developer_name: str,
-    field_api: str,
-) -> bool:
-    """
-    Run ``sf data query`` against the default org to read a CMT switch field.
+def cmt_switch_soql(object_api: str, developer_name: str, field_api: str) -> str:
+    dev_esc = soql_string_literal(developer_name)
+    return f"SELECT {field_api} FROM {object_api} WHERE DeveloperName = '{dev_esc}'"
 
-    Exits the process if the CLI is missing or the query fails. If no row matches
-    DeveloperName, returns False (treat as switch off).
+
+def run_org_queries(soqls: List[str], target_org: Optional[str] = None) -> list:
+    """
+    Run SOQL queries against an org with the configured backend (see org_query.py).
 
     Args:
-        object_api: Custom metadata type API name (e.g. SwitchForAutomation__mdt).
-        developer_name: CMT DeveloperName (record suffix).
-        field_api: Field to SELECT (e.g. Turn_on__c).
+        soqls: Queries to run; several are sent as one batch where possible.
+        target_org: Org alias; None uses the default org.
 
     Returns:
-        Interpreted boolean: True for truthy checkbox/string values, False otherwise.
+        One record list per query, in order.
+
+    Exits:
+        If no backend can reach the org or a query fails.
     """
-    sf_exe = resolve_sf_executable()
-    if not sf_exe:
-        logging.error(
-            "ERROR: Salesforce CLI (sf) not found on PATH. Install sf CLI or include "
-            "the CMT record in package.xml so the switch can be read from source."
-        )
-        sys.exit(1)
-    dev_esc = soql_string_literal(developer_name)
-    soql = f"SELECT {field_api} FROM {object_api} WHERE DeveloperName = '{dev_esc}'"
-    # SOQL must be passed with -q / --query (positional SOQL is rejected by current sf CLI).
-    cmd = [sf_exe, "data", "query", "-q", soql, "--json"]
     try:
-        proc = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=120, check=False
-        )
-    except FileNotFoundError:
+        client = org_query.client_for(target_org)
+        if len(soqls) == 1:
+            return [client.query(soqls[0])]
+        return client.query_many(soqls)
+    except org_query.SfNotFoundError as e:
         logging.error(
-            "ERROR: Salesforce CLI (sf) not found. Install sf CLI or include the CMT "
-            "record in package.xml so the switch can be read from source."
+            "ERROR: %s Install sf CLI or include the CMT record in package.xml so the "
+            "switch can be read from source.",
+            e,
         )
         sys.exit(1)
-    except subprocess.TimeoutExpired:
-        logging.error(
-            "ERROR: sf data query timed out for %s.%s.", object_api, developer_name
-        )
+    except org_query.QueryError as e:
+        logging.error("ERROR: %s", e)
         sys.exit(1)
-    try:
-        data = json.loads(proc.stdout or "{}")
-    except json.JSONDecodeError:
-        logging.error(
-            "ERROR: Invalid JSON from sf data query: %s", (proc.stdout or "")[:500]
-        )
-        sys.exit(1)
-    if proc.returncode != 0 or data.get("status") != 0:
-        err = (data.get("message") or proc.stderr or proc.stdout or "unknown error")[
-            :800
-        ]
-        logging.error("ERROR: sf data query failed: %s", err)
-        sys.exit(1)
-    records = (data.get("result") or {}).get("records") or []
+
+
+def switch_from_records(
+    records: list,
+    object_api: str,
+    developer_name: str,
+    field_api: str,
+    target_org: Optional[str] = None,
+) -> bool:
+    """Interpret the queried switch field; no matching row means the switch is off."""
     if not records:
         logging.info(
-            "No %s row for DeveloperName=%s in org; treating switch as off.",
+            "No %s row for DeveloperName=%s in org %s; treating switch as off.",
             object_api,
             developer_name,
+            target_org or "(default)",
         )
         return False
     val = records[0].get(field_api)
@@ -472,30 +660,108 @@ def query_org_cmt_switch_field(
     return str(val).lower() in ("true", "1", "yes")
 
 
-def resolve_cmt_switch_enabled(root: ET.Element, rule: Dict[str, Any]) -> bool:
+def query_org_cmt_switch_field(
+    object_api: str,
+    developer_name: str,
+    field_api: str,
+    target_org: Optional[str] = None,
+) -> bool:
+    """
+    Query an org for a CMT switch field.
+
+    Exits the process if the org cannot be queried. If no row matches
+    DeveloperName, returns False (treat as switch off).
+
+    Args:
+        object_api: Custom metadata type API name (e.g. SwitchForAutomation__mdt).
+        developer_name: CMT DeveloperName (record suffix).
+        field_api: Field to SELECT (e.g. Turn_on__c).
+        target_org: Org alias/username; None uses the default org.
+
+    Returns:
+        Interpreted boolean: True for truthy checkbox/string values, False otherwise.
+    """
+    soql = cmt_switch_soql(object_api, developer_name, field_api)
+    records = run_org_queries([soql], target_org)[0]
+    return switch_from_records(
+        records, object_api, developer_name, field_api, target_org
+    )
+
+
+def query_org_cmt_switches(
+    rules: List[Dict[str, Any]], target_org: Optional[str] = None
+) -> List[bool]:
+    """
+    Query the switches of several rules in one org as a single batch.
+
+    Args:
+        rules: Rules whose switch is not decided by the package.
+        target_org: Org alias; None uses the default org.
+
+    Returns:
+        The switch state of each rule, in order.
+    """
+    targets = [cmt_switch_query(rule) for rule in rules]
+    for rule, (object_api, developer_name, _) in zip(rules, targets):
+        logging.info(
+            "CMT %s not read from package.xml; querying %s for %s.%s",
+            rule["cmt_record_qualified_name"],
+            target_org or "default org",
+            object_api,
+            developer_name,
+        )
+    results = run_org_queries([cmt_switch_soql(*t) for t in targets], target_org)
+    return [
+        switch_from_records(records, *target, target_org)
+        for records, target in zip(results, targets)
+    ]
+
+
+def cmt_switch_source_file(root: ET.Element, rule: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the CMT record source path when the switch is decided by the package.
+
+    A record deployed with the package wins over whatever the org holds, so the
+    value is org-independent whenever the record is in package.xml and on disk.
+
+    Args:
+        root: Parsed package.xml root.
+        rule: One entry from package_check_cmt_tests.json.
+
+    Returns:
+        Path to the ``.md-meta.xml`` file, or None when an org query is needed.
+    """
+    qname = rule["cmt_record_qualified_name"]
+    _, _, rel_path = cmt_qualified_name_to_paths(qname)
+    if cmt_record_in_package(root, qname) and os.path.isfile(rel_path):
+        return rel_path
+    return None
+
+
+def resolve_cmt_switch_enabled(
+    root: ET.Element, rule: Dict[str, Any], target_org: Optional[str] = None
+) -> bool:
     """
     Decide whether the CMT "switch" is on for a config rule.
 
     If the CMT record is in package.xml and the source file exists on disk, reads the
-    field from XML. Otherwise queries the default org. Optional rule keys
-    ``cmt_object_api_name`` and ``cmt_developer_name`` override API name / DeveloperName.
+    field from XML. Otherwise queries ``target_org`` (default org when None). Optional
+    rule keys ``cmt_object_api_name`` and ``cmt_developer_name`` override API name /
+    DeveloperName.
 
     Args:
         root: Parsed package.xml root.
         rule: One entry from package_check_cmt_tests.json (must include
             cmt_record_qualified_name; switch_field defaults to Turn_on__c).
+        target_org: Org alias to query when the record is not read from source.
 
     Returns:
         True if the switch field is enabled in the chosen source (file or org).
     """
     qname = rule["cmt_record_qualified_name"]
-    field_api = rule.get("switch_field") or "Turn_on__c"
-    object_api, developer_name, rel_path = cmt_qualified_name_to_paths(qname)
-
-    if rule.get("cmt_object_api_name"):
-        object_api = rule["cmt_object_api_name"]
-    if rule.get("cmt_developer_name"):
-        developer_name = rule["cmt_developer_name"]
+    _, _, rel_path = cmt_qualified_name_to_paths(qname)
+    object_api, developer_name, field_api = cmt_switch_query(rule)
+    org_label = target_org or "default org"
 
     if cmt_record_in_package(root, qname):
         if os.path.isfile(rel_path):
@@ -507,19 +773,23 @@ def resolve_cmt_switch_enabled(root: ET.Element, rule: Dict[str, Any]) -> bool:
             )
             return parse_switch_field_from_cmt_file(rel_path, field_api)
         logging.info(
-            "CMT %s in package but file missing at %s; querying default org.",
+            "CMT %s in package but file missing at %s; querying %s.",
             qname,
             rel_path,
+            org_label,
+        )
+        return query_org_cmt_switch_field(
+            object_api, developer_name, field_api, target_org
         )
-        return query_org_cmt_switch_field(object_api, developer_name, field_api)
 
     logging.info(
-        "CMT %s not in package.xml; querying default org for %s.%s",
+        "CMT %s not in package.xml; querying %s for %s.%s",
         qname,
+        org_label,
         object_api,
         developer_name,
     )
-    return query_org_cmt_switch_field(object_api, developer_name, field_api)
+    return query_org_cmt_switch_field(object_api, developer_name, field_api, target_org)
 
 
 def load_cmt_rules(config_path: str) -> List[Dict[str, Any]]:
@@ -621,10 +891,79 @@ def clean_test_class_names(test_line: str, context: str) -> str:
     return " ".join(out)
 
 
+def cmt_rules_in_package(
+    root: ET.Element,
+    stage: str,
+    rules: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Return the CMT rules whose ApexClass/ApexTrigger member is in the package.
+
+    Destroy stage and empty rules yield an empty list.
+
+    Args:
+        root: Parsed package.xml.
+        stage: deploy or destroy.
+        rules: Validated list from load_cmt_rules.
+    """
+    if stage == "destroy" or not rules:
+        return []
+
+    apex_classes = set(get_metadata_members_by_type(root, "ApexClass"))
+    apex_triggers = set(get_metadata_members_by_type(root, "ApexTrigger"))
+
+    out = []
+    for rule in rules:
+        aname = rule["apex_name"]
+        atype = rule["_apex_type_norm"]
+        if atype == "apexclass" and aname not in apex_classes:
+            continue
+        if atype == "apextrigger" and aname not in apex_triggers:
+            continue
+        out.append(rule)
+    return out
+
+
+def apply_cmt_rule(
+    rule: Dict[str, Any],
+    enabled: bool,
+    ov_class: Dict[str, str],
+    ov_trigger: Dict[str, str],
+    context: str = "",
+) -> None:
+    """
+    Record the tests selected by a resolved CMT switch in the override maps.
+
+    Args:
+        rule: Rule from load_cmt_rules.
+        enabled: Resolved switch value.
+        ov_class: ApexClass member → tests (updated in place).
+        ov_trigger: ApexTrigger member → tests (updated in place).
+        context: Optional label (e.g. org alias) for the log line.
+    """
+    aname = rule["apex_name"]
+    atype = rule["_apex_type_norm"]
+    raw = rule["tests_when_enabled"] if enabled else rule["tests_when_disabled"]
+    tests_str = clean_test_class_names(tests_value_to_string(raw), aname)
+    logging.info(
+        "CMT rule for %s %s%s: switch enabled=%s -> tests: %s",
+        atype,
+        aname,
+        f" [{context}]" if context else "",
+        enabled,
+        tests_str,
+    )
+    if atype == "apexclass":
+        ov_class[aname] = tests_str
+    else:
+        ov_trigger[aname] = tests_str
+
+
 def build_cmt_test_overrides(
     root: ET.Element,
     stage: str,
     rules: List[Dict[str, Any]],
+    target_org: Optional[str] = None,
 ) -> Tuple[Dict[str, str], Dict[str, str]]:
     """
     Build per-member test class strings from CMT rules for the current package.
@@ -637,6 +976,7 @@ def build_cmt_test_overrides(
         root: Parsed package.xml.
         stage: deploy or destroy (rules skipped when destroy).
         rules: Validated list from load_cmt_rules.
+        target_org: Org alias for switch queries (None = default org).
 
     Returns:
         (overrides_for_apex_class_members, overrides_for_apex_trigger_members):
@@ -644,42 +984,150 @@ def build_cmt_test_overrides(
     """
     ov_class: Dict[str, str] = {}
     ov_trigger: Dict[str, str] = {}
-    if stage == "destroy" or not rules:
-        return ov_class, ov_trigger
+    for rule in cmt_rules_in_package(root, stage, rules):
+        enabled = resolve_cmt_switch_enabled(root, rule, target_org)
+        apply_cmt_rule(rule, enabled, ov_class, ov_trigger)
+    return ov_class, ov_trigger
 
-    apex_classes = set(get_metadata_members_by_type(root, "ApexClass"))
-    apex_triggers = set(get_metadata_members_by_type(root, "ApexTrigger"))
 
-    for rule in rules:
-        aname = rule["apex_name"]
-        atype = rule["_apex_type_norm"]
-        if atype == "apexclass" and aname not in apex_classes:
-            continue
-        if atype == "apextrigger" and aname not in apex_triggers:
-            continue
+def build_cmt_test_overrides_for_orgs(
+    root: ET.Element,
+    stage: str,
+    rules: List[Dict[str, Any]],
+    orgs: List[str],
+    max_workers: int = 8,
+) -> Dict[str, Tuple[Dict[str, str], Dict[str, str]]]:
+    """
+    Resolve every applicable CMT switch in every org concurrently.
+
+    Switches decided by a CMT record in the package are read from source once and
+    shared by all orgs; the rest are queried as one batch per org (a REST
+    composite request, or concurrent ``sf data query`` calls), with the orgs
+    handled on a bounded thread pool.
+
+    Args:
+        root: Parsed package.xml.
+        stage: deploy or destroy (rules skipped when destroy).
+        rules: Validated list from load_cmt_rules.
+        orgs: Org aliases to evaluate.
+        max_workers: Upper bound on orgs queried at the same time.
 
-        enabled = resolve_cmt_switch_enabled(root, rule)
-        raw = rule["tests_when_enabled"] if enabled else rule["tests_when_disabled"]
-        tests_str = clean_test_class_names(tests_value_to_string(raw), aname)
+    Returns:
+        Org alias → (ApexClass overrides, ApexTrigger overrides), as in
+        build_cmt_test_overrides.
+    """
+    applicable = cmt_rules_in_package(root, stage, rules)
+    resolved: Dict[Tuple[str, int], bool] = {}
+    pending: List[int] = []
+    for idx, rule in enumerate(applicable):
+        if cmt_switch_source_file(root, rule):
+            shared = resolve_cmt_switch_enabled(root, rule)
+            for org in orgs:
+                resolved[(org, idx)] = shared
+        else:
+            pending.append(idx)
+
+    if pending:
+        queried = [applicable[idx] for idx in pending]
+        workers = max(1, min(max_workers, len(orgs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(query_org_cmt_switches, queried, org): org
+                for org in orgs
+            }
+            for future in as_completed(futures):
+                org = futures[future]
+                for idx, enabled in zip(pending, future.result()):
+                    resolved[(org, idx)] = enabled
+
+    out: Dict[str, Tuple[Dict[str, str], Dict[str, str]]] = {}
+    for org in orgs:
+        ov_class: Dict[str, str] = {}
+        ov_trigger: Dict[str, str] = {}
+        for idx, rule in enumerate(applicable):
+            apply_cmt_rule(rule, resolved[(org, idx)], ov_class, ov_trigger, org)
+        out[org] = (ov_class, ov_trigger)
+    return out
+
+
+def local_members(metadata_name: str, metadata_member_list: list) -> list:
+    """
+    Drop managed-package members, which have no source under force-app.
+
+    Args:
+        metadata_name: Metadata type name (for logging).
+        metadata_member_list: Members from the package.
+
+    Returns:
+        Members not owned by a namespace in sfdx-project.json.
+    """
+    local, managed = managed_namespaces.load_index().partition(metadata_member_list)
+    if managed:
         logging.info(
-            "CMT rule for %s %s: switch enabled=%s -> tests: %s",
-            atype,
-            aname,
-            enabled,
-            tests_str,
+            "Skipping managed package %s: %s", metadata_name, ", ".join(managed)
         )
-        if atype == "apexclass":
-            ov_class[aname] = tests_str
-        else:
-            ov_trigger[aname] = tests_str
+    return local
 
-    return ov_class, ov_trigger
+
+def validate_type_block(metadata_type: ET.Element) -> Tuple[str, list]:
+    """
+    Validate one ``<types>`` block and return its name and members.
+
+    Checks the ``<name>`` tag, the member list (no wildcards, not empty) and bans
+    the parent Workflow type. Has no side effects on source files.
+
+    Args:
+        metadata_type: A ``<types>`` element from the package.
+
+    Returns:
+        (metadata type name, list of member strings).
+
+    Exits:
+        On any validation failure.
+    """
+    try:
+        metadata_name = [
+            member.text for member in metadata_type.findall("sforce:name", ns)
+        ]
+        metadata_member_list = [
+            member.text for member in metadata_type.findall("sforce:members", ns)
+        ]
+        metadata_name = validate_nametag(metadata_name)
+        validate_memberdata(metadata_name, metadata_member_list)
+    except AttributeError:
+        logging.info(
+            "ERROR: <name> tag is missing, Please double check package details..!!!"
+        )
+        sys.exit(1)
+    validate_type_name(metadata_name)
+    return metadata_name, metadata_member_list
+
+
+def validate_type_name(metadata_name: str) -> None:
+    """
+    Reject metadata types banned from the pipeline (the parent Workflow type).
+
+    Exits:
+        If ``metadata_name`` is banned.
+    """
+    if metadata_name.lower() == PARENT_WORKFLOW:
+        logging.error(
+            "ERROR: The parent metadata type Workflow is banned in our CI/CD pipeline."
+        )
+        logging.error(
+            "Please update the package.xml to use one of the children Workflow types:"
+        )
+        logging.error("%s", ", ".join(map(str, CHILDREN_WORKFLOW)))
+        sys.exit(1)
 
 
 def process_metadata_type(
     root: ET.Element,
     stage: str,
     cmt_rules: List[Dict[str, Any]],
+    cmt_overrides: Optional[Tuple[Dict[str, str], Dict[str, str]]] = None,
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+    log_members: bool = True,
 ) -> tuple:
     """
     Iterate and process through metadata, extract details such as metadata_values
@@ -687,57 +1135,46 @@ def process_metadata_type(
 
     Applies ``cmt_rules`` so matching ApexClass/ApexTrigger members get test lists
     from Custom Metadata switches before falling back to source annotations.
+    Pass ``cmt_overrides`` to use already-resolved overrides instead, and ``delta``
+    to reuse annotation results for Apex files unchanged since a prior run.
+    ``log_members=False`` skips the contents listing (already logged by
+    stream_package).
     """
 
     metadata_values = []
     apex_required = False
-    logging.info("Deployment package contents:")
+    if log_members:
+        logging.info("Deployment package contents:")
     test_classes_set = set()
 
-    ov_class, ov_trigger = build_cmt_test_overrides(root, stage, cmt_rules)
+    if cmt_overrides is None:
+        with span("cmt_resolution"):
+            cmt_overrides = build_cmt_test_overrides(root, stage, cmt_rules)
+    ov_class, ov_trigger = cmt_overrides
 
     for metadata_type in root.findall("sforce:types", ns):
-        try:
-            metadata_name = [
-                member.text for member in metadata_type.findall("sforce:name", ns)
-            ]
-            metadata_member_list = [
-                member.text for member in metadata_type.findall("sforce:members", ns)
-            ]
-            metadata_name = validate_nametag(metadata_name)
-            validate_memberdata(metadata_name, metadata_member_list)
+        metadata_name, metadata_member_list = validate_type_block(metadata_type)
+        if log_members:
             logging.info(
                 "%s: %s", metadata_name, ", ".join(map(str, metadata_member_list))
             )
-        except AttributeError:
-            logging.info(
-                "ERROR: <name> tag is missing, Please double check package details..!!!"
-            )
-            sys.exit(1)
-
-        if metadata_name.lower() == PARENT_WORKFLOW:
-            logging.error(
-                "ERROR: The parent metadata type Workflow is banned in our CI/CD pipeline."
-            )
-            logging.error(
-                "Please update the package.xml to use one of the children Workflow types:"
-            )
-            logging.error("%s", ", ".join(map(str, CHILDREN_WORKFLOW)))
-            sys.exit(1)
         if metadata_name.lower() == "connectedapp" and stage != "destroy":
-            process_connected_app(metadata_member_list)
+            process_connected_app(local_members(metadata_name, metadata_member_list))
         elif metadata_name.lower() in APEX_TYPES:
+            local = local_members(metadata_name, metadata_member_list)
             if stage != "destroy":
                 overrides = (
                     ov_class if metadata_name.lower() == "apexclass" else ov_trigger
                 )
-                test_classes_set = process_apex_parallel(
-                    metadata_member_list,
-                    metadata_name.lower(),
-                    test_classes_set,
-                    overrides,
-                )
-            apex_required = True
+                with span("apex_scan"):
+                    test_classes_set = process_apex_parallel(
+                        local,
+                        metadata_name.lower(),
+                        test_classes_set,
+                        overrides,
+                        delta,
+                    )
+            apex_required = apex_required or bool(local)
         metadata_values.append(metadata_name)
 
     return metadata_values, apex_required, test_classes_set
@@ -774,6 +1211,10 @@ def remove_consumer_key(file_path: str) -> None:
     """
     Remove the ``<consumerKey>`` node from a Connected App meta XML file and save.
 
+    The file is rewritten with ``xml_writer.remove_elements``, which streams the
+    original bytes so the declaration, indentation and namespace prefixes are
+    unchanged and only the consumer key line disappears from the diff.
+
     Args:
         file_path: Path to ``*.connectedApp-meta.xml``.
 
@@ -782,27 +1223,16 @@ def remove_consumer_key(file_path: str) -> None:
     """
 
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        consumer_key_element = root.find(".//sforce:consumerKey", ns)
-        if consumer_key_element is not None:
-            for parent in root.iter():
-                for child in list(parent):
-                    if child == consumer_key_element:
-                        parent.remove(child)
-                        break
-            xml_str = ET.tostring(root, encoding="utf-8", method="xml").decode("utf-8")
-            header = '<?xml version="1.0" encoding="UTF-8"?>\n'
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(header + xml_str)
-            logging.info("Successfully removed consumer key from %s", file_path)
-        else:
-            logging.info("No consumer key found in %s", file_path)
-    except ET.ParseError:
+        removed = remove_elements(file_path, ("consumerKey",))
+    except ExpatError:
         logging.info(
             "ERROR: Unable to parse %s. Please check the file format.", file_path
         )
         sys.exit(1)
+    if removed:
+        logging.info("Successfully removed consumer key from %s", file_path)
+    else:
+        logging.info("No consumer key found in %s", file_path)
 
 
 def process_apex_parallel(
@@ -810,18 +1240,21 @@ def process_apex_parallel(
     metadata_name: str,
     test_classes_set: set,
     cmt_overrides: Dict[str, str],
+    delta: Optional[apex_delta.AnnotationDelta] = None,
 ) -> set:
     """
     Process Apex classes or triggers in parallel and collect test class names.
 
     Members present in ``cmt_overrides`` use the configured test list directly;
-    others are scanned with find_apex_tests (@tests / @isTest).
+    unchanged files known to ``delta`` reuse their earlier result; others are
+    scanned with find_apex_tests (@tests / @isTest).
 
     Args:
         metadata_member_list: Package member API names for this type block.
         metadata_name: apexclass or apextrigger.
         test_classes_set: Accumulator of test class names (updated in place logically).
         cmt_overrides: Member name → space-separated tests from CMT rules.
+        delta: Optional prior annotation results; updated with this run's results.
 
     Returns:
         Updated test_classes_set (same set instance).
@@ -836,26 +1269,29 @@ def process_apex_parallel(
 
     max_workers = (os.cpu_count() or 4) * 2
 
+    def _static_tests(_t: str) -> str:
+        """Return already-known tests (CMT-configured or from a prior run)."""
+        return _t
+
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_file = {}
         for member in metadata_member_list:
             fpath = f"force-app/main/default/{directory}/{member}{extension}"
             if member in cmt_overrides:
-                tests = cmt_overrides[member]
-
-                def _static_tests(_t: str = tests) -> str:
-                    """Return CMT-configured tests (default arg binds per-loop value)."""
-                    return _t
-
-                fut = executor.submit(_static_tests)
+                fut = executor.submit(_static_tests, cmt_overrides[member])
+                fpath = None
+            elif delta is not None and delta.lookup(fpath) is not None:
+                fut = executor.submit(_static_tests, delta.lookup(fpath))
             else:
                 fut = executor.submit(find_apex_tests, fpath)
-            future_to_file[fut] = member
+            future_to_file[fut] = (member, fpath)
 
         for future in as_completed(future_to_file):
-            member = future_to_file[future]
+            member, fpath = future_to_file[future]
             try:
                 found_tests = future.result()
+                if delta is not None and fpath:
+                    delta.record(fpath, found_tests)
                 if found_tests:
                     test_classes_set.update(found_tests.split())
             except FileNotFoundError:
@@ -958,11 +1394,236 @@ def determine_destructive_tests() -> str:
     return " ".join(test_classes)
 
 
+def select_required_tests(
+    apex_required: bool, stage: str, env: str, test_classes: set
+) -> str:
+    """
+    Turn the collected test candidates into the final test string for a stage.
+
+    Args:
+        apex_required: Whether the package contains Apex.
+        stage: deploy or destroy.
+        env: production/sandbox (affects destructive deploy default tests).
+        test_classes: Candidate names from annotations and CMT rules.
+
+    Returns:
+        Space-separated test class names, or the string ``not a test`` when none required.
+    """
+    if apex_required and stage != "destroy":
+        logging.info("Apex Tests are Required for this package")
+        with span("test_validation"):
+            return validate_tests(test_classes)
+    if apex_required and stage == "destroy" and env == "production":
+        logging.info("Apex Tests are Required for this package")
+        return determine_destructive_tests()
+    logging.info("Apex Tests are Not Required for this package")
+    return "not a test"
+
+
+def warn_low_coverage(
+    root: ET.Element,
+    test_classes: str,
+    coverage_paths: List[str],
+    threshold: float,
+) -> None:
+    """
+    Warn about package Apex members likely to fall below the coverage threshold.
+
+    Coverage is estimated from previously captured JSON (see coverage_index.py)
+    using only the selected tests. Never fails the run.
+
+    Args:
+        root: Parsed package.xml.
+        test_classes: Selected tests (space-separated).
+        coverage_paths: Coverage / test-result JSON files.
+        threshold: Minimum percentage.
+    """
+    try:
+        index = coverage_index.load_index(coverage_paths)
+    except (OSError, ValueError) as e:
+        logging.warning("WARNING: Cannot read coverage data, skipping estimate: %s", e)
+        return
+    members = get_metadata_members_by_type(root, "ApexClass")
+    members += get_metadata_members_by_type(root, "ApexTrigger")
+    members, _ = managed_namespaces.load_index().partition(members)
+    for member, pct in coverage_index.coverage_shortfalls(
+        index, members, test_classes.split(), threshold
+    ):
+        logging.warning(
+            "WARNING: %s is estimated at %s%% coverage with the selected tests "
+            "(threshold %s%%).",
+            member,
+            pct,
+            threshold,
+        )
+
+
+def stream_package(
+    package_path: str, cmt_rules: List[Dict[str, Any]], keep_all: bool = False
+) -> Tuple[ET.Element, list]:
+    """
+    Validate package.xml in one bounded-memory pass (see manifest_stream.py).
+
+    Applies the checks of parse_package, validate_root, validate_namespace,
+    validate_type_block, validate_metadata_attributes, validate_version_details
+    and validate_emptyness, and logs each type as a member count with a short
+    preview instead of every member.
+
+    Args:
+        package_path: Path to manifest/package.xml.
+        cmt_rules: Validated list from load_cmt_rules.
+        keep_all: Keep every member (needed by the destroy where-used check).
+
+    Returns:
+        (summary ``<Package>`` holding the ApexClass, ApexTrigger and ConnectedApp
+        members and the CustomMetadata records named by ``cmt_rules``, metadata
+        type name of each ``<types>`` block).
+
+    Exits:
+        On malformed XML or any validation failure.
+    """
+    cmt_records = {rule["cmt_record_qualified_name"] for rule in cmt_rules}
+    summary = None
+    metadata_values = []
+    logging.info("Deployment package contents:")
+    try:
+        for kind, value in manifest_stream.iter_package(package_path):
+            if kind == "root":
+                try:
+                    namespace, local_name = value.rsplit("}", 1)
+                except ValueError:
+                    logging.info(
+                        "ERROR: Unable to parse root and namespace details,Please correct them..!!!"
+                    )
+                    sys.exit(1)
+                validate_root(local_name)
+                validate_namespace(namespace[1:])
+                summary = ET.Element(value)
+            elif kind == "child" and value not in ("types", "version"):
+                # Checked with validate_metadata_attributes once the pass is done.
+                ET.SubElement(summary, f"{{{ns['sforce']}}}{value}")
+            elif kind == "version":
+                ET.SubElement(summary, f"{{{ns['sforce']}}}version").text = value
+            elif kind == "types":
+                try:
+                    metadata_name = validate_nametag(value.names)
+                    validate_member_summary(metadata_name, value.count, value.wildcard)
+                    validate_type_name(metadata_name)
+                except AttributeError:
+                    logging.info(
+                        "ERROR: <name> tag is missing, Please double check package details..!!!"
+                    )
+                    sys.exit(1)
+                logging.info("%s: %s", metadata_name, value.describe())
+                kind_lower = metadata_name.lower()
+                if keep_all or kind_lower in APEX_TYPES or kind_lower == "connectedapp":
+                    members = list(value.members())
+                elif kind_lower == "custommetadata" and cmt_records:
+                    members = [m for m in value.members() if m in cmt_records]
+                else:
+                    members = []
+                if members:
+                    manifest_stream.add_members(summary, metadata_name, members)
+                metadata_values.append(metadata_name)
+    except ET.ParseError:
+        logging.info(
+            "ERROR: Unable to parse %s. Push a new commit to fix the package formatting.",
+            package_path,
+        )
+        sys.exit(1)
+    validate_metadata_attributes(summary)
+    validate_version_details(summary)
+    validate_emptyness(metadata_values)
+    return summary, metadata_values
+
+
+def should_stream(package_path: str, mode: str) -> bool:
+    """Whether ``--stream`` mode ``on``/``off``/``auto`` streams this manifest."""
+    if mode == "auto":
+        return (
+            os.path.isfile(package_path)
+            and os.path.getsize(package_path) > STREAM_THRESHOLD_BYTES
+        )
+    return mode == "on"
+
+
+def check_where_used(root: ET.Element, mode: str, index_path: Optional[str]) -> None:
+    """
+    Report force-app files that still reference members of a destructive package.
+
+    The org rejects a destructive deploy whose members are still used, but only
+    after the deploy has run; this finds the references up front (see
+    where_used.py).
+
+    Args:
+        root: Parsed destructive package.xml.
+        mode: ``warn`` logs each finding; ``error`` also fails the run.
+        index_path: Saved where-used index, updated incrementally.
+
+    Exits:
+        In ``error`` mode when any member is still referenced.
+    """
+    pairs = []
+    for metadata_type in root.findall("sforce:types", ns):
+        name = (metadata_type.findtext("sforce:name", "", ns) or "").strip()
+        members = [
+            m.text.strip()
+            for m in metadata_type.findall("sforce:members", ns)
+            if m.text and m.text.strip()
+        ]
+        pairs.extend((name, m) for m in local_members(name, members))
+    index = where_used.load_current(index_path)
+    used = where_used.where_used(index, where_used.MetadataRegistry.load(), pairs)
+    for key, refs in used.items():
+        shown = ", ".join(refs[:5])
+        more = f" (+{len(refs) - 5} more)" if len(refs) > 5 else ""
+        message = f"{key} is still referenced by {shown}{more}"
+        if mode == "error":
+            logging.error("ERROR: %s", message)
+        else:
+            logging.warning("WARNING: %s", message)
+    if used and mode == "error":
+        sys.exit(1)
+
+
+def check_cmt_rule_consistency(
+    rules: List[Dict[str, Any]],
+    mode: str,
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+) -> None:
+    """
+    Report CMT rules that do not match the Apex source (see cmt_rule_check.py).
+
+    Args:
+        rules: Validated list from load_cmt_rules.
+        mode: ``warn`` logs each finding; ``error`` also fails the run.
+        delta: Optional prior results; unchanged Apex files are not read again.
+
+    Exits:
+        In ``error`` mode when anything is reported.
+    """
+    messages = cmt_rule_check.report_messages(cmt_rule_check.check(rules, delta=delta))
+    for message in messages:
+        if mode == "error":
+            logging.error("ERROR: %s", message)
+        else:
+            logging.warning("WARNING: %s", message)
+    if messages and mode == "error":
+        sys.exit(1)
+
+
 def scan_package(
     package_path: str,
     stage: str,
     env: str,
     cmt_config_path: str,
+    coverage_paths: Optional[List[str]] = None,
+    coverage_threshold: float = coverage_index.DEFAULT_THRESHOLD,
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+    where_used_mode: str = "off",
+    where_used_index: Optional[str] = None,
+    cmt_rule_mode: str = "off",
+    stream: bool = False,
 ) -> str:
     """
     Validate package.xml, apply CMT test rules, and return required Apex test classes.
@@ -972,58 +1633,528 @@ def scan_package(
         stage: deploy or destroy.
         env: production/sandbox (affects destructive deploy default tests).
         cmt_config_path: JSON path for optional CMT-driven test overrides.
+        coverage_paths: Optional coverage JSON files for the low-coverage warning.
+        coverage_threshold: Percentage used by that warning.
+        delta: Optional prior @tests: results (see apex_delta.py).
+        where_used_mode: ``off``, ``warn`` or ``error`` for destroy references.
+        where_used_index: Where-used index path for that check.
+        cmt_rule_mode: ``off``, ``warn`` or ``error`` for the CMT rule check.
+        stream: Validate with stream_package instead of parsing the whole tree.
 
     Returns:
         Space-separated test class names, or the string ``not a test`` when none required.
     """
 
-    root, local_name, namespace = parse_package(package_path)
-    validate_metadata_attributes(root)
-    validate_root(local_name)
-    validate_namespace(namespace)
-    cmt_rules = load_cmt_rules(cmt_config_path)
+    if stream:
+        cmt_rules = load_cmt_rules(cmt_config_path)
+        keep_all = stage == "destroy" and where_used_mode != "off"
+        with span("parse"):
+            root, _ = stream_package(package_path, cmt_rules, keep_all)
+    else:
+        with span("parse"):
+            root, local_name, namespace = parse_package(package_path)
+        with span("validate"):
+            validate_metadata_attributes(root)
+            validate_root(local_name)
+            validate_namespace(namespace)
+        cmt_rules = load_cmt_rules(cmt_config_path)
+    if cmt_rule_mode != "off" and cmt_rules:
+        with span("cmt_rule_check"):
+            check_cmt_rule_consistency(cmt_rules, cmt_rule_mode, delta)
     metadata_values, apex_required, test_classes = process_metadata_type(
-        root, stage, cmt_rules
+        root, stage, cmt_rules, delta=delta, log_members=not stream
     )
-    validate_version_details(root)
-    validate_emptyness(metadata_values)
+    if not stream:
+        with span("validate"):
+            validate_version_details(root)
+            validate_emptyness(metadata_values)
+    if stage == "destroy" and where_used_mode != "off":
+        with span("where_used"):
+            check_where_used(root, where_used_mode, where_used_index)
+    selected = select_required_tests(apex_required, stage, env, test_classes)
+    if coverage_paths and stage != "destroy" and selected != "not a test":
+        with span("coverage_check"):
+            warn_low_coverage(root, selected, coverage_paths, coverage_threshold)
+    return selected
+
+
+def scan_package_for_orgs(
+    package_path: str,
+    stage: str,
+    env: str,
+    cmt_config_path: str,
+    orgs: List[str],
+    max_workers: int = 8,
+    delta: Optional[apex_delta.AnnotationDelta] = None,
+) -> Dict[str, Any]:
+    """
+    Validate package.xml once and select tests for several orgs in one run.
 
-    if apex_required and stage != "destroy":
-        logging.info("Apex Tests are Required for this package")
-        test_classes = validate_tests(test_classes)
-    elif apex_required and stage == "destroy" and env == "production":
-        logging.info("Apex Tests are Required for this package")
-        test_classes = determine_destructive_tests()
-    else:
-        logging.info("Apex Tests are Not Required for this package")
-        test_classes = "not a test"
-    return test_classes
+    The manifest is validated and Apex annotations are scanned a single time; only
+    CMT-governed members differ between orgs, and their switches are resolved
+    concurrently by build_cmt_test_overrides_for_orgs.
 
+    Args:
+        package_path: Path to manifest/package.xml.
+        stage: deploy or destroy.
+        env: production/sandbox (affects destructive deploy default tests).
+        cmt_config_path: JSON path for optional CMT-driven test overrides.
+        orgs: Org aliases to evaluate.
+        max_workers: Upper bound on orgs queried at the same time.
+        delta: Optional prior @tests: results (see apex_delta.py).
 
-def main(manifest, stage, environment, cmt_config_path):
+    Returns:
+        ``{"orgs": {alias: tests}, "common": [...], "differences": {alias: [...]}}``
+        where ``tests`` is the same string scan_package would return for that org
+        and ``differences`` lists the tests only some orgs need.
+    """
+
+    with span("parse"):
+        root, local_name, namespace = parse_package(package_path)
+    with span("validate"):
+        validate_metadata_attributes(root)
+        validate_root(local_name)
+        validate_namespace(namespace)
+    cmt_rules = load_cmt_rules(cmt_config_path)
+    with span("cmt_resolution"):
+        per_org = build_cmt_test_overrides_for_orgs(
+            root, stage, cmt_rules, orgs, max_workers
+        )
+    # CMT-governed members contribute nothing to the shared scan; their tests are
+    # added per org below.
+    ov_class, ov_trigger = per_org[orgs[0]]
+    blank = ({m: "" for m in ov_class}, {m: "" for m in ov_trigger})
+    metadata_values, apex_required, base_tests = process_metadata_type(
+        root, stage, cmt_rules, blank, delta
+    )
+    with span("validate"):
+        validate_version_details(root)
+        validate_emptyness(metadata_values)
+
+    results: Dict[str, str] = {}
+    for org in orgs:
+        candidates = set(base_tests)
+        for overrides in per_org[org]:
+            for tests in overrides.values():
+                candidates.update(tests.split())
+        logging.info("Selecting tests for org %s", org)
+        results[org] = select_required_tests(apex_required, stage, env, candidates)
+
+    per_org_sets = {
+        org: set() if tests == "not a test" else set(tests.split())
+        for org, tests in results.items()
+    }
+    common = set.intersection(*per_org_sets.values())
+    differences = {
+        org: sorted(tests - common)
+        for org, tests in per_org_sets.items()
+        if tests - common
+    }
+    return {"orgs": results, "common": sorted(common), "differences": differences}
+
+
+def write_package_list_manifests(
+    package_list_text: str, manifest: str, empty_package: Optional[str]
+) -> None:
+    """
+    Convert a package list into ``manifest`` (and an optional empty manifest).
+
+    Replaces the ``sf sfpl xml`` plugin for destructive web pipelines.
+
+    Exits:
+        If the list cannot be parsed.
+    """
+    try:
+        types = package_list.build_manifests(package_list_text, manifest, empty_package)
+    except ValueError as exc:
+        logging.error("ERROR: %s", exc)
+        sys.exit(1)
+    logging.info(
+        "Wrote %s with %s type(s) from the package list.", manifest, len(types)
+    )
+
+
+def build_shards(test_classes: str, shards: int, runtimes_path: Optional[str]) -> list:
+    """
+    Split a selected test string into balanced shards (see shard_tests.py).
+
+    Args:
+        test_classes: Space-separated test classes from scan_package.
+        shards: Requested shard count.
+        runtimes_path: Optional historical runtimes JSON.
+
+    Returns:
+        List of shard dicts from shard_tests.shard_tests.
+    """
+    runtimes = shard_tests.load_runtimes(runtimes_path)
+    weights = shard_tests.class_weights(test_classes.split(), runtimes)
+    out = shard_tests.shard_tests(weights, shards)
+    for shard in out:
+        logging.info(
+            "Shard %s (weight %s): %s",
+            shard["shard"],
+            shard["weight"],
+            " ".join(shard["tests"]),
+        )
+    return out
+
+
+def main(
+    manifest,
+    stage,
+    environment,
+    cmt_config_path,
+    *,
+    target_orgs=None,
+    max_workers=8,
+    shards=1,
+    test_runtimes=None,
+    shard_format="lines",
+    coverage_paths=None,
+    coverage_threshold=coverage_index.DEFAULT_THRESHOLD,
+    prior_result=None,
+    base_ref=None,
+    where_used_mode="off",
+    where_used_index=None,
+    cmt_rule_mode="off",
+    stream="auto",
+):
     """
     Entry point: resolve tests for the manifest and emit them for shell/CI capture.
 
     Logs the result and prints a single line to stdout (space-separated classes or
-    ``not a test``).
+    ``not a test``). With ``target_orgs`` the line is a JSON object from
+    scan_package_for_orgs instead. With ``shards`` > 1 the selected tests are split
+    into one line (or JSON entry) per shard; ``not a test`` is printed unchanged.
+
+    Returns:
+        The selected tests before sharding: the test string, or with
+        ``target_orgs`` the ``org -> tests`` mapping.
 
     Args:
         manifest: package.xml path.
         stage: deploy or destroy.
         environment: e.g. production or sandbox.
         cmt_config_path: JSON path for CMT-driven test rules.
+        target_orgs: Optional comma-separated org aliases for multi-org mode.
+        max_workers: Concurrent org queries in multi-org mode.
+        shards: Number of balanced test shards to emit.
+        test_runtimes: Historical runtimes JSON for shard balancing.
+        shard_format: ``lines`` or ``json``.
+        coverage_paths: Coverage JSON files for the low-coverage warning.
+        coverage_threshold: Percentage used by that warning.
+        prior_result: JSON of @tests: results from an earlier run; rewritten after
+            a successful scan.
+        base_ref: Diff base when ``prior_result`` records no commit.
+        where_used_mode: ``off``, ``warn`` or ``error``: on destroy, check that
+            no force-app file still references the destroyed members.
+        where_used_index: Where-used index path.
+        cmt_rule_mode: ``off``, ``warn`` or ``error``: check the CMT rules against
+            the Apex source.
+        stream: ``auto``, ``on`` or ``off``: validate the manifest block by block
+            (see should_stream); multi-org runs always parse the whole tree.
     """
 
-    test_classes = scan_package(manifest, stage, environment, cmt_config_path)
+    delta = None
+    if prior_result and stage != "destroy":
+        with span("delta"):
+            delta = apex_delta.AnnotationDelta(prior_result, base_ref)
+
+    if target_orgs:
+        orgs = [o.strip() for o in target_orgs.split(",") if o.strip()]
+        if not orgs:
+            logging.error("ERROR: --target-orgs names no org alias: %r", target_orgs)
+            sys.exit(1)
+        result = scan_package_for_orgs(
+            manifest, stage, environment, cmt_config_path, orgs, max_workers, delta
+        )
+        if delta:
+            delta.save()
+        if shards > 1:
+            result["shards"] = {
+                org: build_shards(tests, shards, test_runtimes)
+                for org, tests in result["orgs"].items()
+                if tests != "not a test"
+            }
+        output = json.dumps(result)
+        logging.info(output)
+        print(output)
+        return result["orgs"]
+
+    test_classes = scan_package(
+        manifest,
+        stage,
+        environment,
+        cmt_config_path,
+        coverage_paths,
+        coverage_threshold,
+        delta,
+        where_used_mode,
+        where_used_index,
+        cmt_rule_mode,
+        should_stream(manifest, stream),
+    )
+    if delta:
+        delta.save()
     logging.info(test_classes)
+    if shards > 1 and test_classes != "not a test":
+        print(
+            shard_tests.format_shards(
+                build_shards(test_classes, shards, test_runtimes), shard_format
+            )
+        )
+        return test_classes
     print(test_classes)
+    return test_classes
+
+
+def result_cache_key(inputs: argparse.Namespace) -> Optional[str]:
+    """
+    Build the result cache key for a run, or None when it must not be cached.
+
+    The key covers the manifest bytes, stage, environment, every file option
+    (CMT config, runtimes, coverage, sfdx-project.json), sharding options, the
+    scripts themselves and the git tree ids of CACHED_SOURCE_DIRS. Runs that read
+    a CMT switch from an org, use ``--target-orgs``, or have uncommitted changes in
+    those directories are not cacheable: their result depends on state outside
+    the key. Runs with ``--report-json`` or a destroy-stage ``--where-used`` check
+    are not cached either, since a replay would not reproduce the logged warnings;
+    the same goes for ``--cmt-rule-check warn``. In ``error`` mode a cached result
+    has passed that check, since everything it reads is covered by the key.
+
+    A hit replays stdout, strips ConnectedApp keys and appends a ``--metrics-file``
+    entry (``"cache": "hit"``). It does not rewrite ``--prior-result``: no Apex is
+    scanned, and the run that stored the entry already saved results for the
+    same Apex trees, so a later miss still reads only the files changed since.
+
+    Args:
+        inputs: Parsed CLI arguments.
+
+    Returns:
+        Hex key, or None.
+    """
+    if inputs.target_orgs or inputs.report_json:
+        return None
+    if inputs.stage == "destroy" and inputs.where_used != "off":
+        return None
+    if inputs.cmt_rule_check == "warn":
+        return None
+    if not os.path.isfile(inputs.manifest):
+        return None
+    try:
+        root = manifest_stream.summary_root(
+            inputs.manifest,
+            lambda t, _: t.lower() in ("apexclass", "apextrigger", "custommetadata"),
+        )
+    except ET.ParseError:
+        return None
+    rules = load_cmt_rules(inputs.cmt_tests_config)
+    for rule in cmt_rules_in_package(root, inputs.stage, rules):
+        if cmt_switch_source_file(root, rule) is None:
+            return None
+    trees = result_cache.source_tree_ids(CACHED_SOURCE_DIRS)
+    if trees is None:
+        return None
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    scripts = {
+        name: result_cache.file_digest(os.path.join(script_dir, name))
+        for name in sorted(os.listdir(script_dir))
+        if name.endswith(".py")
+    }
+    return result_cache.cache_key(
+        {
+            "scripts": scripts,
+            "manifest": result_cache.file_digest(inputs.manifest),
+            "stage": inputs.stage,
+            "environment": inputs.environment,
+            "cmt_config": result_cache.file_digest(inputs.cmt_tests_config),
+            "sfdx_project": result_cache.file_digest(
+                managed_namespaces.DEFAULT_PROJECT
+            ),
+            "sources": trees,
+            "shards": inputs.shards,
+            "shard_format": inputs.shard_format,
+            "test_runtimes": result_cache.file_digest(inputs.test_runtimes),
+            "coverage": [result_cache.file_digest(p) for p in inputs.coverage],
+            "coverage_threshold": inputs.coverage_threshold,
+            "cmt_rule_check": inputs.cmt_rule_check,
+        }
+    )
+
+
+def strip_connected_app_keys(manifest: str, stage: str) -> None:
+    """
+    Remove ConnectedApp consumer keys for a manifest without re-scanning it.
+
+    A cached result skips process_metadata_type, but the checkout still needs
+    the consumer keys removed before deploy.
+    """
+    if stage == "destroy":
+        return
+    root = manifest_stream.summary_root(
+        manifest, lambda t, _: t.lower() == "connectedapp"
+    )
+    members = get_metadata_members_by_type(root, "ConnectedApp")
+    if members:
+        process_connected_app(local_members("ConnectedApp", members))
+
+
+class LogCollector(logging.Handler):
+    """
+    Keep the warnings and errors of a run for ``--report-json``.
+
+    Validation failures are logged at INFO with an ``ERROR:`` prefix, so the
+    prefix classifies a message as well as its level; the prefix is dropped.
+    """
+
+    _PREFIX = re.compile(r"^\s*(WARNING|ERROR):\s*", re.IGNORECASE)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.warnings: List[str] = []
+        self.errors: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        match = self._PREFIX.match(message)
+        label = match.group(1).upper() if match else ""
+        if match:
+            message = message[match.end() :]
+        if record.levelno >= logging.ERROR or label == "ERROR":
+            self.errors.append(message)
+        elif record.levelno >= logging.WARNING or label == "WARNING":
+            self.warnings.append(message)
+
+
+def write_report(
+    path: str, status: str, tests: Union[str, Dict[str, str]], collector: LogCollector
+) -> None:
+    """
+    Write the ``--report-json`` document.
+
+    Args:
+        path: Destination file.
+        status: ``success`` or ``failed``.
+        tests: Selection returned by main (``""`` when it failed).
+        collector: Warnings and errors logged during the run.
+    """
+    report = {
+        "status": status,
+        "tests": tests,
+        "warnings": collector.warnings,
+        "errors": collector.errors,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def run_capturing_stdout(func, *args, **kwargs) -> Tuple[str, Any]:
+    """
+    Call ``func`` and return what it printed and its return value.
+
+    The output is still written to stdout, even when ``func`` exits, so failures
+    look the same.
+    """
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            result = func(*args, **kwargs)
+    finally:
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
+    return buffer.getvalue(), result
 
 
 if __name__ == "__main__":
     inputs = parse_args()
-    main(
-        inputs.manifest,
-        inputs.stage,
-        inputs.environment,
-        inputs.cmt_tests_config,
+    logging.basicConfig(
+        level=getattr(logging, inputs.log_level.upper(), logging.DEBUG),
+        format="%(message)s",
     )
+    org_query.set_backend(inputs.query_backend)
+    # Keywords, not positions: main has grown many options of the same type.
+    main_kwargs = dict(
+        manifest=inputs.manifest,
+        stage=inputs.stage,
+        environment=inputs.environment,
+        cmt_config_path=inputs.cmt_tests_config,
+        target_orgs=inputs.target_orgs,
+        max_workers=inputs.max_workers,
+        shards=inputs.shards,
+        test_runtimes=inputs.test_runtimes,
+        shard_format=inputs.shard_format,
+        coverage_paths=inputs.coverage,
+        coverage_threshold=inputs.coverage_threshold,
+        prior_result=inputs.prior_result,
+        base_ref=inputs.base_ref,
+        where_used_mode=inputs.where_used,
+        where_used_index=inputs.where_used_index,
+        cmt_rule_mode=inputs.cmt_rule_check,
+        stream=inputs.stream,
+    )
+    if inputs.package_list:
+        write_package_list_manifests(
+            inputs.package_list, inputs.manifest, inputs.empty_package
+        )
+    if inputs.watch:
+        import package_watch
+
+        package_watch.watch(
+            inputs.manifest,
+            inputs.stage,
+            inputs.environment,
+            inputs.cmt_tests_config,
+            inputs.watch_interval,
+        )
+        sys.exit(0)
+    if inputs.metrics_file:
+        profiling.enable()
+    metrics = {"stage": inputs.stage, "environment": inputs.environment}
+    cache = None
+    with span("result_cache"):
+        cache_key = result_cache_key(inputs) if inputs.cache_dir else None
+        cached = None
+        if cache_key:
+            cache = result_cache.ResultCache(inputs.cache_dir, inputs.cache_size)
+            cached = cache.get(cache_key)
+    if cached is not None:
+        logging.info("Using cached package_check result %s", cache_key[:12])
+        strip_connected_app_keys(inputs.manifest, inputs.stage)
+        sys.stdout.write(cached)
+        if inputs.metrics_file:
+            profiling.append_metrics(
+                inputs.metrics_file, "package_check", dict(metrics, cache="hit")
+            )
+        sys.exit(0)
+    if inputs.cache_dir and not cache_key:
+        logging.info("package_check result is not cacheable for this run.")
+    collector = None
+    if inputs.report_json:
+        collector = LogCollector()
+        logging.getLogger().addHandler(collector)
+    status = "failed"
+    tests = ""
+    try:
+        if inputs.profile:
+            output, tests = run_capturing_stdout(
+                profiling.run_profiled, inputs.profile, main, **main_kwargs
+            )
+        else:
+            output, tests = run_capturing_stdout(main, **main_kwargs)
+        status = "success"
+        if cache:
+            cache.put(cache_key, output)
+    finally:
+        if collector:
+            write_report(
+                inputs.report_json,
+                status,
+                tests,
+                collector,
+            )
+        if inputs.metrics_file:
+            profiling.append_metrics(
+                inputs.metrics_file,
+                "package_check",
+                dict(metrics, cache="miss" if cache else "off"),
+            )
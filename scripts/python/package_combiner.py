@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Combine any number of package.xml manifests into one.
+
+Replaces the ``sf sfpc combine`` plugin call in ``create_release_branch.sh``:
+
+    python package_combiner.py -f a.xml -f b.xml [-d manifests/] -c manifest/package.xml
+
+Each manifest is read with ``iterparse`` (elements cleared as they are consumed),
+turned into a sorted run of ``(type, member)`` entries and spilled to a temporary
+file, so only one manifest is held in memory at a time. The runs are then k-way
+merged with ``heapq.merge``, at most ``FAN_IN`` files at once (larger sets are
+merged in passes), and the result is streamed straight to the output.
+
+``<types>`` blocks with the same name in any casing are merged under the registry
+casing (metadataRegistry.json), or one of the input spellings for types the
+registry does not know. Types are sorted case-insensitively and members are
+sorted and de-duplicated, so the output does not depend on the input order. The
+highest ``<version>`` among the inputs is kept unless ``-n`` is given. Files that
+are not package.xml manifests are skipped with a warning.
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import logging
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from itertools import groupby
+from typing import IO, Iterator, List, Optional, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from xml_writer import METADATA_NS, write_package_xml
+
+FAN_IN = 64
+_Q = f"{{{METADATA_NS}}}"
+
+Entry = Tuple[str, str, str]
+
+
+def _version_key(version: str) -> Tuple[int, ...]:
+    try:
+        return tuple(int(p) for p in version.split("."))
+    except ValueError:
+        return ()
+
+
+def read_manifest(path: str) -> Tuple[List[Entry], Optional[str]]:
+    """
+    Stream one manifest into sorted ``(type key, member, type name)`` entries.
+
+    Returns:
+        The sorted, de-duplicated entries and the manifest's ``<version>``.
+
+    Raises:
+        ValueError: When ``path`` is not a package.xml manifest.
+    """
+    entries = set()
+    version = None
+    try:
+        events = ET.iterparse(path, events=("start", "end"))
+        _, root = next(events)
+        if root.tag != f"{_Q}Package":
+            raise ValueError(f"root element is {root.tag}, not Package")
+        for event, elem in events:
+            if event != "end":
+                continue
+            if elem.tag == f"{_Q}types":
+                name = (elem.findtext(f"{_Q}name") or "").strip()
+                if name:
+                    for m in elem.findall(f"{_Q}members"):
+                        member = (m.text or "").strip()
+                        if member:
+                            entries.add((name.lower(), member, name))
+                root.clear()
+            elif elem.tag == f"{_Q}version" and elem.text and elem.text.strip():
+                version = elem.text.strip()
+    except (ET.ParseError, StopIteration, OSError) as e:
+        raise ValueError(str(e) or "empty file") from e
+    return sorted(entries), version
+
+
+def _write_run(entries: Iterator[Entry], directory: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        fh.writelines(f"{k}\t{m}\t{t}\n" for k, m, t in entries)
+    return path
+
+
+def _read_run(handle: IO[str]) -> Iterator[Entry]:
+    for line in handle:
+        key, member, name = line.rstrip("\n").split("\t", 2)
+        yield key, member, name
+
+
+def merge_runs(
+    runs: List[str], directory: str, fan_in: int = FAN_IN
+) -> Iterator[Entry]:
+    """
+    K-way merge sorted run files into one sorted stream.
+
+    Groups of ``fan_in`` runs are merged into new runs until one final merge of at
+    most ``fan_in`` open files remains. Run files are deleted once consumed.
+    """
+    fan_in = max(2, fan_in)
+    while len(runs) > fan_in:
+        merged = []
+        for i in range(0, len(runs), fan_in):
+            merged.append(
+                _write_run(merge_runs(runs[i : i + fan_in], directory), directory)
+            )
+        runs = merged
+    handles = [open(path, "r", encoding="utf-8") for path in runs]
+    try:
+        previous = None
+        for entry in heapq.merge(*(_read_run(h) for h in handles)):
+            if entry != previous:
+                yield entry
+                previous = entry
+    finally:
+        for handle, path in zip(handles, runs):
+            handle.close()
+            os.remove(path)
+
+
+def combined_types(
+    entries: Iterator[Entry], registry: MetadataRegistry
+) -> Iterator[Tuple[str, Iterator[str]]]:
+    """Group merged entries into ``(type name, members)`` with duplicates dropped."""
+    for _, group in groupby(entries, key=lambda e: e[0]):
+        first = next(group)
+        name = registry.canonical_name(first[2]) or first[2]
+
+        def members(first=first, group=group) -> Iterator[str]:
+            last = first[1]
+            yield last
+            for _, member, _ in group:
+                if member != last:
+                    yield member
+                    last = member
+
+        yield name, members()
+
+
+def manifest_paths(files: List[str], directories: List[str]) -> List[str]:
+    """``files`` followed by the ``.xml`` files of each directory (sorted)."""
+    paths = list(files)
+    for directory in directories:
+        paths.extend(
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.lower().endswith(".xml")
+        )
+    return paths
+
+
+def combine_manifests(
+    paths: List[str],
+    output: str,
+    keep_version: bool = True,
+    registry: Optional[MetadataRegistry] = None,
+    fan_in: int = FAN_IN,
+) -> int:
+    """
+    Write the combination of ``paths`` to ``output``.
+
+    Returns:
+        Number of manifests combined (invalid ones are skipped).
+    """
+    registry = registry or MetadataRegistry.load()
+    parent = os.path.dirname(output)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    version = None
+    with tempfile.TemporaryDirectory(prefix="package_combiner_") as spill:
+        runs = []
+        for path in paths:
+            try:
+                entries, manifest_version = read_manifest(path)
+            except ValueError as e:
+                logging.warning("WARNING: Skipping %s: not a package.xml (%s)", path, e)
+                continue
+            if manifest_version and (
+                version is None
+                or _version_key(manifest_version) > _version_key(version)
+            ):
+                version = manifest_version
+            runs.append(_write_run(iter(entries), spill))
+        tmp = output + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            write_package_xml(
+                fh,
+                combined_types(merge_runs(runs, spill, fan_in), registry),
+                version if keep_version else None,
+            )
+        os.replace(tmp, output)
+    return len(runs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Combine package.xml manifests.")
+    parser.add_argument("-f", "--package-file", action="append", default=[])
+    parser.add_argument("-d", "--directory", action="append", default=[])
+    parser.add_argument("-c", "--combined-package", default="package.xml")
+    parser.add_argument(
+        "-n", "--no-api-version", action="store_true", help="Omit <version>"
+    )
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    paths = manifest_paths(args.package_file, args.directory)
+    count = combine_manifests(
+        paths,
+        args.combined_package,
+        not args.no_api_version,
+        MetadataRegistry.load(args.registry),
+    )
+    logging.info("Combined %d manifest(s) into %s", count, args.combined_package)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Convert an sf-package-list style metadata list into package.xml manifests.
+
+Replaces the ``sf sfpl xml`` plugin calls in ``create_destroy_package.sh``. The
+list is the compact format used in MR descriptions and the ``$PACKAGE`` web
+pipeline variable, with entries separated by newlines or ``;``:
+
+    MetadataType: Member1, Member2
+    MetadataType2: Member1
+    Version: 60.0
+
+``<Package>`` / ``</Package>`` wrapper lines are ignored. Type names are matched
+case-insensitively against ``scripts/registry/metadataRegistry.json`` and rewritten
+to the registry's casing; duplicate types are merged and members de-duplicated.
+Output is written with ``xml_writer.write_package_xml``.
+
+Usage:
+  python package_list.py -l "$PACKAGE" -x destructive/destructiveChanges.xml \
+      -d destructive/package.xml
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from xml_writer import write_package_xml
+
+_WRAPPER_RE = re.compile(r"^</?\s*package\s*>$", re.IGNORECASE)
+
+
+def load_type_names(registry_path: str = DEFAULT_REGISTRY) -> Dict[str, str]:
+    """
+    Return lowercase type name → canonical type name from metadataRegistry.json.
+
+    Child types (CustomField, CustomLabel, WorkflowRule, ...) are included.
+    Returns an empty dict when the registry file is missing.
+    """
+    if not registry_path or not os.path.isfile(registry_path):
+        logging.warning("WARNING: Metadata registry not found: %s", registry_path)
+        return {}
+    registry = MetadataRegistry.load(registry_path)
+    return {e["name"].lower(): e["name"] for e in registry.types.values()}
+
+
+def parse_package_list(
+    text: str, type_names: Optional[Dict[str, str]] = None
+) -> Tuple[Dict[str, List[str]], Optional[str]]:
+    """
+    Parse package-list text into types and an optional API version.
+
+    Args:
+        text: Newline- and/or semicolon-separated ``Type: m1, m2`` entries.
+        type_names: Lowercase → canonical type names (see load_type_names); types
+            not in the registry keep the casing of their first occurrence.
+
+    Returns:
+        (canonical type name → members in first-seen order, version or None).
+
+    Raises:
+        ValueError: On an entry without ``:`` or without members.
+    """
+    type_names = type_names or {}
+    types: Dict[str, List[str]] = {}
+    seen: Dict[str, set] = {}
+    casing: Dict[str, str] = {}
+    version = None
+    for raw in re.split(r"[;\r\n]+", text or ""):
+        line = raw.strip()
+        if not line or _WRAPPER_RE.match(line):
+            continue
+        if ":" not in line:
+            raise ValueError(
+                f"Invalid package list entry (expected Type: Members): {line!r}"
+            )
+        type_part, members_part = line.split(":", 1)
+        type_part = type_part.strip()
+        if type_part.lower() == "version":
+            version = members_part.strip() or None
+            continue
+        members = [m.strip() for m in members_part.split(",") if m.strip()]
+        if not type_part or not members:
+            raise ValueError(f"Invalid package list entry (no members): {line!r}")
+        key = type_part.lower()
+        if key not in type_names:
+            logging.warning(
+                "WARNING: %s is not in the metadata registry; keeping its casing.",
+                type_part,
+            )
+        name = type_names.get(key) or casing.setdefault(key, type_part)
+        bucket = types.setdefault(name, [])
+        names_seen = seen.setdefault(name, set())
+        for member in members:
+            if member not in names_seen:
+                names_seen.add(member)
+                bucket.append(member)
+    return types, version
+
+
+def write_manifest(
+    path: str, types: Dict[str, List[str]], version: Optional[str] = None
+) -> None:
+    """Write ``types`` to ``path`` with types and members sorted, creating parent dirs."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    ordered = [(t, sorted(types[t])) for t in sorted(types, key=str.lower)]
+    with open(path, "w", encoding="utf-8") as fh:
+        write_package_xml(fh, ordered, version)
+
+
+def build_manifests(
+    package_list: str,
+    manifest_path: str,
+    empty_manifest_path: Optional[str] = None,
+    registry_path: str = DEFAULT_REGISTRY,
+) -> Dict[str, List[str]]:
+    """
+    Write the manifest for ``package_list`` and, optionally, an empty companion manifest.
+
+    The empty manifest is what ``sf project deploy start --manifest`` needs next to
+    ``--pre-destructive-changes``.
+
+    Returns:
+        The parsed types (canonical type name → members).
+    """
+    types, version = parse_package_list(package_list, load_type_names(registry_path))
+    write_manifest(manifest_path, types, version)
+    if empty_manifest_path:
+        write_manifest(empty_manifest_path, {}, version)
+    return types
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert a package list into package.xml manifests."
+    )
+    parser.add_argument("-l", "--list", required=True, help="Package list text")
+    parser.add_argument("-x", "--manifest", required=True)
+    parser.add_argument("-d", "--empty-manifest", default=None)
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    build_manifests(args.list, args.manifest, args.empty_manifest, args.registry)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Retrieve the ``scripts/packages`` catalog from one org with concurrent retrieves.
+
+Replaces the single ``sf project retrieve start`` in ``retrieve_packages.sh``:
+
+1. every requested package file is parsed once (``package_catalog.index_catalog``)
+   and its types merged;
+2. types are planned into retrieve units: explicit members are batched into
+   chunks of at most ``--chunk-size`` members, wildcard types get a unit each.
+   ``CustomObject`` (and, with ``--expand-wildcards``, every wildcard type) is
+   listed from the org first with ``sf org list metadata`` so standard objects are
+   included and large types are split like explicit members;
+3. units run concurrently (bounded by ``--max-workers``) against the same org,
+   each into its own temporary ``--output-dir`` so retrieves never write to the
+   project at the same time;
+4. finished units are merged into ``force-app/main/default`` one at a time,
+   after an optional pre-purge of the retrieved types' folders.
+
+The ``sf`` executable is taken from ``--sf`` (or PATH), so a stub script can stand
+in for the CLI locally.
+
+Usage:
+  python package_retrieve.py --target-org develop --wait 33 [--prepurge] \
+      [--max-workers 4] [scripts/packages/Apex.xml ...]
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from org_query import resolve_sf_executable
+from package_catalog import DEFAULT_CATALOG, index_catalog
+from xml_writer import write_package_xml
+
+DEFAULT_TARGET = "force-app/main/default"
+DEFAULT_CHUNK_SIZE = 1000
+# Wildcards on these types skip standard components, so they are always listed.
+EXPAND_TYPES = {"customobject"}
+
+
+class RetrieveUnit(NamedTuple):
+    """One ``sf project retrieve start`` call: a label and type → members."""
+
+    label: str
+    types: Dict[str, List[str]]
+
+
+def catalog_types(package_paths: List[str]) -> Dict[str, List[str]]:
+    """Merge the types of ``package_paths`` into type → sorted unique members."""
+    merged: Dict[str, List[str]] = {}
+    for name, files in index_catalog(package_paths).items():
+        members = {m for found in files.values() for m in found if m}
+        merged[name] = sorted(members)
+    return merged
+
+
+def list_org_members(sf_exe: str, org: str, type_name: str) -> List[str]:
+    """
+    List every component of ``type_name`` in ``org`` (``sf org list metadata``).
+
+    Raises:
+        RuntimeError: When the CLI call fails or returns invalid JSON.
+    """
+    cmd = [sf_exe, "org", "list", "metadata", "--metadata-type", type_name]
+    cmd += ["--target-org", org, "--json"]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    try:
+        data = json.loads(proc.stdout or "{}")
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Invalid JSON listing {type_name}: {e}") from e
+    if proc.returncode != 0 or data.get("status") != 0:
+        message = data.get("message") or proc.stderr or "unknown error"
+        raise RuntimeError(f"Listing {type_name} failed: {message[:800]}")
+    result = data.get("result") or []
+    if isinstance(result, dict):
+        result = [result]
+    return sorted({r["fullName"] for r in result if r.get("fullName")})
+
+
+def expand_wildcards(
+    types: Dict[str, List[str]],
+    sf_exe: str,
+    org: str,
+    expand_all: bool,
+    max_workers: int,
+) -> Dict[str, List[str]]:
+    """Replace ``*`` with the org's component list for the types that need it."""
+    todo = [
+        name
+        for name, members in types.items()
+        if "*" in members and (expand_all or name.lower() in EXPAND_TYPES)
+    ]
+    if not todo:
+        return types
+    out = dict(types)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(list_org_members, sf_exe, org, name): name for name in todo
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            listed = future.result()
+            logging.info("Listed %d %s component(s) in %s", len(listed), name, org)
+            explicit = [m for m in types[name] if m != "*"]
+            out[name] = sorted(set(explicit).union(listed))
+    return out
+
+
+def plan_units(
+    types: Dict[str, List[str]], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[RetrieveUnit]:
+    """
+    Split types into retrieve units of at most ``chunk_size`` explicit members.
+
+    Wildcard types get one unit each; explicit members of different types share
+    units until a unit is full, so many small types cost one retrieve.
+    """
+    chunk_size = max(1, chunk_size)
+    units: List[RetrieveUnit] = []
+    batch: Dict[str, List[str]] = {}
+    count = 0
+
+    def flush() -> None:
+        nonlocal batch, count
+        if batch:
+            units.append(RetrieveUnit(f"chunk-{len(units) + 1}", batch))
+        batch, count = {}, 0
+
+    for name in sorted(types, key=str.lower):
+        members = types[name]
+        if "*" in members:
+            units.append(RetrieveUnit(name, {name: ["*"]}))
+            continue
+        for member in members:
+            batch.setdefault(name, []).append(member)
+            count += 1
+            if count >= chunk_size:
+                flush()
+    flush()
+    return units
+
+
+def run_unit(
+    sf_exe: str, org: str, unit: RetrieveUnit, work_dir: str, wait: str
+) -> Tuple[RetrieveUnit, str, float]:
+    """
+    Retrieve one unit into ``work_dir/source``.
+
+    Returns:
+        (unit, directory holding the retrieved source, seconds taken).
+
+    Raises:
+        RuntimeError: When the retrieve fails.
+    """
+    manifest = os.path.join(work_dir, "package.xml")
+    with open(manifest, "w", encoding="utf-8") as fh:
+        write_package_xml(fh, sorted(unit.types.items()))
+    output_dir = os.path.join(work_dir, "source")
+    cmd = [sf_exe, "project", "retrieve", "start", "--manifest", manifest]
+    cmd += ["--target-org", org, "--output-dir", output_dir, "--wait", str(wait)]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        detail = (proc.stderr or proc.stdout or "unknown error").strip()[-800:]
+        raise RuntimeError(f"Retrieve {unit.label} failed: {detail}")
+    return unit, output_dir, elapsed
+
+
+def _source_root(output_dir: str) -> str:
+    candidate = os.path.join(output_dir, "main", "default")
+    return candidate if os.path.isdir(candidate) else output_dir
+
+
+def merge_tree(output_dir: str, target: str) -> int:
+    """Move every retrieved file under ``target``; returns the number of files."""
+    root = _source_root(output_dir)
+    moved = 0
+    for dirpath, _, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        dest_dir = target if rel == "." else os.path.join(target, rel)
+        os.makedirs(dest_dir, exist_ok=True)
+        for filename in filenames:
+            os.replace(
+                os.path.join(dirpath, filename), os.path.join(dest_dir, filename)
+            )
+            moved += 1
+    return moved
+
+
+def prepurge(types: List[str], registry: MetadataRegistry, target: str) -> None:
+    """
+    Delete the source folder of each top-level type before retrieving it again.
+
+    Child types (CustomField, ...) share their parent's folder and never purge it.
+    """
+    top_level = [t for t in types if registry.type_id(t) in registry.top_level]
+    for folder in sorted({registry.directory_name(t) for t in top_level} - {None}):
+        path = os.path.join(target, folder)
+        if os.path.isdir(path):
+            logging.info("  Removing %s...", path)
+            shutil.rmtree(path)
+
+
+def retrieve_catalog(
+    package_paths: List[str],
+    org: str,
+    wait: str = "33",
+    target: str = DEFAULT_TARGET,
+    max_workers: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    expand_all: bool = False,
+    purge: bool = False,
+    sf_path: Optional[str] = None,
+    registry_path: str = DEFAULT_REGISTRY,
+) -> int:
+    """
+    Plan, run and merge the retrieves for ``package_paths``.
+
+    Args:
+        package_paths: Package XML files to retrieve.
+        org: Org alias passed as ``--target-org``.
+        wait: ``--wait`` minutes per retrieve.
+        target: Directory the retrieved source is merged into.
+        max_workers: Maximum concurrent retrieves.
+        chunk_size: Maximum explicit members per retrieve.
+        expand_all: List every wildcard type from the org (not just CustomObject).
+        purge: Remove the retrieved types' folders under ``target`` first.
+        sf_path: sf executable (default: PATH).
+        registry_path: metadataRegistry.json for the pre-purge folders.
+
+    Returns:
+        0 when every unit retrieved, else 1 (successful units are still merged).
+    """
+    sf_exe = sf_path or resolve_sf_executable()
+    if not sf_exe:
+        logging.error("ERROR: Salesforce CLI (sf) not found on PATH.")
+        return 1
+    types = catalog_types(package_paths)
+    try:
+        types = expand_wildcards(types, sf_exe, org, expand_all, max_workers)
+    except RuntimeError as e:
+        logging.error("ERROR: %s", e)
+        return 1
+    units = plan_units(types, chunk_size)
+    logging.info(
+        "Retrieving %d type(s) from %s in %d unit(s), %d at a time",
+        len(types),
+        org,
+        len(units),
+        max_workers,
+    )
+    if purge:
+        logging.info("Pre-purging force-app folders for the retrieved types...")
+        prepurge(list(types), MetadataRegistry.load(registry_path), target)
+
+    failed = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="retrieve-") as tmp:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = []
+            for i, unit in enumerate(units):
+                work_dir = os.path.join(tmp, str(i))
+                os.makedirs(work_dir)
+                futures.append(
+                    executor.submit(run_unit, sf_exe, org, unit, work_dir, wait)
+                )
+            for future in as_completed(futures):
+                try:
+                    unit, output_dir, elapsed = future.result()
+                except RuntimeError as e:
+                    logging.error("ERROR: %s", e)
+                    failed += 1
+                    continue
+                moved = merge_tree(output_dir, target)
+                logging.info(
+                    "Retrieved %s: %d file(s) in %.1fs", unit.label, moved, elapsed
+                )
+    logging.info(
+        "Finished %d/%d unit(s) in %.1fs",
+        len(units) - failed,
+        len(units),
+        time.perf_counter() - start,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Retrieve scripts/packages manifests concurrently from one org."
+    )
+    parser.add_argument(
+        "packages", nargs="*", help="Package files (default: all in scripts/packages)"
+    )
+    parser.add_argument("-o", "--target-org", required=True)
+    parser.add_argument("-w", "--wait", default="33")
+    parser.add_argument("--target-dir", default=DEFAULT_TARGET)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--expand-wildcards",
+        action="store_true",
+        help="List every wildcard type from the org and chunk it",
+    )
+    parser.add_argument("--prepurge", action="store_true")
+    parser.add_argument("--sf", default=None, help="sf executable (default: PATH)")
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    paths = args.packages or sorted(glob.glob(os.path.join(DEFAULT_CATALOG, "*.xml")))
+    sys.exit(
+        retrieve_catalog(
+            paths,
+            args.target_org,
+            args.wait,
+            args.target_dir,
+            args.max_workers,
+            args.chunk_size,
+            args.expand_wildcards,
+            args.prepurge,
+            args.sf,
+            args.registry,
+        )
+    )
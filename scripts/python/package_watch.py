@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Watch mode for ``package_check.py`` (``--watch``) during local development.
+
+Keeps the parsed manifest, the ``@tests:`` annotation of every Apex member and
+resolved CMT switch values in memory, polls file mtimes under ``manifest/`` and
+``force-app/main/default/{classes,triggers,customMetadata}``, and re-selects tests
+only from what changed:
+
+* manifest or CMT rules file changed → re-parse and re-validate the manifest;
+* an Apex file changed → re-read only that file's annotations;
+* a CMT record changed → re-read only that switch (org query results are kept
+  for the whole session).
+
+Each time the selected test set changes, the added/removed classes and the full
+selection are printed. Validation errors are reported and watching continues.
+Unlike a pipeline run, ConnectedApp files are never rewritten in watch mode.
+Polling uses only the standard library, so it behaves the same on every OS.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import package_check as pc
+
+SOURCE_DIRS = (
+    "force-app/main/default/classes",
+    "force-app/main/default/triggers",
+    "force-app/main/default/customMetadata",
+)
+APEX_LOCATIONS = {
+    "apexclass": ("ApexClass", "classes", ".cls"),
+    "apextrigger": ("ApexTrigger", "triggers", ".trigger"),
+}
+
+Signature = Tuple[int, int]
+
+
+def scan_signatures(files: List[str], dirs: List[str]) -> Dict[str, Signature]:
+    """
+    Return ``path -> (mtime_ns, size)`` for the given files and directory entries.
+
+    Missing files and directories are simply absent from the result.
+    """
+    out: Dict[str, Signature] = {}
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        out[path] = (st.st_mtime_ns, st.st_size)
+    for directory in dirs:
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_file():
+                    st = entry.stat()
+                    out[f"{directory}/{entry.name}"] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+class PackageWatcher:
+    """
+    Incremental test selection for one manifest.
+
+    Args:
+        manifest: package.xml path.
+        stage: deploy or destroy.
+        environment: Target environment (destroy defaults in production).
+        cmt_config_path: CMT rules JSON.
+    """
+
+    def __init__(
+        self, manifest: str, stage: str, environment: str, cmt_config_path: str
+    ) -> None:
+        self.manifest = manifest
+        self.stage = stage
+        self.environment = environment
+        self.cmt_config_path = cmt_config_path
+        self.signatures: Dict[str, Signature] = {}
+        self.root = None
+        self.failed = False
+        self.rules: List[Dict[str, Any]] = []
+        self.members: Dict[str, List[str]] = {k: [] for k in APEX_LOCATIONS}
+        self.apex_required = False
+        self.annotations: Dict[str, Tuple[Signature, str]] = {}
+        self.file_switches: Dict[str, Tuple[Signature, bool]] = {}
+        self.org_switches: Dict[Tuple[str, str], bool] = {}
+        self.selection: Optional[str] = None
+
+    def _watched_dirs(self) -> List[str]:
+        return [os.path.dirname(self.manifest) or "."] + list(SOURCE_DIRS)
+
+    def poll(self) -> Set[str]:
+        """Rescan mtimes and return the paths added, removed or modified since last poll."""
+        current = scan_signatures([self.cmt_config_path], self._watched_dirs())
+        previous = self.signatures
+        changed = {p for p, sig in current.items() if previous.get(p) != sig}
+        changed.update(p for p in previous if p not in current)
+        self.signatures = current
+        return changed
+
+    def _load_manifest(self) -> None:
+        root, local_name, namespace = pc.parse_package(self.manifest)
+        pc.validate_metadata_attributes(root)
+        pc.validate_root(local_name)
+        pc.validate_namespace(namespace)
+        names = []
+        for metadata_type in root.findall("sforce:types", pc.ns):
+            name, _ = pc.validate_type_block(metadata_type)
+            names.append(name)
+        pc.validate_version_details(root)
+        pc.validate_emptyness(names)
+        self.members = {
+            key: pc.local_members(
+                type_name, pc.get_metadata_members_by_type(root, type_name)
+            )
+            for key, (type_name, _, _) in APEX_LOCATIONS.items()
+        }
+        self.apex_required = any(self.members.values())
+        self.root = root
+
+    def _switch_enabled(self, rule: Dict[str, Any]) -> bool:
+        path = pc.cmt_switch_source_file(self.root, rule)
+        if path:
+            sig = self.signatures.get(path)
+            cached = self.file_switches.get(path)
+            if cached and cached[0] == sig:
+                return cached[1]
+            value = pc.resolve_cmt_switch_enabled(self.root, rule)
+            self.file_switches[path] = (sig, value)
+            return value
+        key = (rule["cmt_record_qualified_name"], rule.get("switch_field") or "")
+        if key not in self.org_switches:
+            self.org_switches[key] = pc.resolve_cmt_switch_enabled(self.root, rule)
+        return self.org_switches[key]
+
+    def _annotation_tests(self, path: str) -> str:
+        sig = self.signatures.get(path)
+        if sig is None:
+            logging.warning("WARNING: Apex file not found: %s", path)
+            return ""
+        cached = self.annotations.get(path)
+        if cached and cached[0] == sig:
+            return cached[1]
+        tests = pc.find_apex_tests(path)
+        self.annotations[path] = (sig, tests)
+        return tests
+
+    def refresh(self, changed: Set[str]) -> str:
+        """
+        Recompute the test selection after ``changed`` paths were modified.
+
+        Returns:
+            The selection string, as package_check.py would print it.
+
+        Raises:
+            SystemExit: When the manifest or selected tests fail validation.
+        """
+        if self.manifest in changed or self.cmt_config_path in changed:
+            self.root = None
+        if self.root is None:
+            self.rules = pc.load_cmt_rules(self.cmt_config_path)
+            self._load_manifest()
+
+        ov_class: Dict[str, str] = {}
+        ov_trigger: Dict[str, str] = {}
+        for rule in pc.cmt_rules_in_package(self.root, self.stage, self.rules):
+            pc.apply_cmt_rule(rule, self._switch_enabled(rule), ov_class, ov_trigger)
+        overrides = {"apexclass": ov_class, "apextrigger": ov_trigger}
+
+        candidates: Set[str] = set()
+        if self.stage != "destroy":
+            for key, (_, directory, ext) in APEX_LOCATIONS.items():
+                for member in self.members[key]:
+                    if member in overrides[key]:
+                        tests = overrides[key][member]
+                    else:
+                        tests = self._annotation_tests(
+                            f"force-app/main/default/{directory}/{member}{ext}"
+                        )
+                    candidates.update(tests.split())
+        return pc.select_required_tests(
+            self.apex_required, self.stage, self.environment, candidates
+        )
+
+    def report(self, changed: Set[str], selection: str) -> None:
+        """Print the selection and its difference from the previous one."""
+        stamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{stamp}] {len(changed)} file(s) changed")
+        old = set()
+        if self.selection not in (None, "not a test"):
+            old = set(self.selection.split())
+        new = set() if selection == "not a test" else set(selection.split())
+        for name in sorted(new - old):
+            print(f"  + {name}")
+        for name in sorted(old - new):
+            print(f"  - {name}")
+        print(selection, flush=True)
+        self.selection = selection
+
+    def step(self) -> None:
+        """
+        Poll once and re-select tests if anything relevant changed.
+
+        After a failed validation nothing is retried until a file changes again.
+        """
+        changed = self.poll()
+        if not changed and (self.root is not None or self.failed):
+            return
+        try:
+            selection = self.refresh(changed)
+        except SystemExit:
+            self.root = None
+            self.failed = True
+            print("package_check failed; waiting for the next change.", flush=True)
+            return
+        self.failed = False
+        if selection != self.selection:
+            self.report(changed, selection)
+
+
+def watch(
+    manifest: str,
+    stage: str,
+    environment: str,
+    cmt_config_path: str,
+    interval: float = 1.0,
+    iterations: Optional[int] = None,
+) -> None:
+    """
+    Poll for changes and print test selection updates until interrupted.
+
+    Args:
+        manifest: package.xml path.
+        stage: deploy or destroy.
+        environment: Target environment.
+        cmt_config_path: CMT rules JSON.
+        interval: Seconds between polls.
+        iterations: Stop after this many polls (None = until Ctrl+C).
+    """
+    watcher = PackageWatcher(manifest, stage, environment, cmt_config_path)
+    count = 0
+    try:
+        while iterations is None or count < iterations:
+            watcher.step()
+            count += 1
+            if iterations is None or count < iterations:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing spans and profiler output for the scripts in this directory.
+
+Spans are off by default and cost one flag check when disabled. Once ``enable()``
+is called, ``with span("name"):`` blocks are recorded and can be written as:
+
+* a Chrome trace (``chrome://tracing``, Perfetto, or speedscope's importer),
+* a per-span summary line appended to a JSON Lines metrics file, for trend
+  dashboards across pipeline runs.
+
+``run_profiled`` additionally wraps a call in ``cProfile`` and dumps ``.prof``
+stats next to the trace.
+
+Environment variables (for scripts whose CLI is positional-only):
+  SCRIPTS_PROFILE       output prefix for <prefix>.prof and <prefix>.trace.json
+  SCRIPTS_METRICS_FILE  JSON Lines file to append span summaries to
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_ENV = "SCRIPTS_PROFILE"
+METRICS_ENV = "SCRIPTS_METRICS_FILE"
+
+_enabled = False
+_lock = threading.Lock()
+# (name, start, end, thread id) in perf_counter seconds.
+_events: List[Tuple[str, float, float, int]] = []
+_origin = time.perf_counter()
+
+
+def enable() -> None:
+    """Start recording spans."""
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Record the wall time of the enclosed block under ``name`` (no-op when disabled)."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with _lock:
+            _events.append((name, start, end, threading.get_ident()))
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate recorded spans by name.
+
+    Returns:
+        name → ``{"count", "total_ms", "max_ms"}``.
+    """
+    out: Dict[str, Dict[str, float]] = {}
+    with _lock:
+        events = list(_events)
+    for name, start, end, _tid in events:
+        ms = (end - start) * 1000.0
+        row = out.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        row["count"] += 1
+        row["total_ms"] += ms
+        row["max_ms"] = max(row["max_ms"], ms)
+    for row in out.values():
+        row["total_ms"] = round(row["total_ms"], 3)
+        row["max_ms"] = round(row["max_ms"], 3)
+    return out
+
+
+def write_chrome_trace(path: str) -> None:
+    """
+    Write recorded spans in Chrome trace-event format (complete ``X`` events).
+
+    The file opens in ``chrome://tracing``, Perfetto and speedscope.
+    """
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+    trace = {
+        "displayTimeUnit": "ms",
+        "traceEvents": [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": round((start - _origin) * 1e6, 3),
+                "dur": round((end - start) * 1e6, 3),
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start, end, tid in events
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(trace, fh)
+
+
+def append_metrics(
+    path: str, script: str, extra: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Append one JSON line with the span summary for this run.
+
+    Args:
+        path: Metrics file (created if missing).
+        script: Script name recorded with the entry.
+        extra: Additional fields to include (e.g. stage, member counts).
+    """
+    entry: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "script": script,
+        "spans": summary(),
+    }
+    if extra:
+        entry.update(extra)
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def run_profiled(prefix: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call ``func`` under cProfile and write ``<prefix>.prof`` and ``<prefix>.trace.json``.
+
+    Outputs are written even when ``func`` exits via ``SystemExit``.
+    """
+    enable()
+    prof = cProfile.Profile()
+    try:
+        with span("total"):
+            return prof.runcall(func, *args, **kwargs)
+    finally:
+        prof.dump_stats(f"{prefix}.prof")
+        write_chrome_trace(f"{prefix}.trace.json")
+
+
+def run_from_env(script: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run ``func`` honoring ``SCRIPTS_PROFILE`` / ``SCRIPTS_METRICS_FILE``.
+
+    Plain call when neither variable is set.
+    """
+    prefix = os.environ.get(PROFILE_ENV)
+    metrics = os.environ.get(METRICS_ENV)
+    if metrics:
+        enable()
+    try:
+        if prefix:
+            return run_profiled(prefix, func, *args, **kwargs)
+        return func(*args, **kwargs)
+    finally:
+        if metrics:
+            append_metrics(metrics, script)
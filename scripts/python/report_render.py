@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Slack and merge-request report text built from the pipeline's structured outputs.
+
+``slack`` reads ``coverage/test-result-<id>.json`` once with ``json_stream`` (the
+summary, each test record and each per-class coverage record in turn) and writes
+``slackPayload.json`` for ``post_test_result.sh``: the run summary, the first
+failures, the slowest tests and, given a baseline snapshot from an earlier run,
+the largest per-class coverage changes.
+
+``mr`` renders the MR comment lines of ``verify_branch_compliance.sh`` from the
+JSON reports of ``package_check.py --report-json`` and
+``compare_manifest_to_git_delta.py --json``.
+
+Usage:
+  python report_render.py slack coverage/test-result-<id>.json --test-run-id <id> \
+      [--job-url URL] [--baseline snapshot.json] [--save-coverage snapshot.json]
+  python report_render.py mr --package-check report.json
+  python report_render.py mr --manifest-delta report.json
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from json_stream import JsonStream
+
+DEFAULT_LIMIT = 10
+# Slack rejects section blocks with more than 3000 characters of text.
+SLACK_TEXT_LIMIT = 2900
+_PREFIX = re.compile(r"^\s*(WARNING|ERROR):\s*", re.IGNORECASE)
+
+
+class TestRunReport(NamedTuple):
+    """What the Slack message needs from one test result file.
+
+    ``slowest`` holds ``(runtime ms, test name)`` longest first and ``coverage``
+    maps each class to ``(covered lines, total lines)``.
+    """
+
+    summary: Dict[str, Any]
+    failures: List[Tuple[str, str]]
+    tests: int
+    slowest: List[Tuple[int, str]]
+    coverage: Dict[str, Tuple[int, int]]
+
+
+def _test_name(test: Dict[str, Any]) -> str:
+    if test.get("FullName"):
+        return test["FullName"]
+    apex_class = (test.get("ApexClass") or {}).get("Name") or ""
+    return f"{apex_class}.{test.get('MethodName') or ''}".strip(".")
+
+
+def _read_coverage_records(stream: JsonStream, out: Dict[str, Tuple[int, int]]):
+    for record in stream.iter_array():
+        if not isinstance(record, dict) or not record.get("name"):
+            continue
+        total = int(record.get("totalLines") or 0)
+        covered = int(record.get("totalCovered") or 0)
+        out[record["name"]] = (covered, total)
+
+
+def load_test_result(path: str, slowest: int = DEFAULT_LIMIT) -> TestRunReport:
+    """
+    Read a test result file in one streaming pass.
+
+    Accepts the result body (``coverage/test-result-<id>.json``) or the
+    ``{"status", "result"}`` envelope printed by ``sf ... --json``.
+    """
+    summary: Dict[str, Any] = {}
+    failures: List[Tuple[str, str]] = []
+    heap: List[Tuple[int, str]] = []
+    coverage: Dict[str, Tuple[int, int]] = {}
+    count = 0
+
+    def read_result(stream: JsonStream) -> None:
+        nonlocal summary, count
+        for key in stream.iter_object():
+            if key == "result" and stream.peek() == "{":
+                read_result(stream)
+            elif key == "summary":
+                summary = stream.value() or {}
+            elif key == "tests" and stream.peek() == "[":
+                for test in stream.iter_array():
+                    count += 1
+                    name = _test_name(test)
+                    if test.get("Outcome") in ("Fail", "CompileFail"):
+                        failures.append((name, test.get("Message") or ""))
+                    item = (int(test.get("RunTime") or 0), name)
+                    if len(heap) < slowest:
+                        heapq.heappush(heap, item)
+                    elif slowest and item > heap[0]:
+                        heapq.heapreplace(heap, item)
+            elif key == "coverage" and stream.peek() == "{":
+                for sub in stream.iter_object():
+                    if sub == "coverage" and stream.peek() == "[":
+                        _read_coverage_records(stream, coverage)
+                    else:
+                        stream.skip_value()
+            elif key == "coverage" and stream.peek() == "[":
+                _read_coverage_records(stream, coverage)
+            else:
+                stream.skip_value()
+
+    with open(path, "r", encoding="utf-8") as fh:
+        read_result(JsonStream(fh))
+    return TestRunReport(
+        summary, failures, count, sorted(heap, reverse=True), coverage
+    )
+
+
+def percent(covered: int, total: int) -> Optional[float]:
+    return 100.0 * covered / total if total else None
+
+
+def overall_coverage(classes: Dict[str, Tuple[int, int]]) -> Optional[float]:
+    return percent(
+        sum(c for c, _ in classes.values()), sum(t for _, t in classes.values())
+    )
+
+
+def load_snapshot(path: Optional[str]) -> Dict[str, Tuple[int, int]]:
+    """Per-class coverage saved by an earlier run (empty when missing)."""
+    if not path or not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    classes = data.get("classes") if isinstance(data, dict) else None
+    return {k: (int(v[0]), int(v[1])) for k, v in (classes or {}).items()}
+
+
+def save_snapshot(path: str, classes: Dict[str, Tuple[int, int]]) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"classes": {k: list(v) for k, v in classes.items()}}, fh)
+
+
+def coverage_deltas(
+    current: Dict[str, Tuple[int, int]],
+    baseline: Dict[str, Tuple[int, int]],
+    limit: int = DEFAULT_LIMIT,
+) -> List[Tuple[str, float, float]]:
+    """Return ``(class, percent now, change in points)``, largest changes first."""
+    changes = []
+    for name, (covered, total) in current.items():
+        if name not in baseline:
+            continue
+        now, before = percent(covered, total), percent(*baseline[name])
+        if now is None or before is None or round(now - before, 1) == 0:
+            continue
+        changes.append((name, now, now - before))
+    changes.sort(key=lambda c: (-abs(c[2]), c[0]))
+    return changes[:limit]
+
+
+def _hostname(summary: Dict[str, Any]) -> str:
+    hostname = str(summary.get("hostname") or "")
+    match = re.search(r"//(.*?)\.", hostname)
+    return match.group(1) if match else hostname
+
+
+def _section(text: str) -> Dict[str, Any]:
+    if len(text) > SLACK_TEXT_LIMIT:
+        text = text[: SLACK_TEXT_LIMIT - 1] + "…"
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def slack_payload(
+    report: TestRunReport,
+    test_run_id: str,
+    job_url: str = "",
+    baseline: Optional[Dict[str, Tuple[int, int]]] = None,
+    limit: int = DEFAULT_LIMIT,
+) -> Dict[str, Any]:
+    """Build the Slack message for a finished test run."""
+    summary = report.summary
+    hostname = _hostname(summary)
+    outcome = summary.get("outcome")
+    if outcome == "Failed":
+        text = (
+            f":alert: <!channel> Automated unit testing for {hostname} has "
+            f"*{outcome}* with {summary.get('testsRan')} test runs and "
+            f"{summary.get('failing')} failure(s). Test run ID is {test_run_id}. "
+            f"Download pipeline artifacts from {job_url}."
+        )
+    else:
+        text = (
+            f":orange-check: <!channel> Automated unit testing for {hostname} has "
+            f"*{outcome}*. Test run ID is {test_run_id}."
+        )
+    blocks = [_section(text)]
+
+    if report.failures:
+        lines = [f"*Failures* ({min(limit, len(report.failures))} of {len(report.failures)}):"]
+        for name, message in report.failures[:limit]:
+            message = " ".join(message.split())[:150]
+            lines.append(f"• `{name}` – {message}" if message else f"• `{name}`")
+        blocks.append(_section("\n".join(lines)))
+
+    if report.slowest:
+        lines = [f"*Slowest tests* (of {report.tests}):"]
+        lines += [f"• `{name}` – {ms / 1000:.1f}s" for ms, name in report.slowest]
+        blocks.append(_section("\n".join(lines)))
+
+    now = overall_coverage(report.coverage)
+    if now is not None:
+        line = f"*Coverage*: {now:.1f}%"
+        before = overall_coverage(baseline) if baseline else None
+        if before is not None:
+            line += f" ({now - before:+.1f} pts vs previous run)"
+        lines = [line]
+        for name, pct, change in coverage_deltas(report.coverage, baseline or {}, limit):
+            lines.append(f"• `{name}` {pct:.1f}% ({change:+.1f})")
+        blocks.append(_section("\n".join(lines)))
+
+    return {"text": "Test Runs Finished", "blocks": blocks}
+
+
+def _clean(message: str, width: int) -> str:
+    return _PREFIX.sub("", message)[:width]
+
+
+def _bullets(title: str, messages: List[str]) -> List[str]:
+    lines = [f"  - :warning: **{title}**: "]
+    lines += [f"    - `{m}`" for m in (_clean(m, 150) for m in messages) if m]
+    return lines
+
+
+def package_check_lines(report: Dict[str, Any]) -> List[str]:
+    """MR comment lines for a ``package_check.py --report-json`` report."""
+    if report.get("status") != "success":
+        errors = report.get("errors") or []
+        message = (
+            errors[0].splitlines()[0][:200]
+            if errors
+            else "Package.xml compliance check failed"
+        )
+        return [f"- :x: **Package.xml Compliance**: Check failed - {message}"]
+
+    tests = (report.get("tests") or "").strip()
+    if tests and tests != "not a test" and "ERROR" not in tests and "Apex Tests" not in tests:
+        if len(tests) > 100:
+            tests = tests[:97] + "..."
+        lines = [
+            f"- :white_check_mark: **Package.xml Compliance**: Check passed (Test classes: `{tests}`)"
+        ]
+    else:
+        lines = ["- :white_check_mark: **Package.xml Compliance**: Check passed"]
+
+    annotation, other = [], []
+    for warning in report.get("warnings") or []:
+        lowered = warning.lower()
+        if "test annotation" in lowered or "test class" in lowered:
+            annotation.append(warning)
+        else:
+            other.append(warning)
+    if annotation:
+        lines += _bullets("Test Annotation Warnings", annotation)
+    if other:
+        lines += _bullets("Other Warnings", other)
+    return lines
+
+
+def _pairs(items: List[str], total: int) -> str:
+    text = "; ".join(items)
+    if total > len(items):
+        text += f"; … (+{total - len(items)} more)"
+    return text[:500]
+
+
+def manifest_delta_lines(report: Dict[str, Any]) -> List[str]:
+    """MR comment lines for a ``compare_manifest_to_git_delta.py --json`` report."""
+    status = report.get("status")
+    if status == "aligned":
+        return [
+            "- :white_check_mark: **Manifest vs git delta** (`sfdx-git-delta`, constructive only): "
+            "`manifest/package.xml` aligns with additive changes (`CI_MERGE_REQUEST_DIFF_BASE_SHA` → HEAD)"
+        ]
+    if status == "warning":
+        lines = [
+            "- :bulb: **Manifest vs git delta** (recommendation): Declare in `manifest/package.xml` "
+            "only metadata you actually changed (Add/Modify) so deploys stay minimal. Details below."
+        ]
+        if report.get("excess"):
+            snip = _pairs(report["excess"], report.get("excess_total", 0))
+            lines.append(f"  - **Listed in manifest but not in additive diff:** `{snip}`")
+        if report.get("missing"):
+            snip = _pairs(report["missing"], report.get("missing_total", 0))
+            lines.append(f"  - **In additive diff but not listed in manifest:** `{snip}`")
+        return lines
+    detail = " ".join(str(report.get("detail") or "").split())[:400]
+    return [
+        f"- :warning: **Manifest vs git delta**: Compare failed (sfdx-git-delta or parser). {detail}"
+    ]
+
+
+def _load_json(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    return data if isinstance(data, dict) else {}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point.
+
+    Returns:
+        0 on success, 1 when an input file cannot be read.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+    slack = commands.add_parser("slack", help="Write slackPayload.json for a test run")
+    slack.add_argument("result", help="coverage/test-result-<id>.json")
+    slack.add_argument("--test-run-id", required=True)
+    slack.add_argument("--job-url", default="")
+    slack.add_argument("-o", "--output", default="slackPayload.json")
+    slack.add_argument("--baseline", help="Coverage snapshot from an earlier run")
+    slack.add_argument("--save-coverage", help="Write this run's coverage snapshot")
+    slack.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    mr = commands.add_parser("mr", help="Print MR comment lines")
+    mr.add_argument("--package-check", help="package_check.py --report-json output")
+    mr.add_argument("--manifest-delta", help="compare_manifest_to_git_delta.py --json")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "slack":
+            report = load_test_result(args.result, args.limit)
+            payload = slack_payload(
+                report,
+                args.test_run_id,
+                args.job_url,
+                load_snapshot(args.baseline),
+                args.limit,
+            )
+            with open(args.output, "w", encoding="utf-8") as fh:
+                json.dump(payload, fh, indent=2)
+            if args.save_coverage and report.coverage:
+                save_snapshot(args.save_coverage, report.coverage)
+            print(f"Slack payload written to {args.output}")
+            return 0
+        lines: List[str] = []
+        if args.package_check:
+            lines += package_check_lines(_load_json(args.package_check))
+        if args.manifest_delta:
+            lines += manifest_delta_lines(_load_json(args.manifest_delta))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print("\n".join(lines))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Small content-addressed cache for script results (used by ``package_check.py``).
+
+A key is the SHA-256 of a JSON document describing every input of a run (file
+digests, options, git tree ids); the value is the exact stdout of that run. Entries
+are single files in the cache directory; a hit refreshes the file's mtime and
+``put`` evicts the least recently used entries beyond ``max_entries``.
+
+Source directories are identified by their git tree ids from one ``git ls-tree``
+call, so no file under them is read; a directory with uncommitted changes makes
+the run uncacheable (see ``source_tree_ids``).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+CACHE_ENV = "PACKAGE_CHECK_CACHE_DIR"
+DEFAULT_MAX_ENTRIES = 64
+_SUFFIX = ".out"
+
+
+def file_digest(path: Optional[str]) -> Optional[str]:
+    """SHA-256 of a file's bytes, or None when ``path`` is unset or missing."""
+    if not path or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_tree_ids(dirs: Iterable[str]) -> Optional[Dict[str, str]]:
+    """
+    Return ``dir -> git tree id`` at HEAD for ``dirs``.
+
+    Returns:
+        None when git is unavailable or any of ``dirs`` has uncommitted or
+        untracked changes (the tree id would not describe the files on disk).
+    """
+    dirs = list(dirs)
+    try:
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--"] + dirs,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        listing = subprocess.run(
+            ["git", "ls-tree", "HEAD", "--"] + dirs,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    if status.returncode or listing.returncode or status.stdout.strip():
+        return None
+    out = {d: "" for d in dirs}
+    for line in listing.stdout.splitlines():
+        meta, _, path = line.partition("\t")
+        parts = meta.split()
+        if len(parts) == 3:
+            out[path.rstrip("/")] = parts[2]
+    return out
+
+
+def cache_key(parts: Dict[str, Any]) -> str:
+    """Stable SHA-256 over a JSON-serialisable description of the inputs."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Directory of cached outputs with least-recently-used eviction.
+
+    Args:
+        directory: Cache directory (created on first ``put``).
+        max_entries: Entries kept after each ``put``.
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max(1, max_entries)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached output for ``key`` and mark it recently used."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                value = fh.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        """Store ``value`` atomically, then evict the oldest entries."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(value)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(_SUFFIX):
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Plan the deploy that restores an org to the state before a commit.
+
+``rollback.sh`` reverts ``$SHA`` and used to redeploy the commit's whole
+package.xml. This script diffs the
+commit against its first parent (the side ``git revert -m 1`` restores) once,
+with ``git diff-tree -z -r --no-renames``, maps every changed file under
+force-app to its component (``MetadataRegistry.component_for_path``) and splits
+the components into:
+
+* redeploy: components the commit modified or deleted, and components it
+  changed by only adding files (a new file in an existing LWC bundle): the
+  reverted source is deployed again;
+* destroy: components the commit added, which did not exist in the parent tree
+  at all. The revert removes their source, so they must be deleted from the org
+  with a destroy pipeline; they are printed as a ``$PACKAGE`` list.
+
+Tests are not selected here: the deploy pipeline of the pushed revert runs
+package_check.py over the written manifest, with its result cache.
+
+A commit that only adds components (the usual feature rollback) has nothing to
+redeploy: the manifest is then left as it is and only the destroy list is
+written. ``--redeploy-list`` holds the redeploy set in the same ``$PACKAGE``
+form, and is empty in that case.
+
+Usage:
+  python rollback_plan.py <sha> [-x manifest/package.xml]
+      [--redeploy-list redeploy.txt] [--destroy-list destroy.txt]
+
+Exits 1 when git fails.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from package_list import write_manifest
+from where_used import SOURCE_ROOT
+from xml_writer import METADATA_NS
+
+Component = Tuple[str, str]
+
+
+class RollbackPlan(NamedTuple):
+    parent: str
+    redeploy: Dict[str, List[str]]
+    destroy: Dict[str, List[str]]
+
+
+def _git(args: List[str]) -> str:
+    proc = subprocess.run(
+        ["git"] + args, capture_output=True, text=True, encoding="utf-8", check=False
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or f"git {args[0]} failed")
+    return proc.stdout
+
+
+def changed_paths(
+    parent: str, sha: str, root: str = SOURCE_ROOT
+) -> List[Tuple[str, str]]:
+    """``(status letter, path)`` for every file under ``root`` the commit changed."""
+    tokens = _git(
+        [
+            "diff-tree",
+            "-z",
+            "-r",
+            "--no-renames",
+            "--name-status",
+            parent,
+            sha,
+            "--",
+            root,
+        ]
+    ).split("\0")
+    return [
+        (tokens[i][0], tokens[i + 1]) for i in range(0, len(tokens) - 1, 2) if tokens[i]
+    ]
+
+
+def _component(
+    registry: MetadataRegistry, path: str, prefix: str
+) -> Optional[Component]:
+    if not path.startswith(prefix):
+        return None
+    return registry.component_for_path(path[len(prefix) :])
+
+
+def _lookup_scope(rel_path: str) -> str:
+    """Folder whose files can belong to the same component as ``rel_path``."""
+    parts = rel_path.split("/")
+    return "/".join(parts[:2]) if len(parts) > 2 else parts[0]
+
+
+def plan_rollback(
+    sha: str, registry: MetadataRegistry, root: str = SOURCE_ROOT
+) -> RollbackPlan:
+    """
+    Compute the redeploy and destroy sets that undo ``sha`` (see module docstring).
+
+    Raises:
+        RuntimeError: When git fails (unknown commit, root commit).
+    """
+    parent = _git(["rev-parse", "--verify", f"{sha}^1"]).strip()
+    prefix = root.rstrip("/") + "/"
+    existed: Set[Component] = set()
+    added: Dict[Component, List[str]] = {}
+    for status, path in changed_paths(parent, sha, root):
+        component = _component(registry, path, prefix)
+        if component is None:
+            logging.warning("WARNING: No metadata type for %s; not in the plan.", path)
+        elif status == "A":
+            added.setdefault(component, []).append(path[len(prefix) :])
+        else:
+            existed.add(component)
+    candidates = {c: p for c, p in added.items() if c not in existed}
+    if candidates:
+        # One listing of the parent tree tells new components from new files.
+        scopes = sorted(
+            {prefix + _lookup_scope(p) for ps in candidates.values() for p in ps}
+        )
+        for path in _git(
+            ["ls-tree", "-r", "-z", "--name-only", parent, "--"] + scopes
+        ).split("\0"):
+            component = _component(registry, path, prefix) if path else None
+            if component in candidates:
+                existed.add(component)
+    redeploy: Dict[str, List[str]] = {}
+    destroy: Dict[str, List[str]] = {}
+    for type_name, member in sorted(existed | set(added)):
+        target = redeploy if (type_name, member) in existed else destroy
+        target.setdefault(type_name, []).append(member)
+    return RollbackPlan(parent, redeploy, destroy)
+
+
+def manifest_version(sha: str, manifest: str) -> Optional[str]:
+    """``<version>`` of ``manifest`` as committed in ``sha`` (None if absent)."""
+    try:
+        root = ET.fromstring(_git(["show", f"{sha}:{manifest}"]))
+    except (RuntimeError, ET.ParseError):
+        return None
+    version = root.findtext(f"{{{METADATA_NS}}}version")
+    return version.strip() if version and version.strip() else None
+
+
+def package_list_text(types: Dict[str, List[str]]) -> str:
+    """``Type: a, b;Type2: c`` for the destroy pipeline's ``$PACKAGE`` variable."""
+    return ";".join(
+        f"{t}: {', '.join(m)}"
+        for t, m in sorted(types.items(), key=lambda i: i[0].lower())
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plan the redeploy and destroy sets that roll back a commit."
+    )
+    parser.add_argument("sha")
+    parser.add_argument("-x", "--manifest", default="manifest/package.xml")
+    parser.add_argument("--redeploy-list", default=None)
+    parser.add_argument("--destroy-list", default=None)
+    parser.add_argument("--json", default=None, help="Also write the plan as JSON")
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        plan = plan_rollback(args.sha, MetadataRegistry.load(args.registry))
+    except RuntimeError as e:
+        logging.error("ERROR: Cannot diff %s: %s", args.sha, e)
+        sys.exit(1)
+    if plan.redeploy:
+        version = manifest_version(args.sha, args.manifest)
+        write_manifest(args.manifest, plan.redeploy, version)
+    else:
+        logging.info("%s changes nothing that can be redeployed.", args.sha)
+    destroy = package_list_text(plan.destroy)
+    for path, text in (
+        (args.redeploy_list, package_list_text(plan.redeploy)),
+        (args.destroy_list, destroy),
+    ):
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(text)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({**plan._asdict(), "sha": args.sha}, fh, indent=2)
+    for label, types in (("Redeploy", plan.redeploy), ("Destroy", plan.destroy)):
+        logging.info("%s: %d component(s)", label, sum(len(m) for m in types.values()))
+    if destroy:
+        logging.warning(
+            "WARNING: %s added components the revert removes; destroy them with PACKAGE=%s",
+            args.sha,
+            destroy,
+        )
+
+
+if __name__ == "__main__":
+    main()
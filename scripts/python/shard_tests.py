@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Split a selected Apex test set into balanced shards for parallel validations.
+
+Each test class gets a weight:
+
+* its historical runtime, when a runtime file is given and lists the class;
+* otherwise its ``.cls`` file size, scaled into seconds using the median
+  seconds-per-byte of the classes that do have runtimes (or left in bytes when
+  no runtimes are known at all).
+
+Classes are then assigned heaviest-first to the currently lightest shard
+(longest-processing-time greedy), which keeps shard totals close without an
+exhaustive search.
+
+Runtime files may be either a flat ``{"ClassName": seconds}`` object or a
+Salesforce test result (``sf apex get test -r json`` / ``coverage/test-result-*.json``)
+whose ``tests[].RunTime`` values (milliseconds) are summed per class.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import statistics
+from typing import Dict, Iterable, List, Optional
+
+CLASSES_DIR = "force-app/main/default/classes"
+
+
+def load_runtimes(path: Optional[str]) -> Dict[str, float]:
+    """
+    Read historical per-class runtimes in seconds.
+
+    Args:
+        path: Runtime JSON file, or None.
+
+    Returns:
+        Class name → seconds; empty when ``path`` is None or missing, or when it
+        cannot be read as either shape (logged; shards then fall back to sizes).
+    """
+    if not path or not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError) as e:
+        logging.warning(
+            "WARNING: Cannot read test runtimes from %s (%s); using file sizes.",
+            path,
+            e,
+        )
+        return {}
+    if not isinstance(data, dict):
+        logging.warning(
+            "WARNING: %s is not a JSON object of test runtimes; using file sizes.",
+            path,
+        )
+        return {}
+    if "result" in data and isinstance(data["result"], dict):
+        data = data["result"]
+    tests = data.get("tests")
+    if isinstance(tests, list):
+        out: Dict[str, float] = {}
+        for row in tests:
+            if not isinstance(row, dict):
+                continue
+            name = ((row.get("ApexClass") or {}).get("Name")) or ""
+            if not name:
+                continue
+            out[name] = out.get(name, 0.0) + float(row.get("RunTime") or 0) / 1000.0
+        return out
+    return {
+        str(k): float(v) for k, v in data.items() if isinstance(v, (int, float))
+    }
+
+
+def class_weights(
+    test_classes: Iterable[str],
+    runtimes: Dict[str, float],
+    classes_dir: str = CLASSES_DIR,
+) -> Dict[str, float]:
+    """
+    Weight each test class by known runtime, falling back to scaled file size.
+
+    Args:
+        test_classes: Test class names to weigh.
+        runtimes: Output of load_runtimes.
+        classes_dir: Directory holding ``<name>.cls`` files.
+
+    Returns:
+        Class name → weight (seconds when any runtime is known).
+    """
+    names = list(test_classes)
+    sizes: Dict[str, int] = {}
+    for name in names:
+        try:
+            sizes[name] = os.path.getsize(os.path.join(classes_dir, f"{name}.cls"))
+        except OSError:
+            sizes[name] = 1
+    ratios = [
+        runtimes[n] / sizes[n] for n in names if n in runtimes and sizes.get(n, 0) > 0
+    ]
+    scale = statistics.median(ratios) if ratios else 1.0
+    return {
+        n: runtimes[n] if n in runtimes else max(sizes[n], 1) * scale for n in names
+    }
+
+
+def shard_tests(weights: Dict[str, float], shards: int) -> List[Dict[str, object]]:
+    """
+    Assign weighted test classes to ``shards`` groups with LPT greedy balancing.
+
+    Args:
+        weights: Class name → weight.
+        shards: Requested shard count (capped at the number of classes).
+
+    Returns:
+        ``[{"shard": 1, "tests": [...], "weight": total}, ...]`` ordered by shard
+        number; test names inside a shard are sorted for stable output.
+    """
+    count = max(1, min(shards, len(weights) or 1))
+    heap = [(0.0, i) for i in range(count)]
+    buckets: List[List[str]] = [[] for _ in range(count)]
+    totals = [0.0] * count
+    for name in sorted(weights, key=lambda n: (-weights[n], n)):
+        total, idx = heapq.heappop(heap)
+        buckets[idx].append(name)
+        totals[idx] = total + weights[name]
+        heapq.heappush(heap, (totals[idx], idx))
+    return [
+        {"shard": i + 1, "tests": sorted(buckets[i]), "weight": round(totals[i], 3)}
+        for i in range(count)
+    ]
+
+
+def format_shards(shards: List[Dict[str, object]], fmt: str) -> str:
+    """
+    Render shards for CI capture.
+
+    Args:
+        shards: Output of shard_tests.
+        fmt: ``lines`` (one space-separated line per shard) or ``json``.
+    """
+    if fmt == "json":
+        return json.dumps(shards)
+    return "\n".join(" ".join(s["tests"]) for s in shards)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Apply ``sfdx-project.json`` ``replacements`` to the source files of a manifest.
+
+The sf CLI applies replacements only inside ``sf project deploy``, so a bad rule
+(missing ``replaceWithFile``, unset environment variable, broken regex) shows up
+after the deploy has started. This script applies the same rules up front:
+
+* rules whose ``replaceWhenEnv`` conditions do not all hold are skipped;
+* ``regexToReplace`` is compiled once and ``replaceWithFile`` read once per rule;
+* only files of the manifest's members are considered (wildcard members take the
+  whole type folder), matched against each rule's ``glob`` or ``filename``;
+* files are rewritten in a thread pool, each through a temp file and
+  ``os.replace``, keeping line endings.
+
+The replacement text is inserted literally (no ``$1`` or ``\\1`` expansion). The
+sf deploy still applies its own replacements afterwards; on already-replaced
+files the result is the same.
+
+Usage:
+  python source_replacements.py -x manifest/package.xml [--dry-run] [-w N]
+
+``--dry-run`` prints a unified diff and writes nothing. Exits 1 on an invalid rule.
+"""
+from __future__ import annotations
+
+import argparse
+import difflib
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+from where_used import SOURCE_ROOT, component_keys, manifest_members, member_key
+
+DEFAULT_PROJECT = "sfdx-project.json"
+
+
+class ReplacementError(ValueError):
+    """A replacement rule that cannot be applied."""
+
+
+class Replacement(NamedTuple):
+    """One active rule: files it targets, what to find and the text to insert."""
+
+    matches_path: Callable[[str], bool]
+    pattern: "re.Pattern[str]"
+    text: str
+    source: str
+
+
+def glob_regex(pattern: str) -> "re.Pattern[str]":
+    """Translate a project-relative glob (``**``, ``*``, ``?``, ``{a,b}``) to a regex."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "{" and "}" in pattern[i:]:
+            end = pattern.index("}", i)
+            options = pattern[i + 1 : end].split(",")
+            out.append("(?:" + "|".join(re.escape(o) for o in options) + ")")
+            i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+def _norm(path: str) -> str:
+    path = os.path.normpath(path).replace(os.sep, "/")
+    return path[2:] if path.startswith("./") else path
+
+
+def _rule_applies(rule: dict) -> bool:
+    for condition in rule.get("replaceWhenEnv") or []:
+        if os.environ.get(condition.get("env", "")) != str(condition.get("value")):
+            return False
+    return True
+
+
+def compile_rule(rule: dict, index: int) -> Replacement:
+    """
+    Validate one ``replacements`` entry and compile it.
+
+    Raises:
+        ReplacementError: Missing target, pattern or replacement, a bad regex, an
+            unreadable ``replaceWithFile`` or an unset ``replaceWithEnv`` variable.
+    """
+    source = f"replacements[{index}]"
+    if rule.get("glob"):
+        regex = glob_regex(_norm(rule["glob"]))
+        matches_path: Callable[[str], bool] = lambda p: bool(regex.match(p))
+    elif rule.get("filename"):
+        target = _norm(rule["filename"])
+        matches_path = lambda p: p == target
+    else:
+        raise ReplacementError(f"{source}: needs glob or filename")
+    try:
+        if "regexToReplace" in rule:
+            pattern = re.compile(rule["regexToReplace"])
+        elif "stringToReplace" in rule:
+            pattern = re.compile(re.escape(rule["stringToReplace"]))
+        else:
+            raise ReplacementError(
+                f"{source}: needs regexToReplace or stringToReplace"
+            )
+    except re.error as e:
+        raise ReplacementError(f"{source}: invalid regexToReplace: {e}") from e
+    if "replaceWithFile" in rule:
+        try:
+            with open(rule["replaceWithFile"], "r", encoding="utf-8") as fh:
+                text = fh.read()
+        except OSError as e:
+            raise ReplacementError(f"{source}: cannot read replaceWithFile: {e}") from e
+    elif "replaceWithEnv" in rule:
+        value = os.environ.get(rule["replaceWithEnv"])
+        if value is None:
+            if not rule.get("allowUnsetEnvVariable"):
+                raise ReplacementError(
+                    f"{source}: environment variable {rule['replaceWithEnv']} is not set"
+                )
+            value = ""
+        text = value
+    else:
+        raise ReplacementError(f"{source}: needs replaceWithFile or replaceWithEnv")
+    return Replacement(matches_path, pattern, text, source)
+
+
+def load_replacements(project_path: str = DEFAULT_PROJECT) -> List[Replacement]:
+    """Active, compiled rules of ``sfdx-project.json`` (empty when there are none)."""
+    if not os.path.isfile(project_path):
+        return []
+    with open(project_path, "r", encoding="utf-8") as fh:
+        project = json.load(fh)
+    return [
+        compile_rule(rule, i)
+        for i, rule in enumerate(project.get("replacements") or [])
+        if _rule_applies(rule)
+    ]
+
+
+def manifest_files(
+    manifest: str, registry: MetadataRegistry, root: str = SOURCE_ROOT
+) -> List[str]:
+    """Source files under ``root`` that belong to the manifest's members."""
+    wanted = set()
+    whole_folders = set()
+    for type_name, member in manifest_members(manifest, wildcards=True):
+        if member == "*":
+            folder = registry.directory_name(type_name)
+            if folder:
+                whole_folders.add(folder.lower())
+            continue
+        key = member_key(registry, type_name, member)
+        if key:
+            wanted.add(key)
+    folders = whole_folders | {key[0] for key in wanted}
+    files = []
+    for entry in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if entry.lower() not in folders:
+            continue
+        for dirpath, _, filenames in os.walk(os.path.join(root, entry)):
+            for name in filenames:
+                path = _norm(os.path.join(dirpath, name))
+                if entry.lower() in whole_folders or any(
+                    k in wanted for k in component_keys(path)
+                ):
+                    files.append(path)
+    return sorted(files)
+
+
+def replace_file(
+    path: str, rules: Iterable[Replacement], dry_run: bool = False
+) -> Optional[Tuple[str, str]]:
+    """
+    Apply every rule that targets ``path``.
+
+    Returns:
+        (old, new) contents when the file changed, else None. The file is
+        rewritten atomically unless ``dry_run``.
+    """
+    applicable = [r for r in rules if r.matches_path(path)]
+    if not applicable:
+        return None
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        old = fh.read()
+    new = old
+    for rule in applicable:
+        new = rule.pattern.sub(lambda _m, t=rule.text: t, new)
+    if new == old:
+        return None
+    if not dry_run:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as fh:
+            fh.write(new)
+        os.replace(tmp, path)
+    return old, new
+
+
+def apply_replacements(
+    files: List[str],
+    rules: List[Replacement],
+    dry_run: bool = False,
+    max_workers: int = 8,
+) -> Dict[str, Tuple[str, str]]:
+    """Run ``replace_file`` over ``files`` in a thread pool; path → (old, new)."""
+    if not rules or not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = pool.map(lambda p: (p, replace_file(p, rules, dry_run)), files)
+        return {path: change for path, change in results if change}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Apply sfdx-project.json replacements to a manifest's files."
+    )
+    parser.add_argument("-x", "--manifest", required=True)
+    parser.add_argument("--project", default=DEFAULT_PROJECT)
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    parser.add_argument("-w", "--max-workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        active = load_replacements(args.project)
+    except (ReplacementError, json.JSONDecodeError) as e:
+        logging.error("ERROR: %s", e)
+        sys.exit(1)
+    targets = manifest_files(args.manifest, MetadataRegistry.load(args.registry))
+    changed = apply_replacements(targets, active, args.dry_run, args.max_workers)
+    if args.dry_run:
+        for path, (before, after) in sorted(changed.items()):
+            sys.stdout.writelines(
+                difflib.unified_diff(
+                    before.splitlines(True),
+                    after.splitlines(True),
+                    f"a/{path}",
+                    f"b/{path}",
+                )
+            )
+    logging.info(
+        "Replacements: %d active rule(s), %d file(s) %s",
+        len(active),
+        len(changed),
+        "would change" if args.dry_run else "changed",
+    )
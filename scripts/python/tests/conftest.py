@@ -0,0 +1,12 @@
+"""
+Shared pytest setup: the scripts import their siblings by module name.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
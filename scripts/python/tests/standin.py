@@ -0,0 +1,117 @@
+"""
+Local HTTP stand-in for the REST services the scripts call (GitLab, Salesforce).
+
+A test passes a handler that maps each ``Request`` to ``(status, headers, body)``;
+the server listens on 127.0.0.1 on a free port, speaks HTTP/1.1 keep-alive like
+the real services, and records every request it served.
+
+Usage:
+  with StandIn(handler) as server:
+      client = GitLabClient(server.url + "/api/v4", "token")
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Request(NamedTuple):
+    """One request as seen by the stand-in."""
+
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body or b"null")
+
+
+# (status, extra headers, body); a body that is not bytes is sent as JSON.
+Response = Tuple[int, Dict[str, str], Any]
+Handler = Callable[[Request], Response]
+
+
+class StandIn:
+    """
+    Threaded HTTP server on 127.0.0.1 answering with ``handler``.
+
+    Args:
+        handler: Called (from server threads) with each ``Request``.
+    """
+
+    def __init__(self, handler: Handler) -> None:
+        self.handler = handler
+        self.requests: List[Request] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        standin = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _serve(self) -> None:
+                parts = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                request = Request(
+                    self.command,
+                    parts.path,
+                    dict(urllib.parse.parse_qsl(parts.query)),
+                    {k.lower(): v for k, v in self.headers.items()},
+                    self.rfile.read(length) if length else b"",
+                )
+                with standin._lock:
+                    standin.requests.append(request)
+                status, headers, body = standin.handler(request)
+                if body is None:
+                    data = b""
+                elif isinstance(body, bytes):
+                    data = body
+                else:
+                    data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_DELETE = _serve
+
+        return _Handler
+
+    def served(self, method: Optional[str] = None) -> List[Request]:
+        """Requests served so far, optionally only those with ``method``."""
+        with self._lock:
+            return [r for r in self.requests if method in (None, r.method)]
+
+    def __enter__(self) -> "StandIn":
+        # A short poll interval keeps ``shutdown`` (and so each test) fast.
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,218 @@
+"""
+gitlab_housekeeping.py against a stand-in GitLab API and a local bare repository.
+"""
+from __future__ import annotations
+
+import datetime
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+import gitlab_housekeeping
+from gitlab_housekeeping import GitLabClient, GitLabError
+from standin import Request, StandIn
+
+TOKEN = "tok"
+PROJECT = "group/project"
+PIPELINES = "/api/v4/projects/group%2Fproject/pipelines"
+STALE = "2020-01-01T00:00:00Z"
+FRESH = "2999-01-01T00:00:00Z"
+CUTOFF = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeProject:
+    """
+    Pipelines of one project, served like GitLab's pipelines API.
+
+    Args:
+        stale: Number of pipelines updated before ``CUTOFF`` (ids 1..stale).
+        total_pages: Send ``X-Total-Pages`` with list responses.
+    """
+
+    def __init__(self, stale: int, total_pages: bool = True) -> None:
+        self.pipelines = {i: STALE for i in range(1, stale + 1)}
+        self.pipelines.update({stale + i: FRESH for i in range(1, 6)})
+        self.total_pages = total_pages
+        # Pipeline id -> responses to send for its DELETE before deleting it.
+        self.delete_errors = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, request: Request):
+        if request.headers.get("private-token") != TOKEN:
+            return 401, {}, {"message": "401 Unauthorized"}
+        if request.method == "GET" and request.path == PIPELINES:
+            return self.list(request.query)
+        if request.method == "DELETE" and request.path.startswith(PIPELINES + "/"):
+            return self.delete(int(request.path.rsplit("/", 1)[1]))
+        return 404, {}, {"message": "404 Not Found"}
+
+    def list(self, query):
+        with self.lock:
+            ids = sorted(
+                i for i, at in self.pipelines.items() if at < query["updated_before"]
+            )
+        page, per_page = int(query["page"]), int(query["per_page"])
+        items = [{"id": i} for i in ids[(page - 1) * per_page : page * per_page]]
+        headers = {}
+        if self.total_pages:
+            headers["X-Total-Pages"] = str(max(1, -(-len(ids) // per_page)))
+        return 200, headers, items
+
+    def delete(self, pipeline_id: int):
+        with self.lock:
+            errors = self.delete_errors.get(pipeline_id)
+            if errors:
+                return errors.pop(0)
+            if self.pipelines.pop(pipeline_id, None) is None:
+                return 404, {}, {"message": "404 Not found"}
+        return 204, {}, None
+
+
+def page_numbers(server: StandIn):
+    return sorted(int(r.query["page"]) for r in server.served("GET"))
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Skip the fixed back-off between retries of 5xx responses."""
+    monkeypatch.setattr(gitlab_housekeeping.time, "sleep", lambda seconds: None)
+
+
+def test_paginate_follows_total_pages():
+    project = FakeProject(250)
+    with StandIn(project) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN, workers=4)
+        try:
+            ids = gitlab_housekeeping.stale_pipeline_ids(client, PROJECT, CUTOFF)
+        finally:
+            client.close()
+        assert ids == list(range(1, 251))
+        assert page_numbers(server) == [1, 2, 3]
+        assert server.served()[0].query["updated_before"] == "2024-01-01T00:00:00Z"
+
+
+@pytest.mark.parametrize(
+    "stale, pages", [(250, [1, 2, 3]), (200, [1, 2, 3]), (40, [1])]
+)
+def test_paginate_without_total_pages_stops_at_short_page(stale, pages):
+    project = FakeProject(stale, total_pages=False)
+    with StandIn(project) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN, workers=2)
+        try:
+            ids = gitlab_housekeeping.stale_pipeline_ids(client, PROJECT, CUTOFF)
+        finally:
+            client.close()
+        assert ids == list(range(1, stale + 1))
+        assert page_numbers(server) == pages
+
+
+def test_delete_waits_out_retry_after():
+    project = FakeProject(30)
+    project.delete_errors[7] = [(429, {"Retry-After": "1"}, {"message": "slow down"})]
+    with StandIn(project) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN, workers=4)
+        start = time.monotonic()
+        try:
+            failures = gitlab_housekeeping.delete_stale_pipelines(client, PROJECT, 1)
+        finally:
+            client.close()
+        elapsed = time.monotonic() - start
+        deletes = [r.path for r in server.served("DELETE")]
+    assert failures == 0
+    assert sorted(project.pipelines) == list(range(31, 36))
+    assert deletes.count(f"{PIPELINES}/7") == 2
+    assert len(deletes) == 31
+    assert elapsed >= 1
+
+
+def test_delete_counts_404_as_deleted_and_reports_persistent_errors(no_backoff):
+    project = FakeProject(10)
+    project.delete_errors[3] = [(404, {}, {"message": "404 Not found"})]
+    project.delete_errors[5] = [(502, {}, b"")] * gitlab_housekeeping.MAX_RETRIES
+    with StandIn(project) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN, workers=3)
+        try:
+            failures = gitlab_housekeeping.delete_stale_pipelines(client, PROJECT, 1)
+        finally:
+            client.close()
+        deletes = [r.path for r in server.served("DELETE")]
+    assert failures == 1
+    assert deletes.count(f"{PIPELINES}/5") == gitlab_housekeeping.MAX_RETRIES
+    assert sorted(project.pipelines) == [3, 5, 11, 12, 13, 14, 15]
+
+
+def test_dry_run_only_lists():
+    project = FakeProject(5)
+    with StandIn(project) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN)
+        try:
+            failures = gitlab_housekeeping.delete_stale_pipelines(
+                client, PROJECT, 1, dry_run=True
+            )
+        finally:
+            client.close()
+        assert failures == 0
+        assert not server.served("DELETE")
+    assert len(project.pipelines) == 10
+
+
+def test_non_json_body_is_an_error():
+    with StandIn(lambda request: (200, {}, b"<html>login</html>")) as server:
+        client = GitLabClient(server.url + "/api/v4", TOKEN)
+        try:
+            with pytest.raises(GitLabError, match="non-JSON"):
+                client.call("GET", "/projects")
+        finally:
+            client.close()
+
+
+def test_push_results():
+    porcelain = (
+        "To /srv/repo.git\n"
+        "-\t:refs/heads/feature/a\t[deleted]\n"
+        "!\t:refs/heads/b\t[remote rejected] (hook declined)\n"
+        "=\trefs/heads/c:refs/heads/c\t[up to date]\n"
+        "Done\n"
+    )
+    assert gitlab_housekeeping.push_results(porcelain) == {
+        "feature/a": ("-", "[deleted]"),
+        "b": ("!", "[remote rejected] (hook declined)"),
+        "c": ("=", "[up to date]"),
+    }
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def test_delete_branches_counts_rejected_refs_only(tmp_path, monkeypatch):
+    for name in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{name}_NAME", "ci")
+        monkeypatch.setenv(f"GIT_{name}_EMAIL", "ci@example.com")
+    remote = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    _git(tmp_path, "init", "-q", "--bare", str(remote))
+    _git(tmp_path, "init", "-q", str(work))
+    _git(work, "commit", "-q", "--allow-empty", "-m", "init")
+    _git(work, "push", "-q", str(remote), "HEAD:a", "HEAD:b", "HEAD:c")
+    # Refuse to delete (or update) branch b once the branches exist.
+    hook = remote / "hooks" / "update"
+    hook.write_text('#!/bin/sh\n[ "$1" != refs/heads/b ]\n', encoding="utf-8")
+    os.chmod(hook, 0o755)
+
+    failed = gitlab_housekeeping.delete_branches(
+        str(remote), ["a", "b", "c"], batch_size=2
+    )
+
+    left = subprocess.run(
+        ["git", "for-each-ref", "--format=%(refname:short)", "refs/heads"],
+        cwd=remote,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    assert failed == 1
+    assert left == ["b"]
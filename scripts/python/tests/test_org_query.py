@@ -0,0 +1,198 @@
+"""
+org_query.py against a stand-in Salesforce REST API and a stub ``sf`` executable.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import urllib.parse
+
+import pytest
+
+import org_query
+from org_query import OrgCredentials, QueryError, RestQueryClient
+from standin import Request, StandIn
+
+TOKEN = "00Dxx!token"
+PREFIX = "/services/data/v62.0"
+
+STUB_SF = """#!{python}
+import json, os, sys
+args = sys.argv[1:]
+with open(os.environ["STUB_SF_LOG"], "a", encoding="utf-8") as fh:
+    fh.write(json.dumps(args) + "\\n")
+if args[:2] == ["org", "display"]:
+    result = {{"accessToken": "{token}", "instanceUrl": os.environ["STUB_SF_URL"],
+              "apiVersion": "62.0"}}
+    print(json.dumps({{"status": 0, "result": result}}))
+elif args[:2] == ["data", "query"]:
+    soql = args[args.index("-q") + 1]
+    print(json.dumps({{"status": 0, "result": {{"records": [{{"via": "sf", "q": soql}}]}}}}))
+else:
+    sys.exit(2)
+"""
+
+
+class FakeOrg:
+    """
+    Query endpoints of one org: every query returns one record naming itself.
+
+    ``paged`` queries return two pages linked by ``nextRecordsUrl``; ``failing``
+    queries fail inside a composite batch; ``down`` answers everything with 503.
+    """
+
+    def __init__(self) -> None:
+        self.paged = set()
+        self.failing = set()
+        self.down = False
+
+    def result(self, soql: str):
+        if soql in self.paged:
+            return {
+                "done": False,
+                "nextRecordsUrl": f"{PREFIX}/query/next-{urllib.parse.quote(soql)}",
+                "records": [{"via": "rest", "q": soql, "page": 1}],
+            }
+        return {"done": True, "records": [{"via": "rest", "q": soql}]}
+
+    def __call__(self, request: Request):
+        if self.down:
+            return 503, {}, [{"errorCode": "SERVER_UNAVAILABLE", "message": "down"}]
+        if request.headers.get("authorization") != f"Bearer {TOKEN}":
+            return 401, {}, [{"errorCode": "INVALID_SESSION_ID", "message": "bad"}]
+        if request.method == "GET" and request.path == f"{PREFIX}/query":
+            return 200, {}, self.result(request.query["q"])
+        if request.method == "GET" and request.path.startswith(f"{PREFIX}/query/next-"):
+            soql = urllib.parse.unquote(request.path.rsplit("next-", 1)[1])
+            return 200, {}, {"done": True, "records": [{"q": soql, "page": 2}]}
+        if request.method == "POST" and request.path == f"{PREFIX}/composite/batch":
+            results = []
+            for sub in request.json()["batchRequests"]:
+                query = urllib.parse.urlsplit(sub["url"]).query
+                soql = urllib.parse.parse_qs(query)["q"][0]
+                if soql in self.failing:
+                    error = [{"errorCode": "MALFORMED_QUERY", "message": "bad SOQL"}]
+                    results.append({"statusCode": 400, "result": error})
+                else:
+                    results.append({"statusCode": 200, "result": self.result(soql)})
+            return 200, {}, {"hasErrors": False, "results": results}
+        return 404, {}, [{"errorCode": "NOT_FOUND", "message": request.path}]
+
+
+@pytest.fixture
+def org():
+    fake = FakeOrg()
+    with StandIn(fake) as server:
+        server.org = fake
+        yield server
+
+
+@pytest.fixture
+def rest_client(org):
+    return RestQueryClient(OrgCredentials(org.url, TOKEN, "62.0"))
+
+
+@pytest.fixture
+def stub_sf(tmp_path, monkeypatch, org):
+    """A stub ``sf`` first on PATH; returns a function reading its calls."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    sf = bin_dir / "sf"
+    sf.write_text(STUB_SF.format(python=sys.executable, token=TOKEN), "utf-8")
+    os.chmod(sf, 0o755)
+    log = tmp_path / "sf.log"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("STUB_SF_LOG", str(log))
+    monkeypatch.setenv("STUB_SF_URL", org.url)
+
+    def calls():
+        if not log.exists():
+            return []
+        return [json.loads(line) for line in log.read_text("utf-8").splitlines()]
+
+    return calls
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Select a backend with no credentials in the environment; restores auto."""
+    for name in (org_query.ACCESS_TOKEN_ENV, org_query.INSTANCE_URL_ENV):
+        monkeypatch.delenv(name, raising=False)
+    yield org_query.set_backend
+    org_query.set_backend("auto")
+
+
+def test_query_follows_next_records_url(org, rest_client):
+    org.org.paged.add("SELECT Id FROM Account")
+    records = rest_client.query("SELECT Id FROM Account")
+    assert [r["page"] for r in records] == [1, 2]
+    assert len(org.served("GET")) == 2
+
+
+def test_query_many_splits_batches_at_25(org, rest_client):
+    soqls = [f"SELECT Id FROM Obj{i}__c" for i in range(60)]
+    org.org.paged.add(soqls[30])
+    results = rest_client.query_many(soqls)
+    posts = org.served("POST")
+    assert [len(p.json()["batchRequests"]) for p in posts] == [25, 25, 10]
+    assert [r[0]["q"] for r in results] == soqls
+    assert [r["page"] for r in results[30]] == [1, 2]
+
+
+def test_query_many_reports_failed_subrequest(org, rest_client):
+    org.org.failing.add("SELECT Nope FROM Account")
+    with pytest.raises(QueryError, match="bad SOQL"):
+        rest_client.query_many(["SELECT Id FROM Account", "SELECT Nope FROM Account"])
+
+
+def test_http_error_raises_query_error(org, rest_client):
+    org.org.down = True
+    with pytest.raises(QueryError, match="HTTP 503: down"):
+        rest_client.query("SELECT Id FROM Account")
+
+
+def test_auto_reads_credentials_once_from_sf(org, stub_sf, backend):
+    backend("auto")
+    client = org_query.client_for("dev")
+    assert org_query.client_for("dev") is client
+    records = client.query_many(["SELECT Id FROM User", "SELECT Id FROM Group"])
+    assert [r[0]["via"] for r in records] == ["rest", "rest"]
+    assert stub_sf() == [["org", "display", "--json", "--target-org", "dev"]]
+
+
+def test_auto_falls_back_to_sf_for_the_rest_of_the_run(org, stub_sf, backend):
+    backend("auto")
+    client = org_query.client_for("dev")
+    org.org.down = True
+    first = client.query("SELECT Id FROM User")
+    served = len(org.served())
+    second = client.query_many(["SELECT Id FROM Group", "SELECT Id FROM Queue"])
+    assert first == [{"via": "sf", "q": "SELECT Id FROM User"}]
+    assert [r[0]["via"] for r in second] == ["sf", "sf"]
+    assert len(org.served()) == served
+    queries = [c for c in stub_sf() if c[:2] == ["data", "query"]]
+    assert len(queries) == 3
+    assert all(c[-2:] == ["--target-org", "dev"] for c in queries)
+
+
+def test_auto_uses_sf_when_credentials_are_unavailable(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    backend("auto")
+    assert isinstance(org_query.client_for(), org_query.SfCliQueryClient)
+
+
+def test_rest_backend_requires_credentials(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    backend("rest")
+    with pytest.raises(org_query.SfNotFoundError):
+        org_query.client_for()
+
+
+def test_rest_backend_uses_environment_credentials(org, monkeypatch, backend):
+    backend("rest")
+    monkeypatch.setenv(org_query.ACCESS_TOKEN_ENV, TOKEN)
+    monkeypatch.setenv(org_query.INSTANCE_URL_ENV, org.url + "/")
+    client = org_query.client_for()
+    assert isinstance(client, RestQueryClient)
+    assert client.query("SELECT Id FROM User")[0]["via"] == "rest"
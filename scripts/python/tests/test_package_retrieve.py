@@ -0,0 +1,223 @@
+"""
+package_retrieve.py end to end with a stub ``sf`` passed through ``--sf``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import package_retrieve
+from package_retrieve import RetrieveUnit, plan_units
+
+# Answers ``org list metadata`` from $STUB_SF_ORG (type -> names) and writes one
+# file per member for ``project retrieve start``; a member named Broken fails.
+STUB_SF = """#!{python}
+import json, os, sys
+import xml.etree.ElementTree as ET
+args = sys.argv[1:]
+def opt(name):
+    return args[args.index(name) + 1]
+call = {{"args": args}}
+if args[:3] == ["org", "list", "metadata"]:
+    with open(os.environ["STUB_SF_ORG"], encoding="utf-8") as fh:
+        names = json.load(fh).get(opt("--metadata-type"))
+    if names is None:
+        print(json.dumps({{"status": 1, "message": "INVALID_TYPE"}}))
+        sys.exit(1)
+    result = [{{"fullName": n}} for n in names]
+    print(json.dumps({{"status": 0, "result": result}}))
+elif args[:3] == ["project", "retrieve", "start"]:
+    ns = {{"m": "http://soap.sforce.com/2006/04/metadata"}}
+    types = {{}}
+    for node in ET.parse(opt("--manifest")).getroot().findall("m:types", ns):
+        members = [m.text for m in node.findall("m:members", ns)]
+        types[node.findtext("m:name", "", ns)] = members
+    call["types"] = types
+    if any("Broken" in members for members in types.values()):
+        sys.stderr.write("INVALID_CROSS_REFERENCE_KEY: Broken\\n")
+        sys.exit(1)
+    root = os.path.join(opt("--output-dir"), "main", "default")
+    for name, members in types.items():
+        folder = os.path.join(root, name.lower())
+        os.makedirs(folder, exist_ok=True)
+        for member in members:
+            member = "all" if member == "*" else member
+            with open(os.path.join(folder, member), "w", encoding="utf-8") as fh:
+                fh.write(name)
+else:
+    sys.exit(2)
+with open(os.environ["STUB_SF_LOG"], "a", encoding="utf-8") as fh:
+    fh.write(json.dumps(call) + "\\n")
+"""
+
+
+def package_xml(path, types):
+    body = "".join(
+        "<types>%s<name>%s</name></types>"
+        % ("".join(f"<members>{m}</members>" for m in members), name)
+        for name, members in types.items()
+    )
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<Package xmlns="http://soap.sforce.com/2006/04/metadata">{body}</Package>',
+        "utf-8",
+    )
+    return str(path)
+
+
+class StubSf:
+    """The stub CLI, its org contents and the calls it received."""
+
+    def __init__(self, tmp_path, monkeypatch) -> None:
+        self.path = str(tmp_path / "sf")
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write(STUB_SF.format(python=sys.executable))
+        os.chmod(self.path, 0o755)
+        self.org = tmp_path / "org.json"
+        self.org.write_text(json.dumps({"CustomObject": []}), "utf-8")
+        self.log = tmp_path / "sf.log"
+        monkeypatch.setenv("STUB_SF_ORG", str(self.org))
+        monkeypatch.setenv("STUB_SF_LOG", str(self.log))
+
+    def set_org(self, **types) -> None:
+        self.org.write_text(json.dumps(types), "utf-8")
+
+    def calls(self, *prefix: str):
+        if not self.log.exists():
+            return []
+        calls = [json.loads(line) for line in self.log.read_text("utf-8").splitlines()]
+        return [c for c in calls if c["args"][: len(prefix)] == list(prefix)]
+
+
+@pytest.fixture
+def sf(tmp_path, monkeypatch):
+    return StubSf(tmp_path, monkeypatch)
+
+
+def test_plan_units_chunks_explicit_members_across_types():
+    units = plan_units(
+        {"ApexPage": ["P1"], "ApexClass": ["A", "B", "C"], "Flow": ["*"]}, 2
+    )
+    assert units == [
+        RetrieveUnit("chunk-1", {"ApexClass": ["A", "B"]}),
+        RetrieveUnit("chunk-2", {"ApexClass": ["C"], "ApexPage": ["P1"]}),
+        RetrieveUnit("Flow", {"Flow": ["*"]}),
+    ]
+
+
+def test_retrieve_catalog_lists_chunks_and_merges(tmp_path, sf):
+    sf.set_org(CustomObject=["Account", "Invoice__c", "Contact"])
+    target = tmp_path / "force-app"
+    packages = [
+        package_xml(
+            tmp_path / "Apex.xml", {"ApexClass": ["A", "B", "C"], "Flow": ["*"]}
+        ),
+        package_xml(
+            tmp_path / "Objects.xml",
+            {"ApexClass": ["C", "D"], "CustomObject": ["*", "Extra__c"]},
+        ),
+    ]
+
+    status = package_retrieve.retrieve_catalog(
+        packages,
+        "dev",
+        target=str(target),
+        max_workers=3,
+        chunk_size=3,
+        sf_path=sf.path,
+    )
+
+    assert status == 0
+    listed = sf.calls("org", "list", "metadata")
+    assert [c["args"][4] for c in listed] == ["CustomObject"]
+    retrieves = sf.calls("project", "retrieve", "start")
+    assert sorted(json.dumps(c["types"], sort_keys=True) for c in retrieves) == sorted(
+        json.dumps(t, sort_keys=True)
+        for t in (
+            {"ApexClass": ["A", "B", "C"]},
+            {"ApexClass": ["D"], "CustomObject": ["Account", "Contact"]},
+            {"CustomObject": ["Extra__c", "Invoice__c"]},
+            {"Flow": ["*"]},
+        )
+    )
+    output_dirs = {c["args"][c["args"].index("--output-dir") + 1] for c in retrieves}
+    assert len(output_dirs) == len(retrieves)
+    assert all(c["args"][-2:] == ["--wait", "33"] for c in retrieves)
+    assert sorted(os.listdir(target / "apexclass")) == ["A", "B", "C", "D"]
+    assert sorted(os.listdir(target / "customobject")) == [
+        "Account",
+        "Contact",
+        "Extra__c",
+        "Invoice__c",
+    ]
+    assert os.listdir(target / "flow") == ["all"]
+
+
+def test_expand_wildcards_lists_every_wildcard_type(tmp_path, sf):
+    sf.set_org(CustomObject=["Account"], Flow=["F1", "F2"])
+    packages = [package_xml(tmp_path / "p.xml", {"Flow": ["*"]})]
+    status = package_retrieve.retrieve_catalog(
+        packages,
+        "dev",
+        target=str(tmp_path / "out"),
+        expand_all=True,
+        sf_path=sf.path,
+    )
+    assert status == 0
+    assert [c["types"] for c in sf.calls("project")] == [{"Flow": ["F1", "F2"]}]
+
+
+def test_failed_unit_fails_the_run_but_keeps_the_others(tmp_path, sf):
+    target = tmp_path / "out"
+    packages = [
+        package_xml(tmp_path / "p.xml", {"ApexClass": ["A", "Broken", "C", "D"]})
+    ]
+    status = package_retrieve.retrieve_catalog(
+        packages, "dev", target=str(target), chunk_size=2, sf_path=sf.path
+    )
+    assert status == 1
+    assert sorted(os.listdir(target / "apexclass")) == ["C", "D"]
+
+
+def test_listing_failure_stops_before_retrieving(tmp_path, sf):
+    sf.set_org()
+    packages = [package_xml(tmp_path / "p.xml", {"CustomObject": ["*"]})]
+    status = package_retrieve.retrieve_catalog(
+        packages, "dev", target=str(tmp_path / "out"), sf_path=sf.path
+    )
+    assert status == 1
+    assert not sf.calls("project")
+
+
+def test_prepurge_removes_top_level_folders_only(tmp_path):
+    registry = package_retrieve.MetadataRegistry.load(package_retrieve.DEFAULT_REGISTRY)
+    for folder in ("classes", "objects", "labels"):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "old").write_text("", "utf-8")
+    package_retrieve.prepurge(["ApexClass", "CustomField"], registry, str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["labels", "objects"]
+
+
+def test_cli_passes_sf_option(tmp_path, sf):
+    packages = [package_xml(tmp_path / "p.xml", {"ApexClass": ["A"]})]
+    script = os.path.join(
+        os.path.dirname(package_retrieve.__file__), "package_retrieve.py"
+    )
+    proc = subprocess.run(
+        [sys.executable, script, "--target-org", "dev", "--wait", "5", "--sf", sf.path]
+        + ["--target-dir", str(tmp_path / "out"), *packages],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert proc.returncode == 0, proc.stderr
+    (call,) = sf.calls("project")
+    args = call["args"]
+    assert args[args.index("--target-org") + 1] == "dev"
+    assert args[-2:] == ["--wait", "5"]
+    assert "Finished 1/1 unit(s)" in proc.stderr
+    assert os.listdir(tmp_path / "out" / "apexclass") == ["A"]
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Where-used index over ``force-app/main/default`` for destructive deployments.
+
+Every source file is reduced to the set of API-name tokens it mentions:
+
+* XML files: each element's text (``<layout>Account-Account Layout</layout>``,
+  ``<field>Account.Foo__c</field>``) plus the identifiers inside it; tag names
+  are not indexed;
+* everything else (Apex, LWC, Aura, ...): identifiers and dotted chains
+  (``Account.Foo__c``, ``@salesforce/apex/MyClass.run``) with their segments.
+
+Tokens are stored lowercase per file in a JSON index together with the file's git
+blob SHA (one ``git ls-files -s`` call, no file reads), so an update re-reads only
+files whose blob changed. An inverted token → files map is built in memory.
+
+``references(type, member)`` looks up the member's own token and, for dotted
+members such as ``Account.Foo__c``, also files that mention both ``Account`` and
+``Foo__c`` (flows and reports reference fields next to their object). The
+component's own source files are left out.
+
+Usage:
+  python where_used.py -x destructiveChanges.xml [--index PATH] [--json]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from metadata_registry import DEFAULT_REGISTRY, MetadataRegistry
+
+SOURCE_ROOT = "force-app/main/default"
+INDEX_ENV = "PACKAGE_CHECK_WHERE_USED_INDEX"
+DEFAULT_INDEX = ".cache/package_check/where-used.json"
+INDEX_VERSION = 1
+NS = "{http://soap.sforce.com/2006/04/metadata}"
+
+_IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+_XML_TEXT = re.compile(r">([^<>]+)<")
+# Longer element values are prose (descriptions, formulas), not a reference.
+_MAX_VALUE = 255
+
+
+def tokenize(path: str, text: str) -> Set[str]:
+    """Lowercase API-name tokens mentioned in one file."""
+    tokens: Set[str] = set()
+    if path.endswith(".xml"):
+        chunks = []
+        for value in _XML_TEXT.findall(text):
+            value = value.strip()
+            if value:
+                chunks.append(value)
+                if len(value) <= _MAX_VALUE and "\n" not in value:
+                    tokens.add(value.lower())
+    else:
+        chunks = [text]
+    for chunk in chunks:
+        for chain in _IDENT.findall(chunk):
+            chain = chain.lower()
+            tokens.add(chain)
+            if "." in chain:
+                parts = chain.split(".")
+                tokens.update(parts)
+                tokens.update(f"{a}.{b}" for a, b in zip(parts, parts[1:]))
+    return {t for t in tokens if len(t) > 1}
+
+
+def _git_blob_id(path: str) -> str:
+    with open(path, "rb") as fh:
+        data = fh.read()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def source_blobs(root: str = SOURCE_ROOT) -> Dict[str, str]:
+    """
+    Return path → git blob SHA for every file under ``root``.
+
+    Tracked files take their SHA from the git index; modified and untracked files
+    are hashed. Without git every file is hashed.
+    """
+    def git(*args: str) -> Optional[str]:
+        try:
+            proc = subprocess.run(
+                ["git", *args, "--", root], capture_output=True, text=True, check=False
+            )
+        except OSError:
+            return None
+        return proc.stdout if proc.returncode == 0 else None
+
+    staged = git("ls-files", "-s")
+    changed = git("ls-files", "-m", "-o", "--exclude-standard")
+    if staged is None or changed is None:
+        blobs = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name).replace(os.sep, "/")
+                blobs[path] = _git_blob_id(path)
+        return blobs
+    blobs = {}
+    for line in staged.splitlines():
+        meta, _, path = line.partition("\t")
+        parts = meta.split()
+        if len(parts) == 3:
+            blobs[path] = parts[1]
+    for path in set(changed.splitlines()):
+        if os.path.isfile(path):
+            blobs[path] = _git_blob_id(path)
+        else:
+            blobs.pop(path, None)
+    return blobs
+
+
+def _stem(filename: str) -> str:
+    if filename.endswith("-meta.xml"):
+        filename = filename[: -len("-meta.xml")]
+    return filename.rsplit(".", 1)[0] if "." in filename else filename
+
+
+def component_keys(path: str) -> List[Tuple[str, ...]]:
+    """
+    Keys under which a source file belongs to a component (see ``member_key``).
+
+    ``classes/Foo.cls`` → ``(classes, foo.cls)``, ``(classes, foo)``;
+    ``objects/Account/fields/Foo__c.field-meta.xml`` also gives the child key
+    ``(objects, account, foo__c)``.
+    """
+    prefix = SOURCE_ROOT + "/"
+    if not path.startswith(prefix):
+        return []
+    parts = path[len(prefix) :].lower().split("/")
+    if len(parts) < 2:
+        return []
+    folder, first = parts[0], parts[1]
+    keys: List[Tuple[str, ...]] = [(folder, k) for k in {first, _stem(first)}]
+    if len(parts) > 2:
+        keys.append((folder, first, _stem(parts[-1])))
+    return keys
+
+
+def member_key(
+    registry: MetadataRegistry, type_name: str, member: str
+) -> Optional[Tuple[str, ...]]:
+    """Component key of a manifest member, or None for unknown types."""
+    folder = registry.directory_name(type_name)
+    if not folder:
+        return None
+    folder, member = folder.lower(), member.lower()
+    parent, _, name = member.rpartition(".")
+    if registry.parent_id(type_name) and parent:
+        return (folder, parent, name)
+    return (folder, member)
+
+
+class WhereUsedIndex:
+    """
+    Token index over the source tree.
+
+    Args:
+        files: path → (blob SHA, tokens), e.g. from ``load``.
+    """
+
+    def __init__(self, files: Optional[Dict[str, Tuple[str, List[str]]]] = None):
+        self.files: Dict[str, Tuple[str, List[str]]] = dict(files or {})
+        self._postings: Optional[Dict[str, Set[str]]] = None
+        self._owners: Optional[Dict[Tuple[str, ...], Set[str]]] = None
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "WhereUsedIndex":
+        """Read a saved index; a missing, old or unreadable file gives an empty one."""
+        if not path or not os.path.isfile(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning("WARNING: Ignoring where-used index %s: %s", path, e)
+            return cls()
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return cls()
+        return cls({p: (v[0], v[1]) for p, v in (data.get("files") or {}).items()})
+
+    def save(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "files": {p: [b, t] for p, (b, t) in self.files.items()},
+                },
+                fh,
+                separators=(",", ":"),
+            )
+        os.replace(tmp, path)
+
+    def update(self, blobs: Dict[str, str]) -> int:
+        """
+        Re-tokenize files whose blob changed and drop deleted ones.
+
+        Returns:
+            Number of files read or dropped.
+        """
+        gone = set(self.files) - set(blobs)
+        for path in gone:
+            del self.files[path]
+        read = len(gone)
+        for path, blob in blobs.items():
+            known = self.files.get(path)
+            if known and known[0] == blob:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as fh:
+                    tokens = tokenize(path, fh.read())
+            except OSError:
+                continue
+            self.files[path] = (blob, sorted(tokens))
+            read += 1
+        self._postings = None
+        self._owners = None
+        return read
+
+    def _index(self) -> Dict[str, Set[str]]:
+        if self._postings is None:
+            postings: Dict[str, Set[str]] = {}
+            for path, (_, tokens) in self.files.items():
+                for token in tokens:
+                    postings.setdefault(token, set()).add(path)
+            self._postings = postings
+        return self._postings
+
+    def files_with(self, token: str) -> Set[str]:
+        return self._index().get(token.lower(), set())
+
+    def _components(self) -> Dict[Tuple[str, ...], Set[str]]:
+        if self._owners is None:
+            owners: Dict[Tuple[str, ...], Set[str]] = {}
+            for path in self.files:
+                for key in component_keys(path):
+                    owners.setdefault(key, set()).add(path)
+            self._owners = owners
+        return self._owners
+
+    def own_files(
+        self, registry: MetadataRegistry, type_name: str, member: str
+    ) -> Set[str]:
+        """Source files of the component itself (its folder, bundle or file)."""
+        key = member_key(registry, type_name, member)
+        return self._components().get(key, set()) if key else set()
+
+    def references(
+        self,
+        registry: MetadataRegistry,
+        type_name: str,
+        member: str,
+        exclude: Iterable[str] = (),
+    ) -> List[str]:
+        """Files (outside the component and ``exclude``) that mention ``member``."""
+        found = set(self.files_with(member))
+        if "." in member:
+            parent, _, name = member.rpartition(".")
+            found |= self.files_with(parent) & self.files_with(name)
+        found -= self.own_files(registry, type_name, member)
+        found -= set(exclude)
+        return sorted(found)
+
+
+def load_current(index_path: Optional[str]) -> WhereUsedIndex:
+    """Load the saved index, bring it up to date with the tree and save it again."""
+    index = WhereUsedIndex.load(index_path)
+    changed = index.update(source_blobs())
+    logging.info(
+        "Where-used index: %d file(s), %d updated", len(index.files), changed
+    )
+    if index_path and changed:
+        index.save(index_path)
+    return index
+
+
+def manifest_members(path: str, wildcards: bool = False) -> List[Tuple[str, str]]:
+    """(type, member) pairs of a package or destructiveChanges manifest."""
+    root = ET.parse(path).getroot()
+    pairs = []
+    for types in root.findall(f"{NS}types"):
+        name = (types.findtext(f"{NS}name") or "").strip()
+        for m in types.findall(f"{NS}members"):
+            member = (m.text or "").strip()
+            if name and member and (wildcards or member != "*"):
+                pairs.append((name, member))
+    return pairs
+
+
+def where_used(
+    index: WhereUsedIndex, registry: MetadataRegistry, pairs: List[Tuple[str, str]]
+) -> Dict[str, List[str]]:
+    """
+    Map ``Type:Member`` → referencing files for every pair that is still used.
+
+    Files belonging to any of ``pairs`` are not counted: they are being removed too.
+    """
+    removed: Set[str] = set()
+    for type_name, member in pairs:
+        removed |= index.own_files(registry, type_name, member)
+    out = {}
+    for type_name, member in pairs:
+        refs = index.references(registry, type_name, member, removed)
+        if refs:
+            out[f"{type_name}:{member}"] = refs
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List source files that still reference manifest members."
+    )
+    parser.add_argument("-x", "--manifest", required=True)
+    parser.add_argument(
+        "--index", default=os.environ.get(INDEX_ENV) or DEFAULT_INDEX
+    )
+    parser.add_argument("-r", "--registry", default=DEFAULT_REGISTRY)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    used = where_used(
+        load_current(args.index),
+        MetadataRegistry.load(args.registry),
+        manifest_members(args.manifest),
+    )
+    if args.json:
+        print(json.dumps(used, indent=2))
+    else:
+        for key, refs in used.items():
+            print(f"{key}: {', '.join(refs)}")
+    sys.exit(1 if used else 0)
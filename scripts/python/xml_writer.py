@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Incremental XML output shared by the manifest and metadata rewriting scripts.
+
+Two tools live here:
+
+* ``XmlStreamWriter`` writes new documents (package.xml, destructiveChanges.xml)
+  element by element straight to an open file handle, so output size never
+  dictates memory use.
+* ``remove_elements`` deletes elements from an existing metadata file (e.g.
+  ``<consumerKey>`` in a ConnectedApp) by copying the original bytes around the
+  removed ranges. The XML declaration, indentation, attribute quoting and
+  namespace prefixes are left exactly as they were, so git diffs only show the
+  removed lines.
+
+Both stream in fixed-size chunks, so very large ``.object-meta.xml`` or profile
+files are processed with bounded memory.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import xml.parsers.expat
+from typing import IO, Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+METADATA_NS = "http://soap.sforce.com/2006/04/metadata"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+CHUNK_SIZE = 64 * 1024
+_INLINE_WS = b" \t"
+
+
+class XmlStreamWriter:
+    """
+    Write an XML document incrementally to a text file handle.
+
+    Elements are written as soon as they are opened/closed; only the stack of
+    open tag names is kept in memory.
+
+    Example:
+        with open(path, "w", encoding="utf-8") as fh:
+            w = XmlStreamWriter(fh)
+            w.start("Package", {"xmlns": METADATA_NS})
+            w.element("version", "62.0")
+            w.close()
+    """
+
+    def __init__(
+        self, handle: IO[str], indent: str = "    ", declaration: bool = True
+    ) -> None:
+        self._fh = handle
+        self._indent = indent
+        self._stack: List[str] = []
+        if declaration:
+            self._fh.write(XML_DECLARATION)
+
+    def _pad(self) -> str:
+        return self._indent * len(self._stack)
+
+    @staticmethod
+    def _attrs(attrib: Optional[dict]) -> str:
+        if not attrib:
+            return ""
+        return "".join(f" {k}={quoteattr(str(v))}" for k, v in attrib.items())
+
+    def start(self, tag: str, attrib: Optional[dict] = None) -> None:
+        """Open ``tag`` on its own line at the current depth."""
+        self._fh.write(f"{self._pad()}<{tag}{self._attrs(attrib)}>\n")
+        self._stack.append(tag)
+
+    def end(self) -> None:
+        """Close the most recently opened element."""
+        tag = self._stack.pop()
+        self._fh.write(f"{self._pad()}</{tag}>\n")
+
+    def element(self, tag: str, text: str, attrib: Optional[dict] = None) -> None:
+        """Write a leaf element with escaped text content on a single line."""
+        self._fh.write(
+            f"{self._pad()}<{tag}{self._attrs(attrib)}>{escape(text)}</{tag}>\n"
+        )
+
+    def close(self) -> None:
+        """Close every element that is still open."""
+        while self._stack:
+            self.end()
+
+
+def write_package_xml(
+    handle: IO[str],
+    types: Iterable[Tuple[str, Iterable[str]]],
+    version: Optional[str] = None,
+) -> None:
+    """
+    Stream a Salesforce manifest to ``handle``.
+
+    Args:
+        handle: Writable text file handle.
+        types: ``(type_name, members)`` pairs in output order; members are written
+            in the order given. Pass an empty iterable for an empty (destructive) package.
+        version: Optional API version for the ``<version>`` element.
+    """
+    w = XmlStreamWriter(handle)
+    w.start("Package", {"xmlns": METADATA_NS})
+    for type_name, members in types:
+        w.start("types")
+        for member in members:
+            w.element("members", member)
+        w.element("name", type_name)
+        w.end()
+    if version:
+        w.element("version", version)
+    w.close()
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit(":", 1)[-1]
+
+
+def find_element_ranges(
+    file_path: str, local_names: Sequence[str], chunk_size: int = CHUNK_SIZE
+) -> List[Tuple[int, int]]:
+    """
+    Locate elements to drop without building a tree.
+
+    Args:
+        file_path: XML file to scan.
+        local_names: Element names to match, ignoring any namespace prefix.
+        chunk_size: Bytes fed to the parser per read.
+
+    Returns:
+        ``(start_offset, end_tag_offset)`` byte pairs: the ``<`` of the start tag and
+        the ``<`` of the matching end tag (not meaningful for self-closing elements,
+        which are detected from the start tag when copying).
+        Elements nested inside an already matched element are not reported.
+
+    Raises:
+        xml.parsers.expat.ExpatError: If the file is not well-formed.
+    """
+    wanted = set(local_names)
+    parser = xml.parsers.expat.ParserCreate()
+    ranges: List[Tuple[int, int]] = []
+    depth = 0
+    open_at: Optional[int] = None
+    open_depth = 0
+
+    def on_start(name, _attrs):
+        nonlocal depth, open_at, open_depth
+        depth += 1
+        if open_at is None and _local(name) in wanted:
+            open_at = parser.CurrentByteIndex
+            open_depth = depth
+
+    def on_end(_name):
+        nonlocal depth, open_at
+        if open_at is not None and depth == open_depth:
+            ranges.append((open_at, parser.CurrentByteIndex))
+            open_at = None
+        depth -= 1
+
+    parser.StartElementHandler = on_start
+    parser.EndElementHandler = on_end
+    with open(file_path, "rb") as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+    return ranges
+
+
+class _RangeCopier:
+    """
+    Copy bytes to ``dst`` while skipping element ranges.
+
+    Indentation before a dropped element and the line break after it are removed
+    too, so an element on its own line disappears without leaving a blank line.
+    """
+
+    def __init__(self, dst: IO[bytes]) -> None:
+        self._dst = dst
+        # Whitespace seen since the last newline; None once the line has content.
+        self._pending: Optional[bytes] = b""
+        self._skip_eol = False
+        self._held_inline = b""
+
+    def keep(self, data: bytes) -> None:
+        """Write ``data``, holding back trailing indentation on the current line."""
+        if self._skip_eol:
+            data = self._held_inline + data
+            rest = data.lstrip(_INLINE_WS)
+            if not rest or rest == b"\r":
+                self._held_inline = data
+                return
+            self._skip_eol = False
+            self._held_inline = b""
+            if rest.startswith(b"\r\n"):
+                data = rest[2:]
+            elif rest.startswith(b"\n"):
+                data = rest[1:]
+        buf = (self._pending or b"") + data
+        nl = buf.rfind(b"\n")
+        if nl < 0 and self._pending is None:
+            self._dst.write(buf)
+            return
+        head, tail = buf[: nl + 1], buf[nl + 1 :]
+        self._dst.write(head)
+        if tail.strip(_INLINE_WS):
+            self._dst.write(tail)
+            self._pending = None
+        else:
+            self._pending = tail
+
+    def drop(self) -> None:
+        """Mark that an element was dropped at the current output position."""
+        at_line_start = self._pending is not None
+        if at_line_start:
+            self._pending = b""
+        self._skip_eol = at_line_start
+        self._held_inline = b""
+
+    def finish(self) -> None:
+        if self._pending:
+            self._dst.write(self._pending)
+        if self._held_inline:
+            self._dst.write(self._held_inline)
+
+
+def _skip_tag(src: IO[bytes], pos: int, chunk_size: int) -> Tuple[int, bool]:
+    """
+    Read past the markup tag starting at ``pos``.
+
+    Returns:
+        (offset just after the closing ``>``, whether the tag was self-closing).
+    """
+    src.seek(pos)
+    quote = None
+    prev = b""
+    while True:
+        data = src.read(chunk_size)
+        if not data:
+            return pos, False
+        for i in range(len(data)):
+            ch = data[i : i + 1]
+            if quote:
+                if ch == quote:
+                    quote = None
+            elif ch in (b'"', b"'"):
+                quote = ch
+            elif ch == b">":
+                return pos + i + 1, prev == b"/"
+            prev = ch
+        pos += len(data)
+
+
+def _copy_excluding(
+    src: IO[bytes],
+    dst: IO[bytes],
+    ranges: List[Tuple[int, int]],
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    copier = _RangeCopier(dst)
+    pos = 0
+    for start, end_tag in ranges:
+        src.seek(pos)
+        while pos < start:
+            data = src.read(min(chunk_size, start - pos))
+            if not data:
+                break
+            copier.keep(data)
+            pos += len(data)
+        pos, self_closing = _skip_tag(src, start, chunk_size)
+        if not self_closing:
+            pos, _ = _skip_tag(src, end_tag, chunk_size)
+        copier.drop()
+    src.seek(pos)
+    while True:
+        data = src.read(chunk_size)
+        if not data:
+            break
+        copier.keep(data)
+    copier.finish()
+
+
+def remove_elements(
+    file_path: str, local_names: Sequence[str], chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Remove every element named in ``local_names`` from ``file_path`` in place.
+
+    Everything outside the removed elements is copied byte-for-byte through a
+    temporary file in the same directory, which then atomically replaces the
+    original. The file is left untouched when nothing matches.
+
+    Args:
+        file_path: Metadata XML file to rewrite.
+        local_names: Element names to drop (namespace prefix ignored).
+        chunk_size: Bytes read per I/O call.
+
+    Returns:
+        Number of elements removed.
+
+    Raises:
+        xml.parsers.expat.ExpatError: If the file is not well-formed.
+    """
+    ranges = find_element_ranges(file_path, local_names, chunk_size)
+    if not ranges:
+        return 0
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as dst, open(file_path, "rb") as src:
+            _copy_excluding(src, dst, ranges, chunk_size)
+        # mkstemp creates the file 0600; keep the original's permissions.
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(ranges)